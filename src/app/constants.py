@@ -2,6 +2,8 @@
 
 import ssl
 
+from typing import Any
+
 # pylint: disable=invalid-name
 
 from faststream.security import SASLPlaintext
@@ -15,12 +17,129 @@ class Settings(BaseSettings):
     KAFKA_SASL_AUTH_ENABLED: bool = True
     KAFKA_SASL_USER: str | None = None
     KAFKA_SASL_PASSWORD: str | None = None
+    KAFKA_BATCH_ENABLED: bool = False
+    KAFKA_BATCH_MAX_RECORDS: int = 500
+    KAFKA_BATCH_MAX_WAIT_SECONDS: float = 0.5
+    # Decode batches straight into Polars columns, requires batch mode
+    KAFKA_FAST_DECODE_ENABLED: bool = False
+    # Commit offsets manually once the bronze rows holding them are durable
+    KAFKA_COMMIT_AFTER_FLUSH: bool = False
+
+    # Bounded queues between consumption, lakehouse writes and fraud checks;
+    # partitions pause above the high watermark and resume below the low one
+    PIPELINE_QUEUES_ENABLED: bool = False
+    PIPELINE_HIGH_WATERMARK: float = 0.8
+    PIPELINE_LOW_WATERMARK: float = 0.5
+    LAKEHOUSE_QUEUE_MAX_ROWS: int = 20000
+    FRAUD_QUEUE_MAX_EVENTS: int = 5000
+    FRAUD_QUEUE_WORKERS: int = 4
+
+    # Worker processes of the supervisor (python -m app.supervisor), 0 = one per core
+    SUPERVISOR_WORKERS: int = 0
+    SUPERVISOR_STARTUP_TIMEOUT_SECONDS: float = 60.0
+    SUPERVISOR_SHUTDOWN_TIMEOUT_SECONDS: float = 30.0
+
+    LOG_LEVEL: str = "DEBUG"
+    LOG_JSON: bool = False
+    LOG_ENQUEUE: bool = False
+    # Fraction of hot-path records kept per category (event, batch, window)
+    LOG_SAMPLE_RATES: dict[str, float] = {}
+
+    # Sliding-window rules evaluated together for every event, any breach
+    # triggers the analysis of the user, e.g.
+    # {"name": "failed_logins", "window_seconds": 300, "threshold": 5,
+    #  "event_types": ["login"], "failed_only": true} or
+    # {"name": "ips", "window_seconds": 3600, "threshold": 4, "distinct": "ip_address"}
+    FRAUD_WINDOW_RULES: list[dict[str, Any]] = [
+        {"name": "events", "window_seconds": 120, "threshold": 10}
+    ]
+    # Seconds a user is not analyzed again after an alert
+    FRAUD_ALERT_LOCK_SECONDS: int = 120
+    # Hard cap on events kept per user window, oldest are trimmed first
+    FRAUD_WINDOW_MAX_EVENTS: int = 200
+    # Count events of cold users in-process, escalating to Redis near the
+    # threshold; capped to the smallest rule threshold, single consumer only
+    FRAUD_PREFILTER_ENABLED: bool = False
+    FRAUD_PREFILTER_ESCALATE_AT: int = 5
+    FRAUD_PREFILTER_MAX_USERS: int = 100_000
+    # Breaches analyzed by background workers instead of on the consumer path;
+    # jobs still queued after the deadline are dropped as stale
+    FRAUD_ANALYSIS_QUEUE_ENABLED: bool = True
+    FRAUD_ANALYSIS_WORKERS: int = 5
+    FRAUD_ANALYSIS_QUEUE_MAX_JOBS: int = 1000
+    FRAUD_ANALYSIS_DEADLINE_SECONDS: float = 120.0
+    # Windows scored by rules at or below the low band are benign and at or
+    # above the high band fraud, only those in between go to the LLM
+    FRAUD_RULES_ENABLED: bool = True
+    FRAUD_RULES_LOW_SCORE: float = 0.1
+    FRAUD_RULES_HIGH_SCORE: float = 0.85
 
     OLLAMA_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "mistral:latest"
+    # Stream generations and stop as soon as the verdict fields are complete
+    OLLAMA_STREAM: bool = False
+    # Ollama runtime options, left to the server defaults when None
+    OLLAMA_NUM_PREDICT: int | None = 256
+    OLLAMA_NUM_CTX: int | None = 4096
+    OLLAMA_TEMPERATURE: float | None = 0.0
+    OLLAMA_KEEP_ALIVE: str | None = "30m"
+    LLM_TIMEOUT_SECONDS: float = 120.0
+    # Concurrency towards Ollama adapts between the bounds, growing while
+    # calls complete under the target latency and halving otherwise
+    LLM_CONCURRENCY_INITIAL: int = 5
+    LLM_CONCURRENCY_MIN: int = 1
+    LLM_CONCURRENCY_MAX: int = 20
+    LLM_TARGET_LATENCY_SECONDS: float = 10.0
+    # Seconds a call waits for a slot before being shed
+    LLM_CONCURRENCY_ACQUIRE_TIMEOUT_SECONDS: float = 30.0
+    # Consecutive failures opening the circuit, and seconds before a probe
+    LLM_BREAKER_FAILURES: int = 5
+    LLM_BREAKER_RESET_SECONDS: float = 30.0
+    # Verdicts reused for windows with the same fingerprint, shared across
+    # workers through Redis when LLM_CACHE_REDIS_ENABLED
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 10_000
+    LLM_CACHE_TTL_SECONDS: float = 600.0
+    LLM_CACHE_REDIS_ENABLED: bool = False
+    # "compact" renders events as stats and a columnar table within the token
+    # budget, oldest events left out first; "json" embeds them verbatim
+    LLM_PROMPT_FORMAT: str = "compact"
+    LLM_PROMPT_MAX_TOKENS: int = 2000
     REDIS_URL: str = "redis://localhost:6379"
+    # Fraud state on a Redis Cluster reached through REDIS_URL, or on the
+    # listed independent nodes with users spread by consistent hashing
+    REDIS_CLUSTER_ENABLED: bool = False
+    REDIS_SHARD_URLS: list[str] = []
     HUGGING_FACE_HUB_TOKEN: str | None = None
 
+    LAKEHOUSE_WRITER_WORKERS: int = 2
+    LAKEHOUSE_FLUSH_MAX_ROWS: int = 1000
+    LAKEHOUSE_FLUSH_MAX_BYTES: int = 8 * 1024 * 1024
+    LAKEHOUSE_FLUSH_INTERVAL_SECONDS: float = 5.0
+    # Consecutive failed flushes after which a batch is moved to NDJSON files
+    # under LAKEHOUSE_DEAD_LETTER_PATH instead of being retried forever
+    LAKEHOUSE_FLUSH_MAX_RETRIES: int = 3
+    LAKEHOUSE_DEAD_LETTER_PATH: str = "lakehouse/dead_letter"
+    # Fraud scores are buffered separately, their layout follows the
+    # partition overrides keyed by LAKEHOUSE_GOLD_FRAUD_SCORE_PATH
+    LAKEHOUSE_GOLD_FRAUD_SCORE_PATH: str = "lakehouse/gold/fraud_score"
+    LAKEHOUSE_GOLD_FLUSH_MAX_ROWS: int = 500
+    LAKEHOUSE_GOLD_FLUSH_INTERVAL_SECONDS: float = 1.0
+    # Days of bronze history loaded per user for the LLM, 0 for all of it
+    LAKEHOUSE_HISTORY_DAYS: int = 30
+    # Per-table overrides keyed by table path, e.g. {"lakehouse/bronze/login": "hour"}
+    LAKEHOUSE_PARTITION_GRANULARITY: dict[str, str] = {}
+    LAKEHOUSE_PARTITION_COLUMNS: dict[str, list[str]] = {}
+
+    LAKEHOUSE_MAINTENANCE_ENABLED: bool = False
+    LAKEHOUSE_MAINTENANCE_INTERVAL_SECONDS: float = 3600.0
+    LAKEHOUSE_COMPACTION_TARGET_SIZE: int = 128 * 1024 * 1024
+    LAKEHOUSE_ZORDER_BY_USER_ID: bool = False
+    LAKEHOUSE_VACUUM_RETENTION_HOURS: int = 168
+    # Allow a retention shorter than the tables' deletedFileRetentionDuration,
+    # which may delete files concurrent readers or writers still need
+    LAKEHOUSE_VACUUM_ALLOW_SHORT_RETENTION: bool = False
+
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8", extra="ignore"
     )
@@ -56,3 +175,21 @@ TOPIC_ORDER = "order-events"
 TOPIC_LOGIN = "login-events"
 TOPIC_BUY = "buy-events"
 TOPIC_SCROLL = "scroll-events"
+
+LAKEHOUSE_BRONZE_USER = "lakehouse/bronze/user"
+LAKEHOUSE_BRONZE_ARTICLE = "lakehouse/bronze/article"
+LAKEHOUSE_BRONZE_ORDER = "lakehouse/bronze/order"
+LAKEHOUSE_BRONZE_LOGIN = "lakehouse/bronze/login"
+LAKEHOUSE_BRONZE_BUY = "lakehouse/bronze/buy"
+LAKEHOUSE_BRONZE_SCROLL = "lakehouse/bronze/scroll"
+LAKEHOUSE_GOLD_FRAUD_SCORE = settings.LAKEHOUSE_GOLD_FRAUD_SCORE_PATH
+
+LAKEHOUSE_TABLES = (
+    LAKEHOUSE_BRONZE_USER,
+    LAKEHOUSE_BRONZE_ARTICLE,
+    LAKEHOUSE_BRONZE_ORDER,
+    LAKEHOUSE_BRONZE_LOGIN,
+    LAKEHOUSE_BRONZE_BUY,
+    LAKEHOUSE_BRONZE_SCROLL,
+    LAKEHOUSE_GOLD_FRAUD_SCORE,
+)
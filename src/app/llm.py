@@ -1,8 +1,10 @@
 """LLM Client for Ollama."""
 
+import functools
 import json
+import re
 
-from typing import Optional
+from typing import Any, Optional, Sequence
 
 import requests
 from loguru import logger
@@ -10,6 +12,73 @@ from loguru import logger
 from app.constants import settings
 
 
+def ollama_payload(model: str, prompt: str, stream: bool) -> dict[str, Any]:
+    """Body of an /api/generate request with the configured runtime options."""
+    options = {
+        name: value
+        for name, value in (
+            ("num_predict", settings.OLLAMA_NUM_PREDICT),
+            ("num_ctx", settings.OLLAMA_NUM_CTX),
+            ("temperature", settings.OLLAMA_TEMPERATURE),
+        )
+        if value is not None
+    }
+    payload: dict[str, Any] = {
+        "model": model,
+        "prompt": prompt,
+        "stream": stream,
+        "format": "json",
+    }
+    if options:
+        payload["options"] = options
+    if settings.OLLAMA_KEEP_ALIVE is not None:
+        payload["keep_alive"] = settings.OLLAMA_KEEP_ALIVE
+    return payload
+
+
+@functools.cache
+def _field_pattern(name: str) -> re.Pattern:
+    """Pattern of a complete string or number value of a JSON field."""
+    return re.compile(
+        rf'"{re.escape(name)}"\s*:\s*'
+        r'("(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?=[\s,}]))'
+    )
+
+
+class JsonFieldStream:
+    """Extracts fields of a JSON object as its text streams in.
+
+    A string value is complete at its closing quote and a number at the
+    character following it, so the caller can stop the generation as soon
+    as every field it needs is known.
+    """
+
+    def __init__(self, fields: Sequence[str]):
+        """Initialize JsonFieldStream."""
+        self.fields = tuple(fields)
+        self.text = ""
+        self.values: dict[str, Any] = {}
+
+    @property
+    def complete(self) -> bool:
+        """Whether every field has a complete value."""
+        return len(self.values) == len(self.fields)
+
+    def feed(self, chunk: str) -> bool:
+        """Append generated text, returning whether every field is complete."""
+        self.text += chunk
+        for name in self.fields:
+            if name not in self.values:
+                match = _field_pattern(name).search(self.text)
+                if match:
+                    self.values[name] = json.loads(match.group(1))
+        return self.complete
+
+    def result(self) -> str:
+        """JSON of the fields if complete, else the text generated so far."""
+        return json.dumps(self.values) if self.complete else self.text
+
+
 class OllamaClient:
     """Client for interacting with Ollama API."""
 
@@ -20,16 +89,18 @@ class OllamaClient:
         self.base_url = base_url
         self.model = model
 
-    def generate(self, prompt: str) -> Optional[str]:
-        """Generate response from Ollama."""
+    def generate(self, prompt: str, fields: Sequence[str] = ()) -> Optional[str]:
+        """Generate response from Ollama.
+
+        With ``OLLAMA_STREAM`` and ``fields`` given, the generation stops as
+        soon as those fields are complete and only they are returned.
+        """
         try:
             url = f"{self.base_url}/api/generate"
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-                "format": "json",
-            }
+            if settings.OLLAMA_STREAM and fields:
+                return self._generate_streaming(url, prompt, fields)
+
+            payload = ollama_payload(self.model, prompt, stream=False)
             response = requests.post(url, json=payload, timeout=120)
             response.raise_for_status()
 
@@ -42,3 +113,20 @@ class OllamaClient:
         except json.JSONDecodeError as e:
             logger.error("Error decoding Ollama response: %s", e)
             return None
+
+    def _generate_streaming(
+        self, url: str, prompt: str, fields: Sequence[str]
+    ) -> Optional[str]:
+        """Stream the generation until the fields are complete."""
+        parser = JsonFieldStream(fields)
+        payload = ollama_payload(self.model, prompt, stream=True)
+        # Closing the response early makes Ollama stop generating
+        with requests.post(url, json=payload, timeout=120, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if parser.feed(chunk.get("response", "")) or chunk.get("done"):
+                    break
+        return parser.result()
@@ -0,0 +1,73 @@
+"""Logging configuration and per-category sampling of hot-path logs."""
+
+import functools
+import random
+import sys
+
+from typing import Any
+
+from loguru import logger
+
+from app.constants import settings
+
+# Hot-path log categories, sampled with LOG_SAMPLE_RATES
+EVENT = "event"
+BATCH = "batch"
+WINDOW = "window"
+
+
+class _DroppedLogger:
+    """Stands in for the logger when a record is sampled out."""
+
+    def opt(self, *_args, **_kwargs) -> "_DroppedLogger":
+        """Return the dropped logger, whatever the options."""
+        return self
+
+    def bind(self, **_kwargs) -> "_DroppedLogger":
+        """Return the dropped logger, whatever the extra fields."""
+        return self
+
+    def _drop(self, *_args, **_kwargs):
+        """Discard the record without formatting it."""
+
+    trace = debug = info = success = warning = error = exception = log = _drop
+
+
+_DROPPED = _DroppedLogger()
+
+
+def configure_logging(sink: Any = sys.stderr):
+    """Replace the default sink according to the logging settings.
+
+    ``LOG_JSON`` serializes every record, extra fields included, as one JSON
+    line, and ``LOG_ENQUEUE`` hands records over to a background thread so
+    writing to stderr never blocks the event loop.
+    """
+    logger.remove()
+    logger.add(
+        sink,
+        level=settings.LOG_LEVEL,
+        serialize=settings.LOG_JSON,
+        enqueue=settings.LOG_ENQUEUE,
+        # Variable values in tracebacks are costly and may leak event data
+        diagnose=False,
+    )
+
+
+def sampled(category: str) -> Any:
+    """Logger for a hot-path category, or a no-op one if sampled out.
+
+    The sampling decision is taken before the message is formatted, so a
+    dropped record costs a single random draw. Combine with
+    ``opt(lazy=True)`` for arguments that are expensive to compute.
+    """
+    rate = settings.LOG_SAMPLE_RATES.get(category, 1.0)
+    if rate < 1.0 and random.random() >= rate:
+        return _DROPPED
+    return _category_logger(category)
+
+
+@functools.cache
+def _category_logger(category: str) -> Any:
+    """Logger tagging records with their category."""
+    return logger.bind(category=category)
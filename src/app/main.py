@@ -6,14 +6,28 @@ from typing import cast
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from loguru import logger as loguru_logger
 from faststream.confluent import KafkaBroker
 from faststream.confluent.helpers.config import ConfluentConfig  # type: ignore # pylint: disable=import-error,no-name-in-module
 
 from app.constants import KAFKA_CONFIG, SECURITY, settings
-from app.service.routers import router, shutdown_fraud_service
+from app.log_config import configure_logging
+from app.maintenance import LakehouseMaintenance
+from app.service.lakehouse_executor import lakehouse_executor
+from app.service.stages import partition_gate
+from app.service.routers import (
+    router,
+    pipeline_metrics,
+    start_pipeline_stages,
+    shutdown_pipeline_stages,
+    shutdown_bronze_writers,
+    shutdown_fraud_service,
+)
 
 logger = logging.getLogger(__name__)
 
+configure_logging()
+
 broker = KafkaBroker(
     settings.KAFKA_BROKERS,
     security=SECURITY,
@@ -23,6 +37,8 @@ broker = KafkaBroker(
 
 broker.include_router(router)
 
+maintenance = LakehouseMaintenance()
+
 
 class CyberStreamerApp(FastAPI):
     """Cyber Streamer Application."""
@@ -32,13 +48,45 @@ class CyberStreamerApp(FastAPI):
         super().__init__(*args, **kwargs)
 
 
+async def start_app(run_maintenance: bool = True):
+    """Start the pipeline stages, the Kafka broker and background maintenance."""
+    start_pipeline_stages()
+    await broker.start()
+    if run_maintenance and settings.LAKEHOUSE_MAINTENANCE_ENABLED:
+        maintenance.start()
+
+
+def pause_consumers():
+    """Stop fetching messages, keeping the consumers open to commit offsets."""
+    # Stages draining below their low watermark must not resume fetching
+    partition_gate.close()
+    for subscriber in broker.subscribers:
+        if subscriber.consumer is not None:
+            client = subscriber.consumer.consumer
+            client.pause(client.assignment())
+
+
+async def stop_app():
+    """Stop consuming, then drain and release every downstream resource."""
+    await maintenance.stop()
+    # The final flushes commit their offsets, so the consumers are only
+    # closed once the stages and writers are drained
+    pause_consumers()
+    await shutdown_pipeline_stages()
+    await shutdown_bronze_writers()
+    await broker.stop()
+    await shutdown_fraud_service()
+    lakehouse_executor.shutdown()
+    # Flush records still queued for the logging thread
+    await loguru_logger.complete()
+
+
 @asynccontextmanager
 async def lifespan(_app: CyberStreamerApp):
     """Handle application lifespan."""
-    await broker.start()
+    await start_app()
     yield
-    await broker.close()
-    await shutdown_fraud_service()
+    await stop_app()
 
 
 app = CyberStreamerApp(
@@ -54,3 +102,9 @@ app = CyberStreamerApp(
 def health_check():
     """Check application health."""
     return {"status": "healthy"}
+
+
+@app.get("/metrics")
+def metrics():
+    """Expose pipeline queue depths and backpressure state."""
+    return pipeline_metrics()
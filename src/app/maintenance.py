@@ -0,0 +1,173 @@
+"""
+Lakehouse maintenance.
+
+Periodically compacts small files, optionally Z-orders by user_id,
+checkpoints the Delta log and vacuums unreferenced files. Runs as a
+background task of the app (LAKEHOUSE_MAINTENANCE_ENABLED) or standalone
+with ``python -m app.maintenance``.
+"""
+
+import argparse
+import asyncio
+import datetime
+
+from deltalake import DeltaTable
+from loguru import logger
+
+from app.constants import settings, LAKEHOUSE_TABLES
+from app.service.partitioning import EVENT_DATE, partition_scheme
+
+
+class LakehouseMaintenance:
+    """Compacts, checkpoints and vacuums the lakehouse Delta tables.
+
+    Only partitions older than the current day are compacted for
+    time-partitioned tables, so the live append writers never race with a
+    rewrite of the partition they are filling. Appends only add files, so
+    Delta's optimistic concurrency lets them commit alongside compaction.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        tables: tuple[str, ...] = LAKEHOUSE_TABLES,
+        *,
+        interval_seconds: float = settings.LAKEHOUSE_MAINTENANCE_INTERVAL_SECONDS,
+        target_size: int = settings.LAKEHOUSE_COMPACTION_TARGET_SIZE,
+        z_order_by_user_id: bool = settings.LAKEHOUSE_ZORDER_BY_USER_ID,
+        retention_hours: int = settings.LAKEHOUSE_VACUUM_RETENTION_HOURS,
+        allow_short_retention: bool = settings.LAKEHOUSE_VACUUM_ALLOW_SHORT_RETENTION,
+    ):
+        """Initialize LakehouseMaintenance."""
+        self.tables = tables
+        self.interval_seconds = interval_seconds
+        self.target_size = target_size
+        self.z_order_by_user_id = z_order_by_user_id
+        self.retention_hours = retention_hours
+        self.allow_short_retention = allow_short_retention
+        self._task: asyncio.Task | None = None
+
+    def maintain_table(self, path: str) -> dict | None:
+        """Run compaction, checkpointing and vacuum on a single table."""
+        if not DeltaTable.is_deltatable(path):
+            logger.debug("Skipping maintenance of {}: not a Delta table", path)
+            return None
+
+        table = DeltaTable(path)
+        partition_filters = None
+        if partition_scheme(path).has_time_partitions:
+            today = datetime.datetime.now(datetime.timezone.utc).date()
+            partition_filters = [(EVENT_DATE, "<", today.isoformat())]
+
+        column_names = [field.name for field in table.schema().fields]
+        if self.z_order_by_user_id and "user_id" in column_names:
+            metrics = table.optimize.z_order(
+                ["user_id"],
+                partition_filters=partition_filters,
+                target_size=self.target_size,
+            )
+        else:
+            metrics = table.optimize.compact(
+                partition_filters=partition_filters,
+                target_size=self.target_size,
+            )
+
+        table.create_checkpoint()
+        table.cleanup_metadata()
+        removed = self._vacuum(path, table)
+
+        logger.info(
+            "Maintained {}: {} files compacted into {}, {} files vacuumed",
+            path,
+            metrics["numFilesRemoved"],
+            metrics["numFilesAdded"],
+            len(removed),
+        )
+        return metrics
+
+    def _vacuum(self, path: str, table: DeltaTable) -> list[str]:
+        """Delete unreferenced files older than the retention period.
+
+        A retention shorter than the one configured on the table could
+        delete files still read by concurrent readers, time travel or an
+        in-flight writer, so it is rejected unless explicitly allowed.
+        """
+        table_hours = _table_retention_hours(table)
+        if self.retention_hours < table_hours and not self.allow_short_retention:
+            logger.warning(
+                "Skipping vacuum of {}: retention of {}h is shorter than the "
+                "table's {}h (LAKEHOUSE_VACUUM_ALLOW_SHORT_RETENTION)",
+                path,
+                self.retention_hours,
+                table_hours,
+            )
+            return []
+        return table.vacuum(
+            retention_hours=self.retention_hours,
+            dry_run=False,
+            enforce_retention_duration=not self.allow_short_retention,
+        )
+
+    def run_once(self):
+        """Maintain every lakehouse table once."""
+        for path in self.tables:
+            try:
+                self.maintain_table(path)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Maintenance of {} failed: {}", path, e)
+
+    async def run_forever(self):
+        """Maintain the lakehouse every interval_seconds."""
+        while True:
+            # Maintenance is long-running I/O, keep it off the event loop
+            # and off the lakehouse writer pool
+            await asyncio.to_thread(self.run_once)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        """Start the maintenance loop as a background task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        """Stop the maintenance background task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+_INTERVAL_HOURS = {
+    "second": 1 / 3600,
+    "minute": 1 / 60,
+    "hour": 1,
+    "day": 24,
+    "week": 24 * 7,
+}
+
+
+def _table_retention_hours(table: DeltaTable) -> float:
+    """Deleted file retention of a table, Delta's default of a week if unset."""
+    interval = table.metadata().configuration.get(
+        "delta.deletedFileRetentionDuration", "interval 1 week"
+    )
+    # Values read like "interval 7 days"
+    _, amount, unit = interval.lower().split()
+    return float(amount) * _INTERVAL_HOURS[unit.rstrip("s")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lakehouse maintenance")
+    parser.add_argument(
+        "--once", action="store_true", help="Run a single maintenance pass"
+    )
+    args = parser.parse_args()
+
+    maintenance = LakehouseMaintenance()
+
+    if args.once:
+        maintenance.run_once()
+    else:
+        asyncio.run(maintenance.run_forever())
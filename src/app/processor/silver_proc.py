@@ -2,14 +2,25 @@
 
 import datetime
 import json
+import time
 
 import asyncio
 
 import polars as pl
 from loguru import logger
 
+from app.constants import (
+    LAKEHOUSE_BRONZE_LOGIN,
+    LAKEHOUSE_BRONZE_BUY,
+    LAKEHOUSE_BRONZE_SCROLL,
+    LAKEHOUSE_BRONZE_ORDER,
+    settings,
+)
 from app.llm import OllamaClient
 from app.models.fraud import FraudScore
+from app.service.gold_sink import write_fraud_score
+from app.service.partitioning import EVENT_DATE, EVENT_HOUR, partition_scheme
+from app.service.prompt_format import format_events, prompt_metrics
 
 llm_client = OllamaClient()
 
@@ -23,11 +34,16 @@ async def process_fraud(user_id: str):
     # Here we query the Delta tables directly for simplicity
 
     try:
-        # Load recent history (last 30 days usually, but here all for demo)
-        df_logins = _load_table("lakehouse/bronze/login", user_id)
-        df_buys = _load_table("lakehouse/bronze/buy", user_id)
-        df_scrolls = _load_table("lakehouse/bronze/scroll", user_id)
-        df_orders = _load_table("lakehouse/bronze/order", user_id)
+        # Load recent history, the whole of it when LAKEHOUSE_HISTORY_DAYS is 0
+        since = None
+        if settings.LAKEHOUSE_HISTORY_DAYS > 0:
+            since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+                days=settings.LAKEHOUSE_HISTORY_DAYS
+            )
+        df_logins = _load_table(LAKEHOUSE_BRONZE_LOGIN, user_id, since)
+        df_buys = _load_table(LAKEHOUSE_BRONZE_BUY, user_id, since)
+        df_scrolls = _load_table(LAKEHOUSE_BRONZE_SCROLL, user_id, since)
+        df_orders = _load_table(LAKEHOUSE_BRONZE_ORDER, user_id, since)
 
         # Prepare context for LLM
         context = {
@@ -42,7 +58,11 @@ async def process_fraud(user_id: str):
 
         # Call LLM
         # We run this in a thread pool to avoid blocking the async event loop
-        response_json = await asyncio.to_thread(llm_client.generate, prompt)
+        started = time.perf_counter()
+        response_json = await asyncio.to_thread(
+            llm_client.generate, prompt, ("fraud_probability", "reason")
+        )
+        prompt_metrics.record_inference("history", time.perf_counter() - started)
 
         if response_json:
             try:
@@ -58,7 +78,7 @@ async def process_fraud(user_id: str):
                 )
 
                 # Write to Gold layer
-                _write_fraud_score(fraud_score)
+                await write_fraud_score(fraud_score)
 
             except json.JSONDecodeError:
                 logger.error("Failed to parse LLM response: %s", response_json)
@@ -67,38 +87,50 @@ async def process_fraud(user_id: str):
         logger.error("Error processing fraud for user %s: %s", user_id, e)
 
 
-def _load_table(path: str, user_id: str) -> pl.DataFrame:
-    """Load data from Delta table filtered by user_id."""
+def _load_table(
+    path: str, user_id: str, since: datetime.datetime | None = None
+) -> pl.DataFrame:
+    """Load the rows of a user from a Delta table, from ``since`` on.
+
+    The scan is lazy: the user and time predicates are pushed down, so
+    date partitions before ``since`` are skipped and Parquet row groups are
+    pruned on their statistics. The user and partition columns, the same
+    on every row, are not read.
+    """
     try:
-        return pl.read_delta(path).filter(pl.col("user_id") == user_id)
+        scan = pl.scan_delta(path)
+        schema = scan.collect_schema()
+        predicate = pl.col("user_id") == user_id
+        time_column = partition_scheme(path).time_column
+        if since is not None:
+            if EVENT_DATE in schema:
+                predicate &= pl.col(EVENT_DATE) >= since.date()
+            dtype = schema.get(time_column) if time_column else None
+            if isinstance(dtype, pl.Datetime):
+                if dtype.time_zone is None:
+                    since = since.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+                predicate &= pl.col(str(time_column)) >= since
+        return (
+            scan.filter(predicate)
+            .select(pl.exclude("user_id", EVENT_DATE, EVENT_HOUR))
+            .collect()
+        )
     except Exception as e:  # pylint: disable=broad-exception-caught
         logger.warning("Error loading table %s: %s", path, e)
         return pl.DataFrame()
 
 
-def _write_fraud_score(score: FraudScore):
-    """Write fraud score to Delta Lake."""
-    # Ensure directory exists
-    import os  # pylint: disable=import-outside-toplevel
-
-    os.makedirs("lakehouse/gold/fraud_score", exist_ok=True)
-
-    df = pl.DataFrame([score.model_dump()])
-    df.write_delta(
-        target="lakehouse/gold/fraud_score",
-        mode="append",
-        delta_write_options={"partition_by": "user_id"},
-    )
-    logger.info("Written fraud score: %s", score)
-
-
 def _build_fraud_prompt(context: dict) -> str:
     """Build prompt for fraud detection."""
-    return f"""
+    if settings.LLM_PROMPT_FORMAT == "compact":
+        activity, omitted = _format_history(context, settings.LLM_PROMPT_MAX_TOKENS)
+    else:
+        activity, omitted = json.dumps(context, default=str, indent=2), 0
+    prompt = f"""
     Analyze the following user activity history for fraud detection.
 
     User Activity:
-    {json.dumps(context, default=str, indent=2)}
+    {activity}
 
     Task:
     Calculate the probability (0 to 1) that the recent activity is fraudulent.
@@ -114,3 +146,23 @@ def _build_fraud_prompt(context: dict) -> str:
         "reason": "<brief explanation>"
     }}
     """
+    prompt_metrics.record_prompt("history", prompt, omitted)
+    return prompt
+
+
+def _format_history(context: dict, max_tokens: int) -> tuple[str, int]:
+    """Render each non-empty table of the history within a share of the budget."""
+    tables = {name: rows for name, rows in context.items() if isinstance(rows, list)}
+    share = max_tokens // max(1, sum(1 for rows in tables.values() if rows))
+    sections = [f"user_id: {context['user_id']}"]
+    omitted = 0
+    for name, rows in tables.items():
+        if not rows:
+            continue
+        # The user and the partition columns are the same on every row
+        text, left_out = format_events(
+            rows, share, exclude=("user_id", EVENT_DATE, EVENT_HOUR)
+        )
+        sections.append(f"{name}:\n{text}")
+        omitted += left_out
+    return "\n".join(sections), omitted
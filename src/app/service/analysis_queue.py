@@ -0,0 +1,136 @@
+"""Background queue of window analyses, off the consumer path."""
+
+import asyncio
+import itertools
+import time
+
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+from app.constants import settings
+
+
+@dataclass(order=True)
+class AnalysisJob:
+    """A queued analysis, ordered by priority then submission order."""
+
+    priority: tuple[int, int]
+    sequence: int
+    deadline: float = field(compare=False)
+    item: Any = field(compare=False)
+
+
+class AnalysisQueue:  # pylint: disable=too-many-instance-attributes
+    """Bounded priority queue of analyses drained by a pool of workers.
+
+    ``submit`` never waits: a job is rejected when the queue is full, and
+    a job whose deadline passed while it was queued is dropped instead of
+    analyzed, its findings being stale by then. Rejected, stale and failed
+    jobs, and those unfinished at shutdown, are handed to ``on_drop`` so the
+    caller can release what it holds for them. Workers start on the first
+    submission.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        process: Callable[[Any], Awaitable[None]],
+        *,
+        on_drop: Callable[[Any], Awaitable[None]] | None = None,
+        workers: int = settings.FRAUD_ANALYSIS_WORKERS,
+        max_size: int = settings.FRAUD_ANALYSIS_QUEUE_MAX_JOBS,
+        deadline_seconds: float = settings.FRAUD_ANALYSIS_DEADLINE_SECONDS,
+    ):
+        """Initialize AnalysisQueue."""
+        self.process = process
+        self.on_drop = on_drop
+        self.workers = workers
+        self.max_size = max_size
+        self.deadline_seconds = deadline_seconds
+        self.processed = 0
+        self.rejected = 0
+        self.expired = 0
+
+        self._queue: asyncio.PriorityQueue[AnalysisJob] = asyncio.PriorityQueue(
+            max_size
+        )
+        self._sequence = itertools.count()
+        self._tasks: list[asyncio.Task] = []
+        self._drops: set[asyncio.Task] = set()
+
+    def stats(self) -> dict:
+        """Queue depth and job counters for monitoring."""
+        return {
+            "depth": self._queue.qsize(),
+            "max_size": self.max_size,
+            "workers": len(self._tasks),
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
+
+    def submit(self, item: Any, priority: tuple[int, int] = (0, 0)) -> bool:
+        """Queue an item for analysis, returning False if it was rejected."""
+        self.start()
+        job = AnalysisJob(
+            priority,
+            next(self._sequence),
+            time.monotonic() + self.deadline_seconds,
+            item,
+        )
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning("Analysis queue full, rejecting job")
+            self._drop(item)
+            return False
+        return True
+
+    def start(self):
+        """Start the worker tasks."""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._work()) for _ in range(self.workers)
+            ]
+
+    async def stop(self):
+        """Stop the workers, dropping the jobs not analyzed yet or in flight."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            self._drop(self._queue.get_nowait().item)
+        await asyncio.gather(*self._drops, return_exceptions=True)
+
+    async def _work(self):
+        """Analyze queued jobs until cancelled."""
+        while True:
+            job = await self._queue.get()
+            try:
+                if time.monotonic() > job.deadline:
+                    self.expired += 1
+                    logger.warning("Dropping analysis queued past its deadline")
+                    self._drop(job.item)
+                    continue
+                await self.process(job.item)
+                self.processed += 1
+            except asyncio.CancelledError:
+                # Stopped in the middle of the analysis
+                self._drop(job.item)
+                raise
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Analysis job failed: {}", e)
+                self._drop(job.item)
+            finally:
+                self._queue.task_done()
+
+    def _drop(self, item: Any):
+        """Hand a job that will not be analyzed to on_drop."""
+        if self.on_drop is None:
+            return
+        task = asyncio.ensure_future(self.on_drop(item))
+        self._drops.add(task)
+        task.add_done_callback(self._drops.discard)
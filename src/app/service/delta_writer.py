@@ -0,0 +1,247 @@
+"""Buffered Delta Lake writer."""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import polars as pl
+from loguru import logger
+
+from app.constants import settings
+from app.service.lakehouse_executor import LakehouseExecutor, lakehouse_executor
+from app.service.offsets import PendingOffsets
+from app.service.partitioning import PartitionScheme, partition_scheme
+
+
+def _estimate_size(row: dict) -> int:
+    """Roughly estimate the in-memory size of a row in bytes."""
+    return sum(len(value) if isinstance(value, str) else 8 for value in row.values())
+
+
+class BufferedDeltaWriter:  # pylint: disable=too-many-instance-attributes
+    """Buffers rows for a single Delta table and appends them in micro-batches.
+
+    A flush is triggered when the buffer reaches ``max_rows`` rows,
+    ``max_bytes`` estimated bytes, or when the oldest buffered row is older
+    than ``max_latency`` seconds. Every flush produces one Delta commit,
+    written on the lakehouse executor so the event loop is never blocked.
+    Kafka offsets passed along with the rows are committed only once the
+    Delta commit holding them succeeded. A batch failing ``max_retries``
+    flushes in a row is written to ``dead_letter`` as NDJSON and dropped, so
+    one bad batch cannot wedge the table or grow the buffer without bound.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        target: str,
+        scheme: PartitionScheme | None = None,
+        *,
+        max_rows: int = settings.LAKEHOUSE_FLUSH_MAX_ROWS,
+        max_bytes: int = settings.LAKEHOUSE_FLUSH_MAX_BYTES,
+        max_latency: float = settings.LAKEHOUSE_FLUSH_INTERVAL_SECONDS,
+        max_retries: int = settings.LAKEHOUSE_FLUSH_MAX_RETRIES,
+        dead_letter: str | None = None,
+        executor: LakehouseExecutor = lakehouse_executor,
+    ):
+        """Initialize BufferedDeltaWriter."""
+        self.target = target
+        self.scheme = scheme or partition_scheme(target)
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_latency = max_latency
+        self.max_retries = max_retries
+        self.dead_letter = dead_letter or (
+            f"{settings.LAKEHOUSE_DEAD_LETTER_PATH}/{target.strip('/').replace('/', '_')}"
+        )
+        self.executor = executor
+
+        self._rows: list[dict] = []
+        self._frames: list[pl.DataFrame] = []
+        self._offsets = PendingOffsets()
+        self._pending = 0
+        self._bytes = 0
+        self._first_row_at: float | None = None
+        self._failures = 0
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+
+    @property
+    def pending_rows(self) -> int:
+        """Number of rows waiting to be flushed."""
+        return self._pending
+
+    async def write(self, rows: list[dict], offsets: PendingOffsets | None = None):
+        """Buffer rows and flush if a size threshold is reached."""
+        self._rows.extend(rows)
+        await self._buffered(
+            len(rows), sum(_estimate_size(row) for row in rows), offsets
+        )
+
+    async def write_frame(
+        self, df: pl.DataFrame, offsets: PendingOffsets | None = None
+    ):
+        """Buffer an already columnar batch and flush if a threshold is reached."""
+        if not df.is_empty():
+            self._frames.append(df)
+        await self._buffered(df.height, int(df.estimated_size()), offsets)
+
+    async def flush(self):
+        """Append all buffered rows to the Delta table in a single commit."""
+        async with self._lock:
+            if not self._pending:
+                # Nothing to write, offsets of rejected messages are done
+                offsets, self._offsets = self._offsets, PendingOffsets()
+                self._first_row_at = None
+                await self._commit(offsets)
+                return
+
+            rows, frames, offsets = self._rows, self._frames, self._offsets
+            pending, size = self._pending, self._bytes
+            self._rows, self._frames = [], []
+            self._offsets = PendingOffsets()
+            self._pending = 0
+            self._bytes = 0
+            self._first_row_at = None
+
+            try:
+                await self.executor.run(self._write_batch, rows, frames)
+            except Exception as e:
+                self._failures += 1
+                if self._failures >= self.max_retries:
+                    self._failures = 0
+                    await self._dead_letter(rows, frames, offsets, e)
+                    return
+                # Put the rows back so they are retried on the next flush
+                self._rows[:0] = rows
+                self._frames[:0] = frames
+                self._offsets.merge(offsets)
+                self._pending += pending
+                self._bytes += size
+                self._first_row_at = time.monotonic()
+                raise
+
+            self._failures = 0
+            logger.debug("Flushed {} rows to {}", pending, self.target)
+            await self._commit(offsets)
+
+    async def close(self):
+        """Stop the latency timer and flush remaining rows."""
+        if self._timer is not None:
+            # A flush of the timer in progress completes first, cancelling
+            # it mid-write would lose the rows and offsets it took over
+            async with self._lock:
+                self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        await self.flush()
+
+    def _write_batch(self, rows: list[dict], frames: list[pl.DataFrame]):
+        """Write a batch of rows to the Delta table."""
+        delta_write_options = {}
+        if self.scheme.partition_by:
+            delta_write_options["partition_by"] = self.scheme.partition_by
+
+        if rows:
+            frames = [*frames, pl.DataFrame(rows)]
+        df = self.scheme.apply(pl.concat(frames, how="vertical_relaxed"))
+        df.write_delta(
+            target=self.target,
+            mode="append",
+            delta_write_options=delta_write_options,
+        )
+
+    def _write_dead_letter(self, rows: list[dict], frames: list[pl.DataFrame]) -> str:
+        """Write a batch the Delta table keeps rejecting to an NDJSON file."""
+        path = Path(self.dead_letter) / f"{time.time_ns()}.ndjson"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as file:
+            for row in rows:
+                file.write(json.dumps(row, default=str) + "\n")
+            for frame in frames:
+                frame.write_ndjson(file)
+        return str(path)
+
+    async def _dead_letter(
+        self,
+        rows: list[dict],
+        frames: list[pl.DataFrame],
+        offsets: PendingOffsets,
+        error: Exception,
+    ):
+        """Give up on a batch, keeping it on disk when possible."""
+        pending = len(rows) + sum(frame.height for frame in frames)
+        try:
+            path = await self.executor.run(self._write_dead_letter, rows, frames)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error(
+                "Dropped {} rows for {} after {} failed flushes ({}), "
+                "dead letter failed: {}",
+                pending,
+                self.target,
+                self.max_retries,
+                error,
+                e,
+            )
+            return
+
+        logger.error(
+            "Moved {} rows for {} to {} after {} failed flushes: {}",
+            pending,
+            self.target,
+            path,
+            self.max_retries,
+            error,
+        )
+        await self._commit(offsets)
+
+    async def _commit(self, offsets: PendingOffsets):
+        """Commit the offsets of flushed rows."""
+        try:
+            await offsets.commit()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Rows are durable, the next flush commits past these offsets
+            logger.error("Failed to commit offsets for {}: {}", self.target, e)
+
+    async def _buffered(
+        self, rows: int, size: int, offsets: PendingOffsets | None = None
+    ):
+        """Account for newly buffered rows and flush on size thresholds."""
+        if offsets is not None:
+            self._offsets.merge(offsets)
+        if not rows:
+            if offsets is not None and not self._pending:
+                # No buffered rows precede them, the offsets are done
+                await self.flush()
+            return
+
+        if self._first_row_at is None:
+            self._first_row_at = time.monotonic()
+        self._pending += rows
+        self._bytes += size
+        self._ensure_timer()
+
+        if self._pending >= self.max_rows or self._bytes >= self.max_bytes:
+            await self.flush()
+
+    def _ensure_timer(self):
+        """Start the max-latency flush timer if it is not running."""
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        """Flush buffered rows once they exceed the maximum latency."""
+        while self._first_row_at is not None:
+            delay = self._first_row_at + self.max_latency - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            try:
+                await self.flush()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Failed to flush rows to {}: {}", self.target, e)
+                await asyncio.sleep(self.max_latency)
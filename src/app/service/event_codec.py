@@ -0,0 +1,150 @@
+"""Compact binary encoding of fraud window events stored in Redis."""
+
+import datetime
+import random
+import struct
+
+from typing import Any
+
+from app.models.fraud import EventType
+
+VERSION = 1
+
+# Fields kept for the analysis, in encoding order. user_id is left out as
+# it is already part of the window key. Append new fields at the end only.
+FIELDS: tuple[tuple[str, str], ...] = (
+    ("timestamp", "datetime"),
+    ("event_type", "str"),
+    ("ip_address", "str"),
+    ("device_id", "str"),
+    ("user_agent", "str"),
+    ("success", "bool"),
+    ("order_id", "str"),
+    ("payment_method", "str"),
+    ("article_id", "str"),
+    ("percentage", "float"),
+    ("duration_seconds", "float"),
+)
+
+# Version, random nonce keeping identical events distinct members of the
+# window, and the bitmap of the fields present
+_HEADER = struct.Struct("<BIH")
+_DOUBLE = struct.Struct("<d")
+_INT64 = struct.Struct("<q")
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def encode_event(event: dict) -> bytes:
+    """Encode the analysis fields of an event into a unique compact member."""
+    present = 0
+    body = bytearray()
+    for bit, (name, kind) in enumerate(FIELDS):
+        value = event.get(name)
+        if value is None:
+            continue
+        present |= 1 << bit
+        if kind == "str":
+            _write_str(body, str(value))
+        elif kind == "float":
+            body += _DOUBLE.pack(float(value))
+        elif kind == "bool":
+            body.append(1 if value else 0)
+        else:
+            body += _INT64.pack(_to_micros(value))
+    return _HEADER.pack(VERSION, random.getrandbits(32), present) + bytes(body)
+
+
+def decode_event(data: bytes) -> dict:
+    """Decode a member written by encode_event."""
+    try:
+        return _decode(data)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"Malformed event encoding: {e}") from e
+
+
+def _decode(data: bytes) -> dict:
+    """Decode the header and the fields present."""
+    version, _, present = _HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"Unsupported event encoding version {version}")
+
+    event: dict[str, Any] = {}
+    offset = _HEADER.size
+    for bit, (name, kind) in enumerate(FIELDS):
+        if not present & (1 << bit):
+            continue
+        if kind == "str":
+            event[name], offset = _read_str(data, offset)
+        elif kind == "float":
+            (event[name],) = _DOUBLE.unpack_from(data, offset)
+            offset += _DOUBLE.size
+        elif kind == "bool":
+            event[name] = bool(data[offset])
+            offset += 1
+        else:
+            (micros,) = _INT64.unpack_from(data, offset)
+            event[name] = _EPOCH + datetime.timedelta(microseconds=micros)
+            offset += _INT64.size
+    return event
+
+
+def event_kind(event: dict) -> str:
+    """Event type, inferred from the fields when not explicit."""
+    if event.get("event_type"):
+        return str(event["event_type"])
+    if "success" in event:
+        return EventType.LOGIN.value
+    if "payment_method" in event:
+        return EventType.BUY.value
+    if "percentage" in event:
+        return EventType.SCROLL.value
+    return "other"
+
+
+def event_timestamp(event: dict) -> float | None:
+    """Epoch seconds of the timestamp of an event, if any."""
+    value = event.get("timestamp")
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.timestamp()
+    return None if value is None else float(value)
+
+
+def _to_micros(value: Any) -> int:
+    """Convert a datetime, ISO string or epoch seconds to epoch microseconds."""
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return (value - _EPOCH) // datetime.timedelta(microseconds=1)
+    return int(float(value) * 1_000_000)
+
+
+def _write_str(buffer: bytearray, value: str):
+    """Append a varint length-prefixed UTF-8 string."""
+    raw = value.encode("utf-8")
+    length = len(raw)
+    while length >= 0x80:
+        buffer.append((length & 0x7F) | 0x80)
+        length >>= 7
+    buffer.append(length)
+    buffer += raw
+
+
+def _read_str(data: bytes, offset: int) -> tuple[str, int]:
+    """Read a varint length-prefixed UTF-8 string."""
+    length = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        length |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    end = offset + length
+    return data[offset:end].decode("utf-8"), end
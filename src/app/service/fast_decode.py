@@ -0,0 +1,166 @@
+"""Columnar decoding of raw Kafka message batches."""
+
+import datetime
+import io
+import re
+import types
+
+from dataclasses import dataclass, field
+from typing import Any, Optional, Sequence, Union, get_args, get_origin
+
+import polars as pl
+from pydantic import BaseModel, ValidationError
+from pydantic_core import InitErrorDetails
+
+_NoneType = type(None)
+
+_INT64_MIN, _INT64_MAX = -(2**63), 2**63 - 1
+
+_POLARS_TYPES: dict[Any, pl.DataType] = {
+    str: pl.String(),
+    int: pl.Int64(),
+    float: pl.Float64(),
+    bool: pl.Boolean(),
+    datetime.datetime: pl.Datetime("us", "UTC"),
+}
+
+
+@dataclass
+class DecodedBatch:
+    """Valid rows of a batch as a DataFrame plus the rejected rows."""
+
+    frame: pl.DataFrame
+    errors: list[tuple[int, ValidationError]] = field(default_factory=list)
+
+
+def polars_schema(model: type[BaseModel]) -> dict[str, pl.DataType]:
+    """Derive a Polars schema from the fields of a Pydantic model."""
+    schema = {}
+    for name, model_field in model.model_fields.items():
+        annotation = model_field.annotation
+        if _is_nullable(annotation):
+            annotation = next(a for a in get_args(annotation) if a is not _NoneType)
+        if annotation not in _POLARS_TYPES:
+            raise TypeError(f"Unsupported field type for {model.__name__}.{name}")
+        schema[name] = _POLARS_TYPES[annotation]
+    return schema
+
+
+def decode_batch(payloads: Sequence[bytes], model: type[BaseModel]) -> DecodedBatch:
+    """Decode JSON messages straight into a DataFrame typed after the model.
+
+    The batch is parsed as NDJSON with every field read as text and cast
+    column by column, without building a Pydantic object per message. Rows
+    the columnar casts cannot type (missing required fields, unexpected
+    formats, malformed JSON) or holding a non-string JSON value in a text
+    field are re-validated with the model, so they are either recovered or
+    rejected with the model's ValidationError.
+    """
+    schema = polars_schema(model)
+    try:
+        raw = pl.read_ndjson(
+            io.BytesIO(b"\n".join(payloads)),
+            schema={name: pl.String() for name in schema},
+        )
+    except pl.exceptions.ComputeError:
+        raw = None
+
+    # Malformed JSON, or payloads spanning several lines
+    if raw is None or raw.height != len(payloads):
+        return _decode_rows(payloads, model, schema, range(len(payloads)))
+
+    typed = raw.select(_cast(name, dtype) for name, dtype in schema.items())
+
+    invalid = _non_string_values(payloads, _text_fields(model))
+    for name, model_field in model.model_fields.items():
+        failed_cast = typed[name].is_null() & raw[name].is_not_null()
+        nullable = _is_nullable(model_field.annotation)
+        missing = False if nullable else typed[name].is_null()
+        invalid = invalid | failed_cast | missing
+
+    invalid_indices = invalid.arg_true().to_list()
+    if not invalid_indices:
+        return DecodedBatch(typed)
+
+    fallback = _decode_rows(payloads, model, schema, invalid_indices)
+    fallback.frame = pl.concat([typed.filter(~invalid), fallback.frame])
+    return fallback
+
+
+def _text_fields(model: type[BaseModel]) -> list[str]:
+    """Names of the fields of a model typed as strings."""
+    return [
+        name
+        for name, model_field in model.model_fields.items()
+        if model_field.annotation in (str, Optional[str])
+    ]
+
+
+def _non_string_values(payloads: Sequence[bytes], names: list[str]) -> pl.Series:
+    """Flag messages holding a number, boolean, array or object in a text field.
+
+    Reading NDJSON as text turns those values into strings, while the model
+    rejects them, so the raw message is checked for the JSON type instead.
+    """
+    lines = pl.Series(payloads, dtype=pl.Binary).cast(pl.String)
+    flagged = pl.repeat(False, len(payloads), eager=True)
+    for name in names:
+        flagged = flagged | lines.str.contains(
+            rf'"{re.escape(name)}"\s*:\s*[-\d\[{{tf]'
+        )
+    return flagged
+
+
+def _cast(name: str, dtype: pl.DataType) -> pl.Expr:
+    """Cast a text column to its target type, yielding nulls on failure."""
+    column = pl.col(name)
+    if dtype == pl.Boolean():
+        return column.replace_strict(
+            {"true": True, "false": False}, default=None, return_dtype=pl.Boolean
+        )
+    if isinstance(dtype, pl.Datetime):
+        return column.str.to_datetime(time_unit="us", time_zone="UTC", strict=False)
+    return column.cast(dtype, strict=False)
+
+
+def _is_nullable(annotation: Any) -> bool:
+    """Check whether a field annotation accepts None."""
+    return get_origin(annotation) in (Union, types.UnionType) and (
+        _NoneType in get_args(annotation)
+    )
+
+
+def _decode_rows(
+    payloads: Sequence[bytes],
+    model: type[BaseModel],
+    schema: dict[str, pl.DataType],
+    indices: Sequence[int],
+) -> DecodedBatch:
+    """Validate selected messages one by one with the Pydantic model.
+
+    Integers the model accepts but an Int64 column cannot hold are rejected
+    here, as they would otherwise fail building the frame for the whole batch.
+    """
+    rows = []
+    errors = []
+    for index in indices:
+        try:
+            row = model.model_validate_json(payloads[index]).model_dump()
+        except ValidationError as e:
+            errors.append((index, e))
+            continue
+
+        too_big: list[InitErrorDetails] = [
+            {"type": "int_parsing_size", "loc": (name,), "input": row[name]}
+            for name, dtype in schema.items()
+            if dtype == pl.Int64()
+            and row[name] is not None
+            and not _INT64_MIN <= row[name] <= _INT64_MAX
+        ]
+        if too_big:
+            errors.append(
+                (index, ValidationError.from_exception_data(model.__name__, too_big))
+            )
+            continue
+        rows.append(row)
+    return DecodedBatch(pl.DataFrame(rows, schema=schema), errors)
@@ -1,92 +1,337 @@
 """Fraud detection service."""
 
+import asyncio
+import functools
 import json
 
 import time
 import datetime
 
+from dataclasses import dataclass
+from typing import Any, Sequence
+
 import redis.asyncio as redis
+from redis.exceptions import NoScriptError
 from loguru import logger
 
 from app.constants import settings
-from app.models.fraud import FraudScore
-from app.processor.silver_proc import _write_fraud_score
+from app.log_config import WINDOW, sampled
+from app.models.fraud import EventType, FraudScore
+from app.service.analysis_queue import AnalysisQueue
+from app.service.event_codec import decode_event, encode_event, event_kind
+from app.service.gold_sink import write_fraud_score
 from app.service.llm_provider import LLMProvider, FraudResult
+from app.service.prefilter import WindowPrefilter
+from app.service.rule_scorer import RuleScorer
+from app.service.redis_shards import connect_shards, hash_tag
+from app.service.single_flight import SingleFlight
+from app.service.window_rules import load_rules
+
+
+# Sliding-window rules of one user evaluated atomically on the server.
+# KEYS: event log zset, alert lock, then one zset per rule
+# ARGV: now, alert lock TTL, then for the log and each rule in turn: window
+#       seconds, threshold (0 for the log), members kept, number of new
+#       members, and the arrival time and value of each new member
+# Returns {counts} or, when the caller must analyze, {counts, events}, the
+# counts of the log then of each rule
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local arg = 3
+local counts = {}
+local breached = false
+for k = 1, #KEYS do
+    if k ~= 2 then
+        local window = tonumber(ARGV[arg])
+        local threshold = tonumber(ARGV[arg + 1])
+        local keep = tonumber(ARGV[arg + 2])
+        local last = arg + 3 + 2 * tonumber(ARGV[arg + 3])
+        for i = arg + 4, last, 2 do
+            redis.call('ZADD', KEYS[k], ARGV[i], ARGV[i + 1])
+        end
+        arg = last + 1
+        redis.call('ZREMRANGEBYSCORE', KEYS[k], '-inf', now - window)
+        redis.call('ZREMRANGEBYRANK', KEYS[k], 0, -keep - 1)
+        redis.call('EXPIRE', KEYS[k], math.ceil(window) + 60)
+        local count = redis.call('ZCARD', KEYS[k])
+        counts[#counts + 1] = count
+        if threshold > 0 and count >= threshold then
+            breached = true
+        end
+    end
+end
+if not breached or not redis.call('SET', KEYS[2], '1', 'NX', 'EX', ARGV[2]) then
+    return {counts}
+end
+return {counts, redis.call('ZRANGE', KEYS[1], 0, -1)}
+"""
+
+
+@dataclass
+class WindowBreach:
+    """A user whose window crossed the threshold and must be analyzed."""
+
+    user_id: str
+    count: int
+    events: list[dict]
+    # Names of the rules breached
+    rules: tuple[str, ...] = ()
+
+
+def _decode_window(members: list[bytes]) -> list[dict]:
+    """Decode window members, skipping those in another encoding."""
+    events = []
+    for member in members:
+        try:
+            events.append(decode_event(member))
+        except ValueError as e:
+            # e.g. JSON members written before the binary encoding
+            logger.debug("Skipping undecodable window member: {}", e)
+    return events
+
+
+def _alert_key(user_id: str) -> str:
+    """Key of the alert lock of a user."""
+    return f"last_alert:{hash_tag(user_id)}"
+
+
+def _breach_priority(breach: WindowBreach) -> tuple[int, int]:
+    """Windows with purchases first, then the busiest windows first."""
+    has_buy = any(event_kind(event) == EventType.BUY.value for event in breach.events)
+    return (0 if has_buy else 1, -breach.count)
 
 
-class FraudService:
+class FraudService:  # pylint: disable=too-many-instance-attributes
     """Orchestrates the Hot Path (Redis) and Intelligence (LLM)."""
 
     def __init__(self, redis_url: str | None = None):
         """Initialize FraudService."""
-        self.redis = redis.from_url(
-            redis_url or settings.REDIS_URL, decode_responses=True
-        )
+        # Window members are binary encoded events
+        self.shards = connect_shards(redis_url)
         self.llm = LLMProvider()
-        self.window_seconds = 120  # 2 minutes
-        self.threshold_count = 10
+        self.window_rules = load_rules(settings.FRAUD_WINDOW_RULES)
+        # The event log covers the longest rule window
+        self.window_seconds = max(rule.window_seconds for rule in self.window_rules)
+        self.alert_lock_seconds = settings.FRAUD_ALERT_LOCK_SECONDS
+        self.max_window_events = settings.FRAUD_WINDOW_MAX_EVENTS
+        self.sliding_window = self.shards.clients[0].register_script(
+            SLIDING_WINDOW_SCRIPT
+        )
+        # Concurrent breaches of a user share one analysis
+        self.in_flight = SingleFlight()
+        # Keeps users far from the threshold out of Redis, escalating them
+        # no later than the most sensitive rule could breach
+        self.prefilter = (
+            WindowPrefilter(
+                self.window_seconds,
+                escalate_at=min(
+                    settings.FRAUD_PREFILTER_ESCALATE_AT,
+                    *(rule.threshold for rule in self.window_rules),
+                ),
+            )
+            if settings.FRAUD_PREFILTER_ENABLED
+            else None
+        )
+        # Clear-cut windows are decided without the LLM
+        self.rules = RuleScorer() if settings.FRAUD_RULES_ENABLED else None
+        # Analyses drain in the background, the consumer never waits on the LLM
+        self.analysis_queue = (
+            AnalysisQueue(self.analyze, on_drop=self._release_alert)
+            if settings.FRAUD_ANALYSIS_QUEUE_ENABLED
+            else None
+        )
 
     async def process_event(self, user_id: str, event: dict):
         """Process an event for fraud detection."""
-        # Ensure event is serializable
-        try:
-            event_str = json.dumps(event, default=str)
-        except (TypeError, ValueError) as e:
-            logger.error("Failed to serialize event for Redis: %s", e)
-            return
+        await self.process_events([(user_id, event)])
 
+    async def process_events(
+        self, events: Sequence[tuple[str, dict]]
+    ) -> list[WindowBreach]:
+        """Check the windows of a batch of events and analyze the breaches.
+
+        With the analysis queue the breaches are only submitted, otherwise
+        they are analyzed before returning.
+        """
         now_ts = time.time()
-        key = f"user_events:{user_id}"
-        alert_lock_key = f"last_alert:{user_id}"
+        if self.prefilter is None:
+            arrived = [(user_id, event, now_ts) for user_id, event in events]
+        else:
+            arrived = self.prefilter.admit(events, now_ts)
 
-        try:
-            async with self.redis.pipeline() as pipe:
-                # 1. Add event to ZSET (Score = Timestamp)
-                await pipe.zadd(key, {event_str: now_ts})
-                # 2. Remove old events (Sliding Window)
-                await pipe.zremrangebyscore(key, "-inf", now_ts - self.window_seconds)
-                # 3. Count remaining events
-                await pipe.zcard(key)
-                # 4. Refresh TTL on key
-                await pipe.expire(key, self.window_seconds + 60)
-
-                results = await pipe.execute()
-        except redis.RedisError as e:
-            logger.error("Redis operation failed: %s", e)
-            return
+        breaches = await self.check_windows(arrived, now_ts)
+        if self.analysis_queue is None:
+            await asyncio.gather(*(self.analyze(breach) for breach in breaches))
+        else:
+            for breach in breaches:
+                self.analysis_queue.submit(breach, _breach_priority(breach))
+        return breaches
 
-        current_count = results[2]
+    async def check_windows(
+        self, events: Sequence[tuple[str, dict, float]], now_ts: float
+    ) -> list[WindowBreach]:
+        """Evaluate every window rule of the users of a batch in one round-trip.
 
-        if current_count >= self.threshold_count:
-            # Check if we recently alerted
-            if await self.redis.get(alert_lock_key):
-                logger.info(
-                    "Skipping LLM: Alert already sent for %s in recent window.", user_id
-                )
-                return
-
-            # Get events for analysis
-            events_in_window = await self.redis.zrange(key, 0, -1)
-            # Parse back to dicts
-            parsed_events = [json.loads(e) for e in events_in_window]
-
-            # Trigger Intelligence
-            logger.warning(
-                "Threshold breached (%d) for %s. triggering LLM.",
-                current_count,
-                user_id,
+        Events are grouped per user and all the rules of a user are
+        evaluated by one script call, all of them sent in a single pipeline
+        per shard, the shards in parallel. Adding, trimming, counting and
+        taking the alert lock are atomic per user, so concurrent events of
+        a user cannot both trigger the LLM.
+        """
+        sections = self._group_members(events)
+        if not sections:
+            return []
+
+        groups = self.shards.group(sections)
+        results = await asyncio.gather(
+            *(
+                self._run_windows(self.shards.clients[shard], users, sections, now_ts)
+                for shard, users in groups.items()
             )
-            for parsed_event in parsed_events:
+        )
+
+        breaches = []
+        for user_id, window in (
+            pair
+            for users, windows in zip(groups.values(), results)
+            for pair in zip(users, windows)
+        ):
+            counts = window[0]
+            breached = tuple(
+                rule.name
+                for rule, count in zip(self.window_rules, counts[1:])
+                if count >= rule.threshold
+            )
+            if len(window) > 1:
+                breaches.append(
+                    WindowBreach(
+                        user_id, counts[0], _decode_window(window[1]), breached
+                    )
+                )
+            elif breached:
                 logger.info(
-                    "Event sent to LLM: {}", json.dumps(parsed_event, default=str)
+                    "Skipping LLM: Alert already sent for {} in recent window.", user_id
                 )
+        return breaches
+
+    async def _run_windows(
+        self,
+        client: Any,
+        users: list[str],
+        sections: dict[str, list[list[float | bytes | str]]],
+        now_ts: float,
+    ) -> list:
+        """Run the window script of users held by one shard in a pipeline.
+
+        A failing shard only skips the checks of its own users.
+        """
+        try:
+            for attempt in range(2):
+                try:
+                    async with client.pipeline(transaction=False) as pipe:
+                        for user_id in users:
+                            await self.sliding_window(
+                                keys=self._window_keys(user_id),
+                                args=self._window_args(sections[user_id], now_ts),
+                                client=pipe,
+                            )
+                        return await pipe.execute()
+                except NoScriptError:
+                    # Cluster pipelines do not load scripts, e.g. on a new node
+                    if attempt:
+                        raise
+                    await client.script_load(SLIDING_WINDOW_SCRIPT)
+        except redis.RedisError as e:
+            logger.error("Redis operation failed: {}", e)
+        return []
+
+    def _group_members(
+        self, events: Sequence[tuple[str, dict, float]]
+    ) -> dict[str, list[list[float | bytes | str]]]:
+        """New members of the event log and of each rule window, per user."""
+        sections: dict[str, list[list[float | bytes | str]]] = {}
+        for user_id, event, arrived_at in events:
+            try:
+                member = encode_event(event)
+            except (TypeError, ValueError, OverflowError) as e:
+                logger.error("Failed to encode event for Redis: {}", e)
+                continue
+            user = sections.setdefault(
+                user_id, [[] for _ in range(len(self.window_rules) + 1)]
+            )
+            user[0].extend((arrived_at, member))
+            for rule_members, rule in zip(user[1:], self.window_rules):
+                rule_member = rule.member(event)
+                if rule_member is not None:
+                    rule_members.extend((arrived_at, rule_member))
+        return sections
+
+    def _window_keys(self, user_id: str) -> list[str]:
+        """Keys of the event log, alert lock and rule windows of a user.
+
+        They share the hash tag of the user, so a script call touches a
+        single cluster slot.
+        """
+        tag = hash_tag(user_id)
+        return [
+            f"user_events:{tag}",
+            _alert_key(user_id),
+            *(f"user_rule:{tag}:{rule.name}" for rule in self.window_rules),
+        ]
 
-            result = await self.llm.analyze_behavior(parsed_events)
+    def _window_args(
+        self, user: list[list[float | bytes | str]], now_ts: float
+    ) -> list[float | bytes | str]:
+        """Script arguments adding the new members of a user to each window."""
+        args: list[float | bytes | str] = [now_ts, self.alert_lock_seconds]
+        # The log keeps the events for the analysis, it is not a rule
+        args.extend((self.window_seconds, 0, self.max_window_events, len(user[0]) // 2))
+        args.extend(user[0])
+        for rule, members in zip(self.window_rules, user[1:]):
+            # Counting up to the threshold is enough to detect a breach
+            args.extend(
+                (rule.window_seconds, rule.threshold, rule.threshold, len(members) // 2)
+            )
+            args.extend(members)
+        return args
+
+    async def analyze(self, breach: WindowBreach):
+        """Analyze the window of a user, once at a time per user."""
+        await self.in_flight.do(
+            breach.user_id, functools.partial(self._analyze, breach)
+        )
+
+    async def _analyze(self, breach: WindowBreach):
+        """Analyze the window of a user, with the LLM if rules cannot tell."""
+        logger.warning(
+            "Threshold breached ({}) for {}. analyzing window.",
+            breach.count,
+            breach.user_id,
+        )
+        for event in breach.events:
+            sampled(WINDOW).opt(lazy=True).info(
+                "Window event analyzed: {}",
+                functools.partial(json.dumps, event, default=str),
+            )
+
+        result = self.rules.score(breach.events) if self.rules is not None else None
+        if result is None:
+            result = await self.llm.analyze_behavior(breach.events, breach.user_id)
+
+        if result.score >= 0.6:
+            await self._handle_fraud_detection(breach.user_id, result)
+        else:
+            # Not fraud, let the next events of the window be analyzed
+            await self._release_alert(breach)
 
-            if result.score >= 0.6:
-                await self._handle_fraud_detection(user_id, result)
-                # Set alert lock to avoid spamming for the duration of this window
-                await self.redis.setex(alert_lock_key, self.window_seconds, "1")
+    async def _release_alert(self, breach: WindowBreach):
+        """Release the alert lock of a user, e.g. for a dropped analysis."""
+        try:
+            await self.shards.client_for(breach.user_id).delete(
+                _alert_key(breach.user_id)
+            )
+        except redis.RedisError as e:
+            logger.error("Failed to release alert lock of {}: {}", breach.user_id, e)
 
     async def _handle_fraud_detection(self, user_id: str, result: FraudResult):
         """Handle detected fraud."""
@@ -103,10 +348,14 @@ class FraudService:
             reason=result.reason,
         )
 
-        # Write to Gold layer (using existing processor function for now)
-        _write_fraud_score(fraud_score)
+        # Buffered for the next gold commit
+        await write_fraud_score(fraud_score)
 
     async def close(self):
         """Close resources."""
-        await self.redis.close()
+        if self.analysis_queue is not None:
+            await self.analysis_queue.stop()
+        # Analyses still running must not outlive the clients they use
+        await self.in_flight.cancel()
+        await self.shards.close()
         await self.llm.close()
@@ -0,0 +1,18 @@
+"""Buffered sink of the gold fraud score table."""
+
+from app.constants import LAKEHOUSE_GOLD_FRAUD_SCORE, settings
+from app.models.fraud import FraudScore
+from app.service.delta_writer import BufferedDeltaWriter
+
+# Detections are rare but bursty: a small latency keeps alerts fresh while a
+# bot wave still lands in a handful of commits
+fraud_score_writer = BufferedDeltaWriter(
+    LAKEHOUSE_GOLD_FRAUD_SCORE,
+    max_rows=settings.LAKEHOUSE_GOLD_FLUSH_MAX_ROWS,
+    max_latency=settings.LAKEHOUSE_GOLD_FLUSH_INTERVAL_SECONDS,
+)
+
+
+async def write_fraud_score(score: FraudScore):
+    """Buffer a fraud score for the next gold commit."""
+    await fraud_score_writer.write([score.model_dump()])
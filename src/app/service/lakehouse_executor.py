@@ -0,0 +1,48 @@
+"""Dedicated executor for lakehouse writes."""
+
+import asyncio
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.constants import settings
+
+
+class LakehouseExecutor:
+    """Runs blocking Delta Lake I/O on a dedicated thread pool.
+
+    Polars and deltalake release the GIL while encoding and writing Parquet,
+    so a small thread pool keeps the event loop responsive without the
+    serialization cost of a process pool.
+    """
+
+    def __init__(self, max_workers: int = settings.LAKEHOUSE_WRITER_WORKERS):
+        """Initialize LakehouseExecutor."""
+        self.max_workers = max_workers
+        self._pool: ThreadPoolExecutor | None = None
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        """Return the thread pool, creating it on first use."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="lakehouse-writer"
+            )
+        return self._pool
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking call on the writer pool and await its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.pool, functools.partial(func, *args, **kwargs)
+        )
+
+    def shutdown(self, wait: bool = True):
+        """Wait for pending writes and release the worker threads."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+lakehouse_executor = LakehouseExecutor()
@@ -1,14 +1,30 @@
 """LLM provider module."""
 
-import asyncio
+import dataclasses
+import functools
 import json
+import time
 
 from dataclasses import dataclass
 from typing import List
 
 import httpx
+import redis.asyncio as redis
 from loguru import logger
 from app.constants import settings
+from app.llm import JsonFieldStream, ollama_payload
+from app.service.prompt_format import format_events, prompt_metrics
+from app.service.resilience import (
+    AdaptiveLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    OverloadedError,
+)
+from app.service.single_flight import SingleFlight
+from app.service.verdict_cache import VerdictCache, window_fingerprint
+
+# Fields of the verdict generated by the LLM
+VERDICT_FIELDS = ("score", "reason")
 
 
 @dataclass
@@ -18,6 +34,8 @@ class FraudResult:
     score: float
     reason: str
     is_critical: bool
+    # Fail-safe result of a failed inference, never cached
+    error: bool = False
 
 
 class LLMProvider:
@@ -27,65 +45,121 @@ class LLMProvider:
         self,
         base_url: str = settings.OLLAMA_URL,
         model: str = settings.OLLAMA_MODEL,
-        concurrency_limit: int = 5,
+        concurrency_limit: int = settings.LLM_CONCURRENCY_INITIAL,
+        cache: VerdictCache | None = None,
     ):
         """Initialize LLMProvider."""
         self.base_url = base_url
         self.model = model
-        # Semaphore acts as a token bucket to limit concurrent queries
-        self.semaphore = asyncio.Semaphore(concurrency_limit)
-        self.client = httpx.AsyncClient(timeout=120.0)
-
-    async def analyze_behavior(self, events: List[dict]) -> FraudResult:
+        # Concurrent queries adapt to the latency of the backend, and fail
+        # fast while it is unhealthy
+        self.limiter = AdaptiveLimiter(initial=concurrency_limit)
+        self.breaker = CircuitBreaker()
+        self.client = httpx.AsyncClient(timeout=settings.LLM_TIMEOUT_SECONDS)
+        self.cache = cache or _default_cache()
+        self.in_flight = SingleFlight()
+
+    async def analyze_behavior(
+        self, events: List[dict], user_id: str | None = None
+    ) -> FraudResult:
+        """Analyze a batch of events, reusing the verdict of similar windows."""
+        fingerprint = window_fingerprint(events, user_id)
+        if self.cache is not None:
+            cached = await self.cache.get(fingerprint)
+            if cached is not None:
+                return FraudResult(**cached)
+
+        # Concurrent analyses of the same window pattern (e.g. one bot
+        # hitting many users) share a single inference
+        return await self.in_flight.do(
+            fingerprint, functools.partial(self._analyze_uncached, events, fingerprint)
+        )
+
+    async def _analyze_uncached(self, events: List[dict], fingerprint: str):
+        """Run the inference and cache its verdict."""
+        result = await self._infer(events)
+        if self.cache is not None and not result.error:
+            await self.cache.set(fingerprint, dataclasses.asdict(result))
+        return result
+
+    async def _infer(self, events: List[dict]) -> FraudResult:
         """Analyze a batch of events using the LLM."""
         prompt = self._build_system_prompt(events)
 
         try:
-            # Critical: Acquire semaphore before hitting the LLM
-            async with self.semaphore:
-                logger.debug("Acquired semaphore for LLM inference")
-                response = await self.client.post(
-                    f"{self.base_url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,
-                        "format": "json",
-                    },
-                )
-                response.raise_for_status()
-                data = response.json()
+            # Critical: Acquire a slot before hitting the LLM
+            with self.breaker.guard():
+                async with self.limiter.slot():
+                    logger.debug("Acquired slot for LLM inference")
+                    started = time.perf_counter()
+                    response_text = await self._generate(prompt)
+                    prompt_metrics.record_inference(
+                        "window", time.perf_counter() - started
+                    )
 
             # Parse response
-            response_text = data.get("response", "{}")
-
             try:
                 parsed = json.loads(response_text)
                 score = float(parsed.get("score", 0.0))
                 reason = parsed.get("reason", "No reason provided")
             except (json.JSONDecodeError, ValueError):
                 logger.error("Failed to parse LLM response JSON: %s", response_text)
-                return FraudResult(0.0, "Response Parsing Error", False)
+                return FraudResult(0.0, "Response Parsing Error", False, error=True)
 
             return FraudResult(score=score, reason=reason, is_critical=score >= 1.0)
 
+        except CircuitOpenError:
+            # Fail fast while the backend is unhealthy
+            return FraudResult(0.0, "LLM Unavailable", False, error=True)
+        except OverloadedError:
+            # Shed rather than hold the caller's locks in an endless queue
+            logger.warning("LLM overloaded, shedding analysis")
+            return FraudResult(0.0, "LLM Overloaded", False, error=True)
         except httpx.RequestError as e:
             logger.error("LLM connection failed: %s", e)
             # Fail safe
-            return FraudResult(0.0, f"Connection Error: {str(e)}", False)
+            return FraudResult(0.0, f"Connection Error: {str(e)}", False, error=True)
         except Exception as e:  # pylint: disable=broad-exception-caught
             logger.error("LLM inference failed: %s", e)
-            return FraudResult(0.0, f"Inference Error: {str(e)}", False)
+            return FraudResult(0.0, f"Inference Error: {str(e)}", False, error=True)
+
+    async def _generate(self, prompt: str) -> str:
+        """Generated text of a prompt, streamed if OLLAMA_STREAM is set."""
+        url = f"{self.base_url}/api/generate"
+        if not settings.OLLAMA_STREAM:
+            response = await self.client.post(
+                url, json=ollama_payload(self.model, prompt, stream=False)
+            )
+            response.raise_for_status()
+            return response.json().get("response", "{}")
+
+        parser = JsonFieldStream(VERDICT_FIELDS)
+        payload = ollama_payload(self.model, prompt, stream=True)
+        # Leaving the block early closes the connection, which makes Ollama
+        # stop generating
+        async with self.client.stream("POST", url, json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if parser.feed(chunk.get("response", "")) or chunk.get("done"):
+                    break
+        return parser.result()
 
     def _build_system_prompt(self, events: List[dict]) -> str:
-        return f"""
+        if settings.LLM_PROMPT_FORMAT == "compact":
+            rendered, omitted = format_events(events, settings.LLM_PROMPT_MAX_TOKENS)
+        else:
+            rendered, omitted = json.dumps(events, indent=2, default=str), 0
+        prompt = f"""
         SYSTEM: You are a Senior Fraud Analyst. Detect bot-like behavior.
 
         INPUT METADATA:
         timestamp, event_type, ip_address, user_agent, payload
 
         EVENTS ({len(events)} in window):
-        {json.dumps(events, indent=2, default=str)}
+        {rendered}
 
         CRITERIA:
         - High frequency (bot usage)
@@ -98,7 +172,21 @@ class LLMProvider:
             "reason": "<string>"
         }}
         """
+        prompt_metrics.record_prompt("window", prompt, omitted)
+        return prompt
 
     async def close(self):
-        """Close the HTTP client."""
+        """Close the HTTP client and the shared cache tier."""
         await self.client.aclose()
+        if self.cache is not None and self.cache.redis is not None:
+            await self.cache.redis.aclose()
+
+
+def _default_cache() -> VerdictCache | None:
+    """Verdict cache configured from the settings."""
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    redis_client = None
+    if settings.LLM_CACHE_REDIS_ENABLED:
+        redis_client = redis.from_url(settings.REDIS_URL)
+    return VerdictCache(redis_client=redis_client)
@@ -0,0 +1,65 @@
+"""Kafka offset tracking for commits after durable lakehouse writes."""
+
+import asyncio
+
+from typing import Annotated, Any
+
+from confluent_kafka import TopicPartition
+from faststream import Context
+from faststream.confluent.message import KafkaMessage
+
+# Message being handled, None when a handler is called directly
+ConsumedMessage = Annotated[KafkaMessage | None, Context("message", default=None)]
+
+
+class PendingOffsets:
+    """Highest consumed offset per partition, waiting for a durable write."""
+
+    def __init__(self):
+        """Initialize PendingOffsets."""
+        self.consumer: Any = None
+        self.offsets: dict[tuple[str, int], int] = {}
+
+    @classmethod
+    def from_message(cls, message: KafkaMessage) -> "PendingOffsets":
+        """Track the offsets of a single or batch message."""
+        pending = cls()
+        raw_message = message.raw_message
+        records = (
+            raw_message if isinstance(raw_message, (list, tuple)) else (raw_message,)
+        )
+        for record in records:
+            topic, partition, offset = (
+                record.topic(),
+                record.partition(),
+                record.offset(),
+            )
+            if topic is not None and partition is not None and offset is not None:
+                pending.update((topic, partition), offset)
+        pending.consumer = message.consumer
+        return pending
+
+    def update(self, partition: tuple[str, int], offset: int):
+        """Record a consumed offset of a partition."""
+        if offset > self.offsets.get(partition, -1):
+            self.offsets[partition] = offset
+
+    def merge(self, other: "PendingOffsets"):
+        """Merge offsets tracked by another instance."""
+        for partition, offset in other.offsets.items():
+            self.update(partition, offset)
+        self.consumer = other.consumer or self.consumer
+
+    async def commit(self):
+        """Synchronously commit the next offset to consume of every partition."""
+        if self.consumer is None or not self.offsets:
+            return
+
+        partitions = [
+            TopicPartition(topic, partition, offset + 1)
+            for (topic, partition), offset in self.offsets.items()
+        ]
+        # The underlying confluent consumer is thread-safe for commits
+        await asyncio.to_thread(
+            self.consumer.consumer.commit, offsets=partitions, asynchronous=False
+        )
@@ -0,0 +1,101 @@
+"""Partition layout of the lakehouse tables."""
+
+from dataclasses import dataclass, replace
+from enum import Enum
+
+import polars as pl
+
+from app.constants import (
+    settings,
+    LAKEHOUSE_BRONZE_USER,
+    LAKEHOUSE_BRONZE_ORDER,
+    LAKEHOUSE_BRONZE_ARTICLE,
+    LAKEHOUSE_BRONZE_LOGIN,
+    LAKEHOUSE_BRONZE_BUY,
+    LAKEHOUSE_BRONZE_SCROLL,
+    LAKEHOUSE_GOLD_FRAUD_SCORE,
+)
+
+EVENT_DATE = "event_date"
+EVENT_HOUR = "event_hour"
+
+
+class PartitionGranularity(str, Enum):
+    """Granularity of the derived time partition columns."""
+
+    NONE = "none"
+    DAY = "day"
+    HOUR = "hour"
+
+
+@dataclass(frozen=True)
+class PartitionScheme:
+    """Partition layout of a Delta table.
+
+    Time partitions are derived from ``time_column`` at write time as
+    ``event_date`` (and ``event_hour`` for hourly granularity), so the
+    number of partition directories stays bounded however precise the
+    source timestamps are.
+    """
+
+    time_column: str | None = None
+    granularity: PartitionGranularity = PartitionGranularity.DAY
+    columns: tuple[str, ...] = ()
+
+    @property
+    def has_time_partitions(self) -> bool:
+        """Whether derived time partition columns are written."""
+        return (
+            self.time_column is not None
+            and self.granularity != PartitionGranularity.NONE
+        )
+
+    @property
+    def partition_by(self) -> list[str]:
+        """Partition columns of the table, in directory order."""
+        partition_by = []
+        if self.has_time_partitions:
+            partition_by.append(EVENT_DATE)
+            if self.granularity == PartitionGranularity.HOUR:
+                partition_by.append(EVENT_HOUR)
+        partition_by.extend(self.columns)
+        return partition_by
+
+    def apply(self, df: pl.DataFrame) -> pl.DataFrame:
+        """Add the derived partition columns to a batch of rows."""
+        if not self.has_time_partitions:
+            return df
+
+        timestamp = pl.col(str(self.time_column))
+        derived = [timestamp.dt.date().alias(EVENT_DATE)]
+        if self.granularity == PartitionGranularity.HOUR:
+            derived.append(timestamp.dt.hour().alias(EVENT_HOUR))
+        return df.with_columns(derived)
+
+
+DEFAULT_PARTITION_SCHEMES = {
+    LAKEHOUSE_BRONZE_USER: PartitionScheme("registration_date"),
+    LAKEHOUSE_BRONZE_ORDER: PartitionScheme("timestamp"),
+    LAKEHOUSE_BRONZE_ARTICLE: PartitionScheme(
+        granularity=PartitionGranularity.NONE, columns=("category",)
+    ),
+    LAKEHOUSE_BRONZE_LOGIN: PartitionScheme("timestamp"),
+    LAKEHOUSE_BRONZE_BUY: PartitionScheme("timestamp"),
+    LAKEHOUSE_BRONZE_SCROLL: PartitionScheme("timestamp"),
+    LAKEHOUSE_GOLD_FRAUD_SCORE: PartitionScheme("timestamp"),
+}
+
+
+def partition_scheme(table: str) -> PartitionScheme:
+    """Return the partition scheme of a table, with settings overrides applied."""
+    scheme = DEFAULT_PARTITION_SCHEMES.get(table, PartitionScheme())
+
+    granularity = settings.LAKEHOUSE_PARTITION_GRANULARITY.get(table)
+    if granularity is not None:
+        scheme = replace(scheme, granularity=PartitionGranularity(granularity))
+
+    columns = settings.LAKEHOUSE_PARTITION_COLUMNS.get(table)
+    if columns is not None:
+        scheme = replace(scheme, columns=tuple(columns))
+
+    return scheme
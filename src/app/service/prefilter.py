@@ -0,0 +1,78 @@
+"""In-process pre-filter keeping cold users away from Redis."""
+
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Sequence
+
+from app.constants import settings
+
+
+@dataclass
+class _UserWindow:
+    """Recent events of a user not escalated to Redis yet."""
+
+    events: deque[tuple[float, dict]]
+    last_seen: float = 0.0
+    escalated: bool = False
+
+
+@dataclass
+class WindowPrefilter:
+    """Tracks per-user window counts locally and escalates busy users.
+
+    Each user gets a small ring buffer of the events of the current window,
+    in an LRU bounded to ``max_users``. Events of users below
+    ``escalate_at`` stay local; once a user reaches it, the buffered backlog
+    is released to the authoritative Redis check and the following events
+    of the user go straight to Redis until the user is quiet for a whole
+    window. ``escalate_at`` must not exceed the smallest rule threshold, or
+    windows breaching a rule would be held back.
+
+    Counts are only those of the events this process consumes. Logins,
+    buys and scrolls come from different topics whose partitions may be
+    assigned to different consumers, so with several consumers in the group
+    a user's events are split between them and none may reach
+    ``escalate_at``. The pre-filter is therefore only sound with a single
+    consumer, and the supervisor disables it when running several workers.
+    """
+
+    window_seconds: float
+    escalate_at: int = settings.FRAUD_PREFILTER_ESCALATE_AT
+    max_users: int = settings.FRAUD_PREFILTER_MAX_USERS
+    _users: OrderedDict[str, _UserWindow] = field(default_factory=OrderedDict)
+
+    def __len__(self) -> int:
+        """Number of users tracked."""
+        return len(self._users)
+
+    def admit(
+        self, events: Sequence[tuple[str, dict]], now: float
+    ) -> list[tuple[str, dict, float]]:
+        """Return the events, with their arrival time, to check in Redis."""
+        escalated = []
+        for user_id, event in events:
+            user = self._user(user_id, now)
+            if user.escalated:
+                escalated.append((user_id, event, now))
+                continue
+
+            user.events.append((now, event))
+            while user.events[0][0] <= now - self.window_seconds:
+                user.events.popleft()
+            if len(user.events) >= self.escalate_at:
+                user.escalated = True
+                escalated.extend((user_id, e, ts) for ts, e in user.events)
+                user.events.clear()
+        return escalated
+
+    def _user(self, user_id: str, now: float) -> _UserWindow:
+        """Return the window of a user, starting a new one if it went quiet."""
+        user = self._users.get(user_id)
+        if user is None or now - user.last_seen > self.window_seconds:
+            user = _UserWindow(deque(maxlen=self.escalate_at))
+            self._users[user_id] = user
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user_id)
+        user.last_seen = now
+        return user
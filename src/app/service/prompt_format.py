@@ -0,0 +1,203 @@
+"""Compact, token-budgeted rendering of events in LLM prompts."""
+
+import datetime
+import threading
+
+from collections import Counter
+from typing import Any, Sequence
+
+from app.service.event_codec import event_kind, event_timestamp
+
+# Characters per token of the usual tokenizers on this kind of text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text, without loading a tokenizer."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def format_events(
+    events: Sequence[dict], max_tokens: int, exclude: Sequence[str] = ()
+) -> tuple[str, int]:
+    """Render events as summary stats and a columnar table.
+
+    Stats cover every event. The table lists the events oldest first, one
+    comma-separated row each with timestamps relative to the first one, and
+    repeated string values replaced by references to a legend. When the
+    rendering exceeds ``max_tokens``, the oldest events are left out of the
+    table. Returns the text and the number of events left out.
+    """
+    ordered = sorted(events, key=lambda event: event_timestamp(event) or 0.0)
+    summary = _summary(ordered)
+    kept = ordered
+    while True:
+        text = summary + _table(kept, exclude, len(ordered) - len(kept))
+        if estimate_tokens(text) <= max_tokens or not kept:
+            return text, len(ordered) - len(kept)
+        kept = kept[max(1, len(kept) // 10) :]
+
+
+def _summary(events: Sequence[dict]) -> str:
+    """Aggregate stats of the events."""
+    mix = Counter(event_kind(event) for event in events)
+    timestamps = [ts for ts in map(event_timestamp, events) if ts is not None]
+    span = max(timestamps) - min(timestamps) if timestamps else 0.0
+    lines = [
+        f"events: {len(events)} over {span:.0f}s ("
+        + ", ".join(f"{kind} {count}" for kind, count in mix.most_common())
+        + ")"
+    ]
+    distinct = [
+        f"{name} {len(values)}"
+        for name in ("ip_address", "device_id", "user_agent")
+        if (values := {event[name] for event in events if event.get(name)})
+    ]
+    if distinct:
+        lines.append("distinct: " + ", ".join(distinct))
+    failed = sum(1 for event in events if event.get("success") is False)
+    if failed:
+        lines.append(f"failed logins: {failed}")
+    return "\n".join(lines) + "\n"
+
+
+def _table(events: Sequence[dict], exclude: Sequence[str], omitted: int) -> str:
+    """Columnar rows of the events with a legend of repeated values."""
+    if not events:
+        return f"table: {omitted} events omitted\n"
+
+    columns = [
+        name
+        for name in dict.fromkeys(name for event in events for name in event)
+        if name not in exclude and name != "timestamp"
+    ]
+    legends = _legends(events, columns)
+    first = event_timestamp(events[0])
+    lines = ["table:" if first is None else f"table (t = seconds from {_iso(first)}):"]
+    if omitted:
+        lines[0] += f" {omitted} oldest events omitted"
+    lines.extend(
+        f"{name} {ref}={value}"
+        for name, legend in legends.items()
+        for value, ref in legend.items()
+    )
+    lines.append(",".join(columns if first is None else ["t", *columns]))
+    for event in events:
+        cells = []
+        if first is not None:
+            ts = event_timestamp(event)
+            cells.append("" if ts is None else f"{ts - first:g}")
+        for name in columns:
+            value = event.get(name)
+            legend = legends.get(name, {})
+            cells.append(legend[value] if value in legend else _cell(value))
+        lines.append(",".join(cells))
+    return "\n".join(lines) + "\n"
+
+
+def _legends(events: Sequence[dict], columns: list[str]) -> dict[str, dict[str, str]]:
+    """Short references to the string values repeated within each column."""
+    legends = {}
+    for name in columns:
+        values = Counter(
+            value
+            for event in events
+            if isinstance(value := event.get(name), str) and len(value) > 3
+        )
+        repeated = [value for value, count in values.items() if count > 1]
+        if repeated:
+            legends[name] = {value: f"{name[0]}{i}" for i, value in enumerate(repeated)}
+    return legends
+
+
+def _cell(value: Any) -> str:
+    """Short rendering of a value in a row."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return f"{value:g}"
+    if isinstance(value, datetime.datetime):
+        return _iso(value.timestamp())
+    return str(value).replace(",", ";").replace("\n", " ")
+
+
+def _iso(timestamp: float) -> str:
+    """UTC ISO rendering of epoch seconds."""
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat(
+        timespec="seconds"
+    )
+
+
+class PromptMetrics:
+    """Prompt sizes and inference latencies, per prompt kind.
+
+    Prompts are built both on the event loop and in worker threads, so
+    updates take a lock.
+    """
+
+    def __init__(self):
+        """Initialize PromptMetrics."""
+        self._lock = threading.Lock()
+        self._kinds: dict[str, dict[str, float]] = {}
+
+    def record_prompt(self, kind: str, prompt: str, omitted: int = 0):
+        """Account for a prompt built, and the events it left out."""
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            stats = self._stats(kind)
+            stats["prompts"] += 1
+            stats["prompt_tokens"] += tokens
+            stats["max_prompt_tokens"] = max(stats["max_prompt_tokens"], tokens)
+            stats["omitted_events"] += omitted
+
+    def record_inference(self, kind: str, seconds: float):
+        """Account for the latency of an inference."""
+        with self._lock:
+            stats = self._stats(kind)
+            stats["inferences"] += 1
+            stats["inference_seconds"] += seconds
+
+    def stats(self) -> dict:
+        """Average and maximum prompt sizes and average latency per kind."""
+        with self._lock:
+            return {
+                kind: {
+                    "prompts": stats["prompts"],
+                    "avg_prompt_tokens": _ratio(
+                        stats["prompt_tokens"], stats["prompts"]
+                    ),
+                    "max_prompt_tokens": stats["max_prompt_tokens"],
+                    "omitted_events": stats["omitted_events"],
+                    "avg_inference_seconds": _ratio(
+                        stats["inference_seconds"], stats["inferences"]
+                    ),
+                }
+                for kind, stats in self._kinds.items()
+            }
+
+    def _stats(self, kind: str) -> dict[str, float]:
+        """Counters of a prompt kind."""
+        return self._kinds.setdefault(
+            kind,
+            dict.fromkeys(
+                (
+                    "prompts",
+                    "prompt_tokens",
+                    "max_prompt_tokens",
+                    "omitted_events",
+                    "inferences",
+                    "inference_seconds",
+                ),
+                0,
+            ),
+        )
+
+
+def _ratio(total: float, count: float) -> float:
+    """Average of a total over a count, 0 when empty."""
+    return total / count if count else 0.0
+
+
+prompt_metrics = PromptMetrics()
@@ -0,0 +1,83 @@
+"""Placement of the per-user fraud state across Redis nodes."""
+
+import bisect
+import hashlib
+
+from typing import Any, Iterable
+
+import redis.asyncio as redis
+
+from app.constants import settings
+
+
+def hash_tag(user_id: str) -> str:
+    """Hash tag keeping every key of a user in the same cluster slot."""
+    return "{" + user_id + "}"
+
+
+def _point(value: str) -> int:
+    """Position of a value on the hash ring."""
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), "big"
+    )
+
+
+class RedisShards:
+    """Redis clients holding the fraud state, users spread by consistent hashing.
+
+    Each client is either a single node or a whole Redis Cluster, whose
+    client routes keys to nodes by their hash tag. Every shard owns
+    ``replicas`` points of the ring, so adding a shard only moves about
+    ``1 / len(clients)`` of the users.
+    """
+
+    def __init__(self, clients: list[Any], replicas: int = 64):
+        """Initialize RedisShards."""
+        if not clients:
+            raise ValueError("At least one Redis client is required")
+        self.clients = clients
+        ring = sorted(
+            (_point(f"{index}:{replica}"), index)
+            for index in range(len(clients))
+            for replica in range(replicas)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [index for _, index in ring]
+
+    def shard_of(self, user_id: str) -> int:
+        """Index of the client holding the state of a user."""
+        if len(self.clients) == 1:
+            return 0
+        position = bisect.bisect(self._points, _point(user_id)) % len(self._points)
+        return self._owners[position]
+
+    def client_for(self, user_id: str) -> Any:
+        """Client holding the state of a user."""
+        return self.clients[self.shard_of(user_id)]
+
+    def group(self, user_ids: Iterable[str]) -> dict[int, list[str]]:
+        """Users grouped by the index of the client holding their state."""
+        groups: dict[int, list[str]] = {}
+        for user_id in user_ids:
+            groups.setdefault(self.shard_of(user_id), []).append(user_id)
+        return groups
+
+    async def close(self):
+        """Close every client."""
+        for client in self.clients:
+            await client.aclose()
+
+
+def connect_shards(redis_url: str | None = None) -> RedisShards:
+    """Clients of the fraud state as configured in the settings.
+
+    ``REDIS_CLUSTER_ENABLED`` connects to a Redis Cluster through
+    ``REDIS_URL``, ``REDIS_SHARD_URLS`` lists independent nodes sharded
+    client-side, and a single node is used otherwise.
+    """
+    if settings.REDIS_CLUSTER_ENABLED:
+        return RedisShards(
+            [redis.RedisCluster.from_url(redis_url or settings.REDIS_URL)]
+        )
+    urls = [redis_url] if redis_url else settings.REDIS_SHARD_URLS
+    return RedisShards([redis.from_url(url) for url in urls or [settings.REDIS_URL]])
@@ -0,0 +1,197 @@
+"""Adaptive concurrency limiting and circuit breaking for backend calls."""
+
+import asyncio
+import contextlib
+import time
+
+from typing import AsyncIterator, Iterator
+
+from loguru import logger
+
+from app.constants import settings
+
+
+class AdaptiveLimiter:  # pylint: disable=too-many-instance-attributes
+    """Concurrency limit adjusted to the observed latency (AIMD).
+
+    Every call completing under ``target_latency`` raises the limit by
+    ``1 / limit``, about one slot per round of calls. A slower or failed
+    call cuts it by ``backoff``, at most once per round so a burst of slow
+    calls sent under the old limit does not collapse it to the minimum.
+    A call waiting more than ``acquire_timeout`` for a slot is shed with
+    OverloadedError rather than queued indefinitely.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        initial: int = settings.LLM_CONCURRENCY_INITIAL,
+        min_limit: int = settings.LLM_CONCURRENCY_MIN,
+        max_limit: int = settings.LLM_CONCURRENCY_MAX,
+        target_latency: float = settings.LLM_TARGET_LATENCY_SECONDS,
+        backoff: float = 0.5,
+        acquire_timeout: float = settings.LLM_CONCURRENCY_ACQUIRE_TIMEOUT_SECONDS,
+    ):
+        """Initialize AdaptiveLimiter."""
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.acquire_timeout = acquire_timeout
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+        self._slots = asyncio.Condition()
+        self._last_decrease = 0.0
+
+    def stats(self) -> dict:
+        """Current limit and usage for monitoring."""
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "shed": self.shed,
+            "target_latency": self.target_latency,
+        }
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a slot for the duration of a call, timing it.
+
+        A call leaving the block with an exception counts as failed.
+        """
+        async with self._slots:
+            self.waiting += 1
+            try:
+                async with asyncio.timeout(self.acquire_timeout):
+                    await self._slots.wait_for(lambda: self.in_flight < int(self.limit))
+            except TimeoutError as e:
+                self.shed += 1
+                raise OverloadedError(f"No slot within {self.acquire_timeout}s") from e
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+        started = time.monotonic()
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            self._adjust(time.monotonic() - started, started, succeeded)
+            async with self._slots:
+                self.in_flight -= 1
+                self._slots.notify_all()
+
+    def _adjust(self, latency: float, started: float, succeeded: bool):
+        """Grow the limit after a fast call, back off after a slow one."""
+        if succeeded and latency <= self.target_latency:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        elif started >= self._last_decrease:
+            # Only calls started after the last decrease reflect its effect
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._last_decrease = time.monotonic()
+            logger.warning(
+                "LLM latency {:.1f}s (failed: {}), concurrency limit now {}",
+                latency,
+                not succeeded,
+                int(self.limit),
+            )
+
+
+class OverloadedError(Exception):
+    """Raised when a call is shed for waiting too long on a busy backend."""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend behind an open circuit."""
+
+
+class CircuitBreaker:
+    """Fails fast while a backend is unhealthy, probing it for recovery.
+
+    ``failure_threshold`` consecutive failures open the circuit: calls are
+    rejected for ``reset_timeout`` seconds. The circuit then turns half
+    open and lets a single probe through; its success closes the circuit,
+    its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = settings.LLM_BREAKER_FAILURES,
+        reset_timeout: float = settings.LLM_BREAKER_RESET_SECONDS,
+    ):
+        """Initialize CircuitBreaker."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """Closed, open, or half open once the reset timeout elapsed."""
+        if self.failures < self.failure_threshold:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def stats(self) -> dict:
+        """Circuit state and counters for monitoring."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """Record the outcome of a call, or raise CircuitOpenError.
+
+        A cancelled or shed call records nothing but gives the probe back.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit {self.state}")
+        try:
+            yield
+        except (asyncio.CancelledError, OverloadedError):
+            self._probing = False
+            raise
+        except BaseException:
+            self.record_failure()
+            raise
+        self.record_success()
+
+    def allow(self) -> bool:
+        """Whether a call may go through, taking the probe when half open."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        """Close the circuit."""
+        if self.failures >= self.failure_threshold:
+            logger.info("LLM backend recovered, closing circuit")
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        """Count a failure, opening the circuit at the threshold."""
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            if self.failures == self.failure_threshold or self._probing:
+                logger.error("LLM backend unhealthy, opening circuit")
+            self._opened_at = time.monotonic()
+        self._probing = False
@@ -1,106 +1,357 @@
 """Fraud detection routers."""
 
+from typing import Any, Callable
+
 import polars as pl
 from loguru import logger
+from pydantic import BaseModel, ValidationError
+from faststream import AckPolicy
 from faststream.confluent import KafkaRouter, KafkaRoute
 
 from app.constants import (
+    settings,
+    KAFKA_CONFIG,
     TOPIC_USER,
     TOPIC_ORDER,
     TOPIC_ARTICLE,
     TOPIC_LOGIN,
     TOPIC_BUY,
     TOPIC_SCROLL,
+    LAKEHOUSE_BRONZE_USER,
+    LAKEHOUSE_BRONZE_ORDER,
+    LAKEHOUSE_BRONZE_ARTICLE,
+    LAKEHOUSE_BRONZE_LOGIN,
+    LAKEHOUSE_BRONZE_BUY,
+    LAKEHOUSE_BRONZE_SCROLL,
 )
+from app.log_config import BATCH, EVENT, sampled
 from app.models.fraud import User, Order, Article, Login, Buy, Scroll
+from app.service.delta_writer import BufferedDeltaWriter
+from app.service.fast_decode import decode_batch
+from app.service.offsets import ConsumedMessage, PendingOffsets
 from app.service.fraud_service import FraudService
+from app.service.gold_sink import fraud_score_writer
+from app.service.prompt_format import prompt_metrics
+from app.service.stages import BoundedStage
 
 # Initialize FraudService
 fraud_service = FraudService()
 
+# One buffered writer per bronze table
+bronze_writers = {
+    "user": BufferedDeltaWriter(LAKEHOUSE_BRONZE_USER),
+    "order": BufferedDeltaWriter(LAKEHOUSE_BRONZE_ORDER),
+    "article": BufferedDeltaWriter(LAKEHOUSE_BRONZE_ARTICLE),
+    "login": BufferedDeltaWriter(LAKEHOUSE_BRONZE_LOGIN),
+    "buy": BufferedDeltaWriter(LAKEHOUSE_BRONZE_BUY),
+    "scroll": BufferedDeltaWriter(LAKEHOUSE_BRONZE_SCROLL),
+}
+
+
+def start_pipeline_stages():
+    """Start the queue workers when bounded queues are enabled."""
+    if settings.PIPELINE_QUEUES_ENABLED:
+        lakehouse_stage.start()
+        fraud_stage.start()
+
+
+async def shutdown_pipeline_stages():
+    """Drain the queues before the writers and services are closed."""
+    logger.info("Draining pipeline queues...")
+    await lakehouse_stage.stop()
+    await fraud_stage.stop()
+
+
+def pipeline_metrics() -> dict:
+    """Queue depths and pending bronze rows for monitoring."""
+    return {
+        "queues": {
+            stage.name: stage.stats() for stage in (lakehouse_stage, fraud_stage)
+        },
+        "bronze_pending_rows": {
+            table: writer.pending_rows for table, writer in bronze_writers.items()
+        },
+        "gold_pending_rows": fraud_score_writer.pending_rows,
+        "llm_cache": fraud_service.llm.cache.stats()
+        if fraud_service.llm.cache is not None
+        else None,
+        "llm_in_flight": fraud_service.llm.in_flight.stats(),
+        "analysis_queue": fraud_service.analysis_queue.stats()
+        if fraud_service.analysis_queue is not None
+        else None,
+        "rule_scorer": fraud_service.rules.stats()
+        if fraud_service.rules is not None
+        else None,
+        "prompts": prompt_metrics.stats(),
+        "llm_backend": {
+            "limiter": fraud_service.llm.limiter.stats(),
+            "breaker": fraud_service.llm.breaker.stats(),
+        },
+    }
+
 
 async def shutdown_fraud_service():
     """Shutdown fraud service resources."""
     logger.info("Shutting down FraudService...")
     await fraud_service.close()
+    # After the analyses were stopped, so their last scores are flushed
+    await fraud_score_writer.close()
 
 
-async def handle_user_event(event: User):
+async def shutdown_bronze_writers():
+    """Flush buffered bronze rows, every writer even if one fails."""
+    logger.info("Flushing bronze writers...")
+    for table, writer in bronze_writers.items():
+        try:
+            await writer.close()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error("Failed to flush bronze {} writer: {}", table, e)
+
+
+async def handle_user_event(event: User, msg: ConsumedMessage = None):
     """Handle user event."""
-    logger.info("Received user event: {}", event)
-    df = pl.DataFrame([event.model_dump()])
-    df.write_delta(
-        target="lakehouse/bronze/user",
-        mode="append",
-        delta_write_options={"partition_by": "registration_date"},
-    )
+    sampled(EVENT).info("Received user event: {}", event)
+    await _write_bronze("user", [event.model_dump()], msg)
 
 
-async def handle_order_event(event: Order):
+async def handle_order_event(event: Order, msg: ConsumedMessage = None):
     """Handle order event."""
-    logger.info("Received order event: {}", event)
-    df = pl.DataFrame([event.model_dump()])
-    df.write_delta(
-        target="lakehouse/bronze/order",
-        mode="append",
-        delta_write_options={"partition_by": "timestamp"},
-    )
+    sampled(EVENT).info("Received order event: {}", event)
+    await _write_bronze("order", [event.model_dump()], msg)
 
 
-async def handle_article_event(event: Article):
+async def handle_article_event(event: Article, msg: ConsumedMessage = None):
     """Handle article event."""
-    logger.info("Received article event: {}", event)
-    df = pl.DataFrame([event.model_dump()])
-    df.write_delta(
-        target="lakehouse/bronze/article",
-        mode="append",
-        delta_write_options={"partition_by": "category"},
-    )
+    sampled(EVENT).info("Received article event: {}", event)
+    await _write_bronze("article", [event.model_dump()], msg)
 
 
-async def handle_login_event(event: Login):
+async def handle_login_event(event: Login, msg: ConsumedMessage = None):
     """Handle login event."""
-    logger.info("Received login event: {}", event)
-    df = pl.DataFrame([event.model_dump()])
-    df.write_delta(
-        target="lakehouse/bronze/login",
-        mode="append",
-        delta_write_options={"partition_by": "timestamp"},
-    )
-    await fraud_service.process_event(event.user_id, event.model_dump())
+    sampled(EVENT).info("Received login event: {}", event)
+    row = event.model_dump()
+    await _write_bronze("login", [row], msg)
+    await _process_fraud_rows([row], msg)
 
 
-async def handle_buy_event(event: Buy):
+async def handle_buy_event(event: Buy, msg: ConsumedMessage = None):
     """Handle buy event."""
-    logger.info("Received buy event: {}", event)
-    df = pl.DataFrame([event.model_dump()])
-    df.write_delta(
-        target="lakehouse/bronze/buy",
-        mode="append",
-        delta_write_options={"partition_by": "timestamp"},
-    )
-    await fraud_service.process_event(event.user_id, event.model_dump())
+    sampled(EVENT).info("Received buy event: {}", event)
+    row = event.model_dump()
+    await _write_bronze("buy", [row], msg)
+    await _process_fraud_rows([row], msg)
 
 
-async def handle_scroll_event(event: Scroll):
+async def handle_scroll_event(event: Scroll, msg: ConsumedMessage = None):
     """Handle scroll event."""
-    logger.info("Received scroll event: {}", event)
-    df = pl.DataFrame([event.model_dump()])
-    df.write_delta(
-        target="lakehouse/bronze/scroll",
-        mode="append",
-        delta_write_options={"partition_by": "timestamp"},
-    )
-    await fraud_service.process_event(event.user_id, event.model_dump())
+    sampled(EVENT).info("Received scroll event: {}", event)
+    row = event.model_dump()
+    await _write_bronze("scroll", [row], msg)
+    await _process_fraud_rows([row], msg)
 
 
-router = KafkaRouter(
-    handlers=(
-        KafkaRoute(handle_user_event, TOPIC_USER),
-        KafkaRoute(handle_order_event, TOPIC_ORDER),
-        KafkaRoute(handle_article_event, TOPIC_ARTICLE),
-        KafkaRoute(handle_login_event, TOPIC_LOGIN),
-        KafkaRoute(handle_buy_event, TOPIC_BUY),
-        KafkaRoute(handle_scroll_event, TOPIC_SCROLL),
-    )
+async def handle_user_batch(payloads: list[bytes], msg: ConsumedMessage = None):
+    """Handle a batch of user events."""
+    sampled(BATCH).info("Received {} user events", len(payloads))
+    rows = _validate_batch("user", User, payloads)
+    await _write_bronze("user", rows, msg)
+
+
+async def handle_order_batch(payloads: list[bytes], msg: ConsumedMessage = None):
+    """Handle a batch of order events."""
+    sampled(BATCH).info("Received {} order events", len(payloads))
+    rows = _validate_batch("order", Order, payloads)
+    await _write_bronze("order", rows, msg)
+
+
+async def handle_article_batch(payloads: list[bytes], msg: ConsumedMessage = None):
+    """Handle a batch of article events."""
+    sampled(BATCH).info("Received {} article events", len(payloads))
+    rows = _validate_batch("article", Article, payloads)
+    await _write_bronze("article", rows, msg)
+
+
+async def handle_login_batch(payloads: list[bytes], msg: ConsumedMessage = None):
+    """Handle a batch of login events."""
+    sampled(BATCH).info("Received {} login events", len(payloads))
+    rows = _validate_batch("login", Login, payloads)
+    await _write_bronze("login", rows, msg)
+    await _process_fraud_rows(rows, msg)
+
+
+async def handle_buy_batch(payloads: list[bytes], msg: ConsumedMessage = None):
+    """Handle a batch of buy events."""
+    sampled(BATCH).info("Received {} buy events", len(payloads))
+    rows = _validate_batch("buy", Buy, payloads)
+    await _write_bronze("buy", rows, msg)
+    await _process_fraud_rows(rows, msg)
+
+
+async def handle_scroll_batch(payloads: list[bytes], msg: ConsumedMessage = None):
+    """Handle a batch of scroll events."""
+    sampled(BATCH).info("Received {} scroll events", len(payloads))
+    rows = _validate_batch("scroll", Scroll, payloads)
+    await _write_bronze("scroll", rows, msg)
+    await _process_fraud_rows(rows, msg)
+
+
+def _validate_batch(
+    table: str, model: type[BaseModel], payloads: list[bytes]
+) -> list[dict]:
+    """Validate each message of a batch on its own, rejecting the invalid ones."""
+    rows = []
+    for index, payload in enumerate(payloads):
+        try:
+            rows.append(model.model_validate_json(payload).model_dump())
+        except ValidationError as e:
+            logger.warning("Rejected {} event #{}: {}", table, index, e)
+    return rows
+
+
+def _raw_batch_handler(
+    table: str, model: type[BaseModel], check_fraud: bool = False
+) -> Callable:
+    """Build a handler decoding raw message batches straight into columns."""
+
+    async def handle_raw_batch(payloads: list[bytes], msg: ConsumedMessage = None):
+        """Handle a batch of raw messages."""
+        sampled(BATCH).info("Received {} {} events", len(payloads), table)
+        batch = decode_batch(payloads, model)
+        for index, error in batch.errors:
+            logger.warning("Rejected {} event #{}: {}", table, index, error)
+
+        await _write_bronze(table, batch.frame, msg)
+        if check_fraud:
+            await _process_fraud_rows(batch.frame.to_dicts(), msg)
+
+    handle_raw_batch.__name__ = f"handle_{table}_raw_batch"
+    return handle_raw_batch
+
+
+async def _raw_batch_decoder(msg) -> list[bytes]:
+    """Pass the raw message bodies of a batch through undecoded."""
+    return msg.body
+
+
+def _offsets(msg: ConsumedMessage) -> PendingOffsets | None:
+    """Offsets to commit after the flush, in commit-after-flush mode."""
+    if not settings.KAFKA_COMMIT_AFTER_FLUSH or msg is None:
+        return None
+    return PendingOffsets.from_message(msg)
+
+
+async def _write_bronze(
+    table: str, rows: list[dict] | pl.DataFrame, msg: ConsumedMessage = None
+):
+    """Write rows to a bronze table, through the lakehouse queue if enabled."""
+    offsets = _offsets(msg)
+    if settings.PIPELINE_QUEUES_ENABLED:
+        size = rows.height if isinstance(rows, pl.DataFrame) else len(rows)
+        await lakehouse_stage.put((table, rows, offsets), size, msg)
+    else:
+        await _write_bronze_rows((table, rows, offsets))
+
+
+async def _write_bronze_rows(
+    item: tuple[str, list[dict] | pl.DataFrame, PendingOffsets | None],
+):
+    """Hand rows over to the buffered writer of their bronze table."""
+    table, rows, offsets = item
+    if isinstance(rows, pl.DataFrame):
+        await bronze_writers[table].write_frame(rows, offsets)
+    else:
+        await bronze_writers[table].write(rows, offsets)
+
+
+async def _process_fraud_rows(rows: list[dict], msg: ConsumedMessage = None):
+    """Run fraud detection for rows, through the fraud queue if enabled."""
+    if settings.PIPELINE_QUEUES_ENABLED:
+        await fraud_stage.put(rows, len(rows), msg)
+    else:
+        await _check_fraud_rows(rows)
+
+
+async def _check_fraud_rows(rows: list[dict]):
+    """Run fraud detection for a batch of rows in one Redis round-trip."""
+    await fraud_service.process_events([(row["user_id"], row) for row in rows])
+
+
+# Bounded queues decoupling consumption from the downstream stages
+lakehouse_stage = BoundedStage(
+    "lakehouse", _write_bronze_rows, max_size=settings.LAKEHOUSE_QUEUE_MAX_ROWS
 )
+fraud_stage = BoundedStage(
+    "fraud",
+    _check_fraud_rows,
+    max_size=settings.FRAUD_QUEUE_MAX_EVENTS,
+    workers=settings.FRAUD_QUEUE_WORKERS,
+)
+
+
+def _build_router() -> KafkaRouter:
+    """Build the Kafka router in per-message or batch consumption mode."""
+    if not settings.KAFKA_BATCH_ENABLED:
+        return KafkaRouter(
+            handlers=(
+                _route(handle_user_event, TOPIC_USER),
+                _route(handle_order_event, TOPIC_ORDER),
+                _route(handle_article_event, TOPIC_ARTICLE),
+                _route(handle_login_event, TOPIC_LOGIN),
+                _route(handle_buy_event, TOPIC_BUY),
+                _route(handle_scroll_event, TOPIC_SCROLL),
+            )
+        )
+
+    if settings.KAFKA_FAST_DECODE_ENABLED:
+        return KafkaRouter(
+            handlers=tuple(
+                _route(
+                    _raw_batch_handler(table, model, check_fraud),
+                    topic,
+                    batch=True,
+                    raw=True,
+                )
+                for table, model, topic, check_fraud in (
+                    ("user", User, TOPIC_USER, False),
+                    ("order", Order, TOPIC_ORDER, False),
+                    ("article", Article, TOPIC_ARTICLE, False),
+                    ("login", Login, TOPIC_LOGIN, True),
+                    ("buy", Buy, TOPIC_BUY, True),
+                    ("scroll", Scroll, TOPIC_SCROLL, True),
+                )
+            )
+        )
+
+    return KafkaRouter(
+        handlers=(
+            _route(handle_user_batch, TOPIC_USER, batch=True, raw=True),
+            _route(handle_order_batch, TOPIC_ORDER, batch=True, raw=True),
+            _route(handle_article_batch, TOPIC_ARTICLE, batch=True, raw=True),
+            _route(handle_login_batch, TOPIC_LOGIN, batch=True, raw=True),
+            _route(handle_buy_batch, TOPIC_BUY, batch=True, raw=True),
+            _route(handle_scroll_batch, TOPIC_SCROLL, batch=True, raw=True),
+        )
+    )
+
+
+def _route(
+    handler: Callable, topic: str, batch: bool = False, raw: bool = False
+) -> KafkaRoute:
+    """Build a route for the configured consumption and commit modes."""
+    options: dict[str, Any] = {}
+    if batch:
+        # Each poll hands over up to max_records messages, waiting at most
+        # max wait seconds; raw batches are decoded by the handler itself
+        options.update(
+            batch=True,
+            max_records=settings.KAFKA_BATCH_MAX_RECORDS,
+            polling_interval=settings.KAFKA_BATCH_MAX_WAIT_SECONDS,
+            decoder=_raw_batch_decoder if raw else None,
+        )
+    if settings.KAFKA_COMMIT_AFTER_FLUSH:
+        # The bronze writers commit offsets once their rows are durable
+        options.update(ack_policy=AckPolicy.MANUAL, group_id=KAFKA_CONFIG["group.id"])
+    return KafkaRoute(handler, topic, **options)
+
+
+router = _build_router()
@@ -0,0 +1,171 @@
+"""Rule-based scoring of fraud windows, deciding clear-cut cases locally."""
+
+from dataclasses import dataclass
+from typing import Any
+
+import polars as pl
+
+from app.constants import settings
+from app.models.fraud import EventType
+from app.service.event_codec import event_kind, event_timestamp
+from app.service.llm_provider import FraudResult
+
+# User agents of HTTP libraries, crawlers and automated browsers
+BOT_USER_AGENTS = (
+    r"(?i)bot|crawl|spider|curl|wget|python|httpx|aiohttp|okhttp|go-http|"
+    r"java/|scrapy|headless|selenium|puppeteer|playwright|phantomjs"
+)
+
+_SCHEMA = {
+    "ts": pl.Float64,
+    "kind": pl.Utf8,
+    "ip_address": pl.Utf8,
+    "device_id": pl.Utf8,
+    "user_agent": pl.Utf8,
+    "success": pl.Boolean,
+}
+
+_LOGIN = pl.col("kind") == EventType.LOGIN.value
+_BUY = pl.col("kind") == EventType.BUY.value
+
+# Event rates a person browsing stays under, and only scripts go past
+_HUMAN_EVENTS_PER_SECOND = 0.2
+_BOT_EVENTS_PER_SECOND = 2.0
+
+
+def window_features(events: list[dict]) -> dict[str, Any]:
+    """Compute the behavioral features of a window in one columnar pass."""
+    frame = pl.DataFrame(
+        {
+            "ts": [event_timestamp(event) for event in events],
+            "kind": [event_kind(event) for event in events],
+            "ip_address": [_str(event.get("ip_address")) for event in events],
+            "device_id": [_str(event.get("device_id")) for event in events],
+            "user_agent": [_str(event.get("user_agent")) for event in events],
+            "success": [event.get("success") for event in events],
+        },
+        schema=_SCHEMA,
+    )
+    features = frame.select(
+        events=pl.len(),
+        span_seconds=pl.col("ts").max() - pl.col("ts").min(),
+        distinct_ips=pl.col("ip_address").drop_nulls().n_unique(),
+        distinct_devices=pl.col("device_id").drop_nulls().n_unique(),
+        bot_user_agents=pl.col("user_agent").str.contains(BOT_USER_AGENTS).sum(),
+        logins=_LOGIN.sum(),
+        buys=_BUY.sum(),
+        successful_logins=(_LOGIN & pl.col("success")).sum(),
+    ).row(0, named=True)
+
+    # Seconds from the last successful login to each purchase
+    features["min_login_to_buy_seconds"] = (
+        frame.drop_nulls("ts")
+        .sort("ts")
+        .with_columns(
+            last_login=pl.when(_LOGIN & pl.col("success"))
+            .then(pl.col("ts"))
+            .forward_fill()
+        )
+        .filter(_BUY)
+        .select((pl.col("ts") - pl.col("last_login")).min())
+        .item()
+    )
+    # Unknown without timestamps
+    span = features["span_seconds"]
+    features["events_per_second"] = (
+        None if span is None else features["events"] / max(span, 1.0)
+    )
+    features["login_success_ratio"] = (
+        features["successful_logins"] / features["logins"]
+        if features["logins"]
+        else None
+    )
+    return features
+
+
+def rule_signals(features: dict[str, Any]) -> dict[str, float]:
+    """Strength, between 0 and 1, of each bot signal found in the features."""
+    signals = {
+        "many IP addresses": min(1.0, (features["distinct_ips"] - 1) / 4),
+        "many devices": min(1.0, (features["distinct_devices"] - 1) / 4),
+        "bot user agent": min(1.0, features["bot_user_agents"] / features["events"]),
+        "repeated purchases": min(1.0, (features["buys"] - 1) / 4),
+    }
+    rate = features["events_per_second"]
+    if rate is not None:
+        signals["high event rate"] = min(
+            1.0,
+            (rate - _HUMAN_EVENTS_PER_SECOND)
+            / (_BOT_EVENTS_PER_SECOND - _HUMAN_EVENTS_PER_SECOND),
+        )
+    gap = features["min_login_to_buy_seconds"]
+    if gap is not None:
+        signals["buy right after login"] = 1.0 if gap < 2 else 0.5 if gap < 10 else 0.0
+    ratio = features["login_success_ratio"]
+    if ratio is not None and features["logins"] >= 3:
+        signals["failed logins"] = 1.0 - ratio
+    return {name: strength for name, strength in signals.items() if strength > 0}
+
+
+# How conclusive each signal is on its own
+_WEIGHTS = {
+    "high event rate": 0.9,
+    "many IP addresses": 0.6,
+    "many devices": 0.6,
+    "bot user agent": 0.95,
+    "repeated purchases": 0.5,
+    "buy right after login": 0.7,
+    "failed logins": 0.7,
+}
+
+
+@dataclass
+class RuleScorer:
+    """Scores windows with rules, leaving only ambiguous ones to the LLM.
+
+    Signals combine as a noisy-or. Windows scoring at least ``high`` with
+    at least two signals are reported as fraud, one signal alone being too
+    easily met by a fast but genuine user, and windows scoring at most
+    ``low`` as benign; ``score`` returns None for all the others.
+    """
+
+    low: float = settings.FRAUD_RULES_LOW_SCORE
+    high: float = settings.FRAUD_RULES_HIGH_SCORE
+    fraud: int = 0
+    benign: int = 0
+    deferred: int = 0
+
+    def stats(self) -> dict:
+        """Decision counters for monitoring."""
+        return {"fraud": self.fraud, "benign": self.benign, "deferred": self.deferred}
+
+    def score(self, events: list[dict]) -> FraudResult | None:
+        """Decide a clear-cut window locally, or return None to defer it."""
+        if not events:
+            self.deferred += 1
+            return None
+
+        signals = rule_signals(window_features(events))
+        clean = 1.0
+        for name, strength in signals.items():
+            clean *= 1.0 - _WEIGHTS[name] * strength
+        score = round(1.0 - clean, 3)
+
+        if score >= self.high and len(signals) >= 2:
+            self.fraud += 1
+            reason = "Rules: " + ", ".join(
+                sorted(signals, key=signals.__getitem__, reverse=True)
+            )
+            return FraudResult(score=score, reason=reason, is_critical=score >= 0.95)
+        if score <= self.low:
+            self.benign += 1
+            return FraudResult(
+                score=score, reason="Rules: no bot signal", is_critical=False
+            )
+        self.deferred += 1
+        return None
+
+
+def _str(value: Any) -> str | None:
+    """String value of an optional field."""
+    return None if value is None else str(value)
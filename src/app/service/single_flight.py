@@ -0,0 +1,63 @@
+"""Coalescing of concurrent calls sharing a key."""
+
+import asyncio
+
+from collections import Counter
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time, sharing its outcome.
+
+    Callers arriving while a call for their key is in flight wait for it
+    and get its result (or exception) instead of starting their own. The
+    call runs as a task of its own, so a cancelled caller does not cancel
+    it for the others; once every caller is cancelled, the call is
+    cancelled too and has unwound by the time the last caller is.
+    """
+
+    def __init__(self):
+        """Initialize SingleFlight."""
+        self.coalesced = 0
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self._waiters: Counter[asyncio.Task] = Counter()
+
+    def stats(self) -> dict:
+        """In-flight and coalesced call counters for monitoring."""
+        return {"in_flight": len(self._calls), "coalesced": self.coalesced}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run func for key, or join the call already in flight for it."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+
+        self._waiters[task] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # No caller is left for the result
+                    await _cancel(task)
+
+    async def cancel(self):
+        """Cancel every call in flight and wait for them to unwind."""
+        await asyncio.gather(*(_cancel(task) for task in list(self._calls.values())))
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        """Drop a finished call so the next one for its key runs anew."""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+
+async def _cancel(task: asyncio.Task):
+    """Cancel a task and wait until it finished."""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,214 @@
+"""Bounded queues between the Kafka consumer and downstream stages."""
+
+import asyncio
+
+from typing import Any, Awaitable, Callable
+
+from confluent_kafka import TopicPartition
+from faststream.confluent.message import KafkaMessage
+from loguru import logger
+
+from app.constants import settings
+
+
+class PartitionGate:
+    """Pauses and resumes consumer partitions on behalf of several stages.
+
+    A partition feeding more than one stage is only resumed once every stage
+    that paused it has drained below its low watermark. Once closed for
+    shutdown, the gate never resumes a partition again.
+    """
+
+    def __init__(self):
+        """Initialize PartitionGate."""
+        self._pauses: dict[tuple[int, str, int], int] = {}
+        self._closed = False
+
+    def close(self):
+        """Keep every partition paused while the stages drain for shutdown."""
+        self._closed = True
+
+    def pause(self, consumer: Any, partitions: set[tuple[str, int]]):
+        """Pause fetching from partitions of a consumer."""
+        newly_paused = []
+        for topic, partition in partitions:
+            key = (id(consumer), topic, partition)
+            self._pauses[key] = self._pauses.get(key, 0) + 1
+            if self._pauses[key] == 1:
+                newly_paused.append(TopicPartition(topic, partition))
+        self._call(consumer, "pause", newly_paused)
+
+    def resume(self, consumer: Any, partitions: set[tuple[str, int]]):
+        """Resume fetching from partitions no stage holds paused any more."""
+        if self._closed:
+            return
+        resumed = []
+        for topic, partition in partitions:
+            key = (id(consumer), topic, partition)
+            if key not in self._pauses:
+                continue
+            self._pauses[key] -= 1
+            if not self._pauses[key]:
+                del self._pauses[key]
+                resumed.append(TopicPartition(topic, partition))
+        self._call(consumer, "resume", resumed)
+
+    @staticmethod
+    def _call(consumer: Any, method: str, partitions: list[TopicPartition]):
+        """Pause or resume partitions on the underlying confluent consumer."""
+        if not partitions:
+            return
+        try:
+            getattr(consumer.consumer, method)(partitions)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Partitions revoked by a rebalance can no longer be paused
+            logger.warning("Failed to {} partitions {}: {}", method, partitions, e)
+
+
+partition_gate = PartitionGate()
+
+
+class BoundedStage:  # pylint: disable=too-many-instance-attributes
+    """Bounded in-memory queue drained by a pool of worker tasks.
+
+    The depth is counted in events, so a batch weighs as much as its rows.
+    Once the depth reaches the high watermark the partitions that fed the
+    queue are paused; the consumer keeps polling, so no rebalance is
+    triggered, and the partitions resume when the depth drops to the low
+    watermark. Producers only wait on ``put`` when the queue is full, which
+    bounds memory even for messages fetched before the pause took effect.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        name: str,
+        process: Callable[[Any], Awaitable[None]],
+        *,
+        max_size: int,
+        workers: int = 1,
+        high_watermark: float = settings.PIPELINE_HIGH_WATERMARK,
+        low_watermark: float = settings.PIPELINE_LOW_WATERMARK,
+        gate: PartitionGate = partition_gate,
+    ):
+        """Initialize BoundedStage."""
+        self.name = name
+        self.process = process
+        self.max_size = max_size
+        self.workers = workers
+        self.high_water = max(1, int(max_size * high_watermark))
+        self.low_water = int(max_size * low_watermark)
+        self.gate = gate
+
+        self._queue: asyncio.Queue[tuple[Any, int]] = asyncio.Queue()
+        self._depth = 0
+        self._space = asyncio.Condition()
+        self._sources: dict[int, tuple[Any, set[tuple[str, int]]]] = {}
+        self._paused: dict[int, tuple[Any, set[tuple[str, int]]]] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        """Number of queued events."""
+        return self._depth
+
+    @property
+    def paused(self) -> bool:
+        """Whether the stage currently holds partitions paused."""
+        return bool(self._paused)
+
+    def stats(self) -> dict:
+        """Queue depth and backpressure state for monitoring."""
+        return {
+            "depth": self._depth,
+            "max_size": self.max_size,
+            "high_water": self.high_water,
+            "low_water": self.low_water,
+            "paused": self.paused,
+        }
+
+    async def put(self, item: Any, size: int = 1, message: KafkaMessage | None = None):
+        """Queue an item, waiting while the queue is full."""
+        if message is not None:
+            self._track(message)
+
+        async with self._space:
+            # An oversized batch is still accepted by an empty queue
+            await self._space.wait_for(
+                lambda: not self._depth or self._depth + size <= self.max_size
+            )
+            self._depth += size
+        self._queue.put_nowait((item, size))
+
+        if self._depth >= self.high_water and not self._paused:
+            self._pause()
+
+    def start(self):
+        """Start the worker tasks."""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._work()) for _ in range(self.workers)
+            ]
+
+    async def stop(self):
+        """Drain the queue and stop the worker tasks."""
+        if self._tasks:
+            await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._resume()
+
+    async def _work(self):
+        """Process queued items until cancelled."""
+        while True:
+            item, size = await self._queue.get()
+            try:
+                await self.process(item)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Stage {} failed to process an item: {}", self.name, e)
+            finally:
+                async with self._space:
+                    self._depth -= size
+                    self._space.notify_all()
+                if self._paused and self._depth <= self.low_water:
+                    self._resume()
+                self._queue.task_done()
+
+    def _track(self, message: KafkaMessage):
+        """Remember which consumer partitions feed the queue."""
+        raw_message = message.raw_message
+        records = (
+            raw_message if isinstance(raw_message, (list, tuple)) else (raw_message,)
+        )
+        _, partitions = self._sources.setdefault(
+            id(message.consumer), (message.consumer, set())
+        )
+        for record in records:
+            topic, partition = record.topic(), record.partition()
+            if topic is not None and partition is not None:
+                partitions.add((topic, partition))
+
+    def _pause(self):
+        """Pause every partition feeding the queue."""
+        logger.warning(
+            "Stage {} reached {} queued events, pausing partitions",
+            self.name,
+            self._depth,
+        )
+        for key, (consumer, partitions) in self._sources.items():
+            self._paused[key] = (consumer, set(partitions))
+            self.gate.pause(consumer, partitions)
+
+    def _resume(self):
+        """Resume the partitions paused by this stage."""
+        if not self._paused:
+            return
+        logger.info(
+            "Stage {} drained to {} queued events, resuming partitions",
+            self.name,
+            self._depth,
+        )
+        for consumer, partitions in self._paused.values():
+            self.gate.resume(consumer, partitions)
+        self._paused = {}
@@ -0,0 +1,149 @@
+"""Cache of LLM verdicts keyed by a fingerprint of the analyzed window."""
+
+import hashlib
+import json
+import time
+
+from collections import Counter, OrderedDict
+from typing import Any
+
+import redis.asyncio as redis
+from loguru import logger
+
+from app.constants import settings
+from app.service.event_codec import event_kind, event_timestamp
+
+
+def window_fingerprint(events: list[dict], user_id: str | None = None) -> str:
+    """Hash the features of a window that drive the verdict.
+
+    Windows from the same bot (same user agents, IP set and devices, a
+    similar event mix, pace and purchases) share a fingerprint even if
+    timestamps, users and exact counts differ. Counts, durations and rates
+    are bucketed by powers of two. A window without any user agent, IP or
+    device says little about who sent it, so its fingerprint is tied to
+    ``user_id`` rather than shared with other users.
+    """
+    mix = Counter(event_kind(event) for event in events)
+    failed_logins = sum(1 for event in events if event.get("success") is False)
+    timestamps = [ts for ts in map(event_timestamp, events) if ts is not None]
+    span = max(timestamps) - min(timestamps) if timestamps else 0.0
+    durations = [
+        float(event["duration_seconds"])
+        for event in events
+        if event.get("duration_seconds") is not None
+    ]
+    features: dict[str, Any] = {
+        "user_agents": _distinct(events, "user_agent"),
+        "ip_addresses": _distinct(events, "ip_address"),
+        "devices": _distinct(events, "device_id"),
+        "mix": {kind: count.bit_length() for kind, count in mix.items()},
+        "failed_logins": failed_logins.bit_length(),
+        "span": int(span).bit_length(),
+        # Events per minute
+        "rate": int(len(events) * 60 / max(span, 1.0)).bit_length(),
+        "payment_methods": _distinct(events, "payment_method"),
+        "orders": len(_distinct(events, "order_id")).bit_length(),
+        "articles": len(_distinct(events, "article_id")).bit_length(),
+        "scroll_seconds": int(sum(durations) / len(durations)).bit_length()
+        if durations
+        else None,
+    }
+    if not (features["user_agents"] or features["ip_addresses"] or features["devices"]):
+        features["user_id"] = user_id
+    return hashlib.sha256(json.dumps(features, sort_keys=True).encode()).hexdigest()
+
+
+def _distinct(events: list[dict], name: str) -> list[str]:
+    """Sorted distinct values of a field across the window."""
+    return sorted({str(event[name]) for event in events if event.get(name)})
+
+
+class VerdictCache:  # pylint: disable=too-many-instance-attributes
+    """Bounded TTL cache of verdicts, in process with an optional Redis tier.
+
+    The in-process tier is an LRU of at most ``max_entries`` fingerprints.
+    The Redis tier, when a client is given, shares verdicts across workers;
+    its failures only count as misses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = settings.LLM_CACHE_TTL_SECONDS,
+        redis_client: Any = None,
+        prefix: str = "llm_verdict:",
+    ):
+        """Initialize VerdictCache."""
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis = redis_client
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def stats(self) -> dict:
+        """Hit and miss counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+    async def get(self, fingerprint: str) -> dict | None:
+        """Return the cached verdict fields of a fingerprint, if any."""
+        entry = self._entries.get(fingerprint)
+        if entry is not None:
+            expires_at, verdict = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(fingerprint)
+                self.hits += 1
+                return verdict
+            del self._entries[fingerprint]
+
+        shared = await self._get_shared(fingerprint)
+        if shared is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._put_local(fingerprint, shared)
+        return shared
+
+    async def set(self, fingerprint: str, verdict: dict):
+        """Cache the verdict fields of a fingerprint in every tier."""
+        self._put_local(fingerprint, verdict)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(
+                self.prefix + fingerprint,
+                json.dumps(verdict),
+                ex=max(1, int(self.ttl_seconds)),
+            )
+        except redis.RedisError as e:
+            logger.warning("Failed to share LLM verdict: {}", e)
+
+    async def _get_shared(self, fingerprint: str) -> dict | None:
+        """Look a fingerprint up in the Redis tier."""
+        if self.redis is None:
+            return None
+        try:
+            cached = await self.redis.get(self.prefix + fingerprint)
+        except redis.RedisError as e:
+            logger.warning("Failed to read shared LLM verdict: {}", e)
+            return None
+        return json.loads(cached) if cached else None
+
+    def _put_local(self, fingerprint: str, verdict: dict):
+        """Store a verdict in the in-process LRU."""
+        self._entries[fingerprint] = (time.monotonic() + self.ttl_seconds, verdict)
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
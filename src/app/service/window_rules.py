@@ -0,0 +1,60 @@
+"""Declarative sliding-window rules of the fraud hot path."""
+
+import os
+import re
+
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from app.service.event_codec import event_kind
+
+_NAME = re.compile(r"^[a-z0-9_]+$")
+
+
+@dataclass(frozen=True)
+class WindowRule:
+    """Breached when a user reaches ``threshold`` within ``window_seconds``.
+
+    The rule counts the events of ``event_types`` (every event when empty),
+    only the failed ones with ``failed_only``, or, with ``distinct``, the
+    distinct values of that field among them.
+    """
+
+    name: str
+    window_seconds: float
+    threshold: int
+    event_types: tuple[str, ...] = ()
+    failed_only: bool = False
+    distinct: str | None = None
+
+    def member(self, event: dict) -> bytes | str | None:
+        """Window member standing for the event, None if it does not count."""
+        if self.event_types and event_kind(event) not in self.event_types:
+            return None
+        if self.failed_only and event.get("success") is not False:
+            return None
+        if self.distinct is None:
+            # Only the count matters, a short unique member is enough
+            return os.urandom(8)
+        value = event.get(self.distinct)
+        # The same value again only refreshes its score
+        return None if value is None else str(value)
+
+
+def load_rules(configs: Iterable[dict[str, Any]]) -> tuple[WindowRule, ...]:
+    """Build the rules from their settings, rejecting invalid ones."""
+    rules = tuple(
+        WindowRule(**{**config, "event_types": tuple(config.get("event_types", ()))})
+        for config in configs
+    )
+    if not rules:
+        raise ValueError("At least one fraud window rule is required")
+    names = [rule.name for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate fraud window rule names: {names}")
+    for rule in rules:
+        if not _NAME.match(rule.name):
+            raise ValueError(f"Invalid fraud window rule name: {rule.name!r}")
+        if rule.window_seconds <= 0 or rule.threshold <= 0:
+            raise ValueError(f"Fraud window rule {rule.name} must be positive")
+    return rules
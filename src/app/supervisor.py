@@ -0,0 +1,167 @@
+"""
+Multi-process worker supervisor.
+
+Spawns N worker processes, each running its own Kafka broker, bronze
+writers and fraud service in the same consumer group, so Kafka spreads the
+partitions across them and decoding, validation and Polars work use every
+core of the pod. The supervisor coordinates startup and shutdown and serves
+a single aggregated ``/health``. Run with ``python -m app.supervisor``.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+
+from contextlib import asynccontextmanager
+from multiprocessing.process import BaseProcess
+from multiprocessing.synchronize import Event
+from typing import Callable
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from loguru import logger
+
+from app.constants import settings
+from app.main import start_app, stop_app
+
+
+def run_worker(index: int, ready: Event, run_maintenance: bool):
+    """Entry point of a worker process."""
+    asyncio.run(_serve(index, ready, run_maintenance))
+
+
+async def _serve(index: int, ready: Event, run_maintenance: bool):
+    """Run the app until SIGTERM (or SIGINT) asks the worker to stop."""
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    await start_app(run_maintenance=run_maintenance)
+    logger.info("Worker {} ready (pid {})", index, os.getpid())
+    ready.set()
+
+    await stopping.wait()
+    logger.info("Worker {} stopping", index)
+    await stop_app()
+
+
+class Supervisor:
+    """Starts, monitors and stops the worker processes."""
+
+    def __init__(
+        self,
+        workers: int = settings.SUPERVISOR_WORKERS,
+        *,
+        startup_timeout: float = settings.SUPERVISOR_STARTUP_TIMEOUT_SECONDS,
+        shutdown_timeout: float = settings.SUPERVISOR_SHUTDOWN_TIMEOUT_SECONDS,
+        target: Callable[[int, Event, bool], None] = run_worker,
+    ):
+        """Initialize Supervisor."""
+        self.workers = workers or os.cpu_count() or 1
+        self.startup_timeout = startup_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.target = target
+
+        # Spawned workers build their own broker, writers and Redis clients
+        # instead of inheriting half-initialized ones from the supervisor
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: list[tuple[BaseProcess, Event]] = []
+
+    def start(self):
+        """Start every worker and wait until all of them are consuming."""
+        if self.workers > 1 and settings.FRAUD_PREFILTER_ENABLED:
+            # A user's events are split between the workers, none of which
+            # would see enough of them to escalate
+            logger.warning("Disabling the fraud pre-filter with several workers")
+            os.environ["FRAUD_PREFILTER_ENABLED"] = "false"
+        for index in range(self.workers):
+            ready = self._context.Event()
+            process = self._context.Process(
+                target=self.target,
+                # Only one worker runs lakehouse maintenance
+                args=(index, ready, index == 0),
+                name=f"cyber-streamer-worker-{index}",
+            )
+            process.start()
+            self._processes.append((process, ready))
+
+        deadline = time.monotonic() + self.startup_timeout
+        for process, ready in self._processes:
+            while not ready.wait(0.1):
+                if not process.is_alive() or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"Worker {process.name} failed to start")
+        logger.info("Started {} workers", self.workers)
+
+    def stop(self):
+        """Ask every worker to drain and stop, killing those that hang."""
+        # SIGTERM rather than a shared event: a worker dying while blocked
+        # on a multiprocessing primitive would leave it unusable
+        for process, _ in self._processes:
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process, _ in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker {} did not stop, killing it", process.name)
+                process.kill()
+                process.join()
+        self._processes = []
+
+    def health(self) -> dict:
+        """Aggregate the health of every worker."""
+        workers = [
+            {
+                "name": process.name,
+                "pid": process.pid,
+                "alive": process.is_alive(),
+                "ready": ready.is_set(),
+            }
+            for process, ready in self._processes
+        ]
+        healthy = bool(workers) and all(w["alive"] and w["ready"] for w in workers)
+        return {"status": "healthy" if healthy else "unhealthy", "workers": workers}
+
+
+def create_app(supervisor: Supervisor) -> FastAPI:
+    """Build the supervisor app serving the aggregated health check."""
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        """Start the workers with the app and stop them on shutdown."""
+        await asyncio.to_thread(supervisor.start)
+        yield
+        await asyncio.to_thread(supervisor.stop)
+
+    supervisor_app = FastAPI(title="CyberStreamerSupervisor", lifespan=lifespan)
+
+    @supervisor_app.get("/health")
+    def health_check():
+        """Check the health of every worker."""
+        health = supervisor.health()
+        status_code = 200 if health["status"] == "healthy" else 503
+        return JSONResponse(health, status_code=status_code)
+
+    return supervisor_app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cyber Streamer supervisor")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.SUPERVISOR_WORKERS,
+        help="Number of worker processes, 0 for one per core",
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(Supervisor(args.workers)), host=args.host, port=args.port)
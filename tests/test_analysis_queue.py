@@ -0,0 +1,134 @@
+"""Tests for the background analysis queue."""
+
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.service.analysis_queue import AnalysisQueue
+
+
+class TestAnalysisQueue(unittest.IsolatedAsyncioTestCase):
+    """Test AnalysisQueue scheduling and dropping."""
+
+    async def _drain(self):
+        """Let the workers run until they are idle."""
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+    async def test_jobs_run_by_priority(self):
+        """Test queued jobs run by priority, then in submission order."""
+        processed = []
+
+        async def process(item):
+            processed.append(item)
+
+        queue = AnalysisQueue(process, workers=1, max_size=10, deadline_seconds=60)
+        # Workers only get to run once the submitting task yields
+        queue.submit("low", (1, -5))
+        queue.submit("high", (0, -1))
+        queue.submit("busiest", (1, -20))
+        queue.submit("later", (1, -20))
+        await self._drain()
+
+        self.assertEqual(processed, ["high", "busiest", "later", "low"])
+        self.assertEqual(queue.stats()["processed"], 4)
+        await queue.stop()
+
+    async def test_submit_rejects_when_full(self):
+        """Test a full queue rejects jobs without waiting."""
+        on_drop = AsyncMock()
+        queue = AnalysisQueue(
+            AsyncMock(), on_drop=on_drop, workers=1, max_size=1, deadline_seconds=60
+        )
+
+        self.assertTrue(queue.submit("a"))
+        self.assertFalse(queue.submit("b"))
+
+        await queue.stop()
+        self.assertEqual(queue.stats()["rejected"], 1)
+        on_drop.assert_any_await("b")
+
+    @patch("app.service.analysis_queue.time.monotonic")
+    async def test_stale_jobs_dropped(self, mock_monotonic):
+        """Test jobs queued past their deadline are not processed."""
+        mock_monotonic.return_value = 100.0
+        process, on_drop = AsyncMock(), AsyncMock()
+        queue = AnalysisQueue(
+            process, on_drop=on_drop, workers=1, max_size=10, deadline_seconds=5
+        )
+
+        queue.submit("stale")
+        mock_monotonic.return_value = 106.0
+        await self._drain()
+
+        process.assert_not_awaited()
+        on_drop.assert_awaited_once_with("stale")
+        self.assertEqual(queue.stats()["expired"], 1)
+        await queue.stop()
+
+    async def test_failed_job_does_not_stop_worker(self):
+        """Test a failing job is logged and the next one still runs."""
+        process = AsyncMock(side_effect=[RuntimeError("boom"), None])
+        queue = AnalysisQueue(process, workers=1, max_size=10, deadline_seconds=60)
+
+        queue.submit("a")
+        queue.submit("b")
+        await self._drain()
+
+        self.assertEqual(process.await_count, 2)
+        self.assertEqual(queue.stats()["processed"], 1)
+        await queue.stop()
+
+    async def test_failed_job_dropped(self):
+        """Test a failing job is handed to on_drop."""
+        on_drop = AsyncMock()
+        queue = AnalysisQueue(
+            AsyncMock(side_effect=RuntimeError("boom")),
+            on_drop=on_drop,
+            workers=1,
+            max_size=10,
+            deadline_seconds=60,
+        )
+
+        queue.submit("a")
+        await self._drain()
+
+        on_drop.assert_awaited_once_with("a")
+        await queue.stop()
+
+    async def test_stop_drops_pending_jobs(self):
+        """Test jobs still queued at shutdown are handed to on_drop."""
+        on_drop = AsyncMock()
+        queue = AnalysisQueue(
+            AsyncMock(), on_drop=on_drop, workers=1, max_size=10, deadline_seconds=60
+        )
+        queue.submit("a")
+        queue.submit("b")
+
+        await queue.stop()
+
+        self.assertEqual(on_drop.await_count, 2)
+        self.assertEqual(queue.stats()["workers"], 0)
+
+    async def test_stop_drops_jobs_in_flight(self):
+        """Test jobs cancelled mid-analysis at shutdown are handed to on_drop."""
+        on_drop = AsyncMock()
+        started = asyncio.Event()
+
+        async def process(_item):
+            started.set()
+            await asyncio.Event().wait()
+
+        queue = AnalysisQueue(
+            process, on_drop=on_drop, workers=1, max_size=10, deadline_seconds=60
+        )
+        queue.submit("a")
+        await started.wait()
+
+        await queue.stop()
+
+        on_drop.assert_awaited_once_with("a")
+
+
+if __name__ == "__main__":
+    unittest.main()
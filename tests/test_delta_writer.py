@@ -0,0 +1,203 @@
+"""Tests for buffered Delta writer."""
+
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import polars as pl
+from deltalake import DeltaTable
+
+from app.service.delta_writer import BufferedDeltaWriter
+from app.service.offsets import PendingOffsets
+
+
+class TestBufferedDeltaWriter(unittest.IsolatedAsyncioTestCase):
+    """Test BufferedDeltaWriter."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp_dir.cleanup)
+        self.target = f"{tmp_dir.name}/table"
+
+    async def test_flush_on_max_rows(self):
+        """Test a flush is triggered once max_rows rows are buffered."""
+        writer = BufferedDeltaWriter(self.target, max_rows=3, max_latency=60)
+
+        await writer.write([{"user_id": "u1"}, {"user_id": "u2"}])
+        self.assertEqual(writer.pending_rows, 2)
+
+        await writer.write([{"user_id": "u3"}])
+        self.assertEqual(writer.pending_rows, 0)
+
+        df = pl.read_delta(self.target)
+        self.assertEqual(df.height, 3)
+        await writer.close()
+
+    async def test_flush_on_max_bytes(self):
+        """Test a flush is triggered once max_bytes is exceeded."""
+        writer = BufferedDeltaWriter(self.target, max_bytes=10, max_latency=60)
+
+        await writer.write([{"user_id": "a_long_user_id"}])
+
+        self.assertEqual(writer.pending_rows, 0)
+        self.assertEqual(pl.read_delta(self.target).height, 1)
+        await writer.close()
+
+    async def test_flush_on_max_latency(self):
+        """Test buffered rows are flushed by the latency timer."""
+        writer = BufferedDeltaWriter(self.target, max_latency=0.05)
+
+        await writer.write([{"user_id": "u1"}])
+        await asyncio.sleep(0.2)
+
+        self.assertEqual(writer.pending_rows, 0)
+        self.assertEqual(pl.read_delta(self.target).height, 1)
+        await writer.close()
+
+    async def test_one_commit_per_flush(self):
+        """Test a flush produces a single Delta commit."""
+        writer = BufferedDeltaWriter(self.target, max_latency=60)
+
+        for i in range(5):
+            await writer.write([{"user_id": f"u{i}"}])
+        await writer.close()
+
+        self.assertEqual(DeltaTable(self.target).version(), 0)
+        self.assertEqual(pl.read_delta(self.target).height, 5)
+
+    async def test_write_frame(self):
+        """Test columnar batches and rows are flushed together."""
+        writer = BufferedDeltaWriter(self.target, max_rows=3, max_latency=60)
+
+        await writer.write_frame(pl.DataFrame({"user_id": ["u1", "u2"]}))
+        self.assertEqual(writer.pending_rows, 2)
+        await writer.write([{"user_id": "u3"}])
+
+        self.assertEqual(writer.pending_rows, 0)
+        self.assertEqual(DeltaTable(self.target).version(), 0)
+        self.assertEqual(pl.read_delta(self.target).height, 3)
+        await writer.close()
+
+    async def test_failed_flush_keeps_rows(self):
+        """Test rows are kept for retry when the write fails."""
+        writer = BufferedDeltaWriter(self.target, max_latency=60)
+        await writer.write([{"user_id": "u1"}])
+
+        with patch.object(writer, "_write_batch", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                await writer.flush()
+
+        self.assertEqual(writer.pending_rows, 1)
+        await writer.close()
+        self.assertEqual(pl.read_delta(self.target).height, 1)
+
+    @patch.object(PendingOffsets, "commit", new_callable=AsyncMock)
+    async def test_offsets_committed_after_flush(self, mock_commit):
+        """Test offsets are committed only once their rows are durable."""
+        writer = BufferedDeltaWriter(self.target, max_latency=60)
+        offsets = PendingOffsets()
+        offsets.update(("login", 0), 41)
+        await writer.write([{"user_id": "u1"}], offsets)
+
+        with patch.object(writer, "_write_batch", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                await writer.flush()
+        mock_commit.assert_not_called()
+
+        await writer.flush()
+
+        mock_commit.assert_awaited_once()
+        self.assertEqual(pl.read_delta(self.target).height, 1)
+        await writer.close()
+
+    async def test_offsets_without_rows(self):
+        """Test offsets of fully rejected batches are still committed."""
+        writer = BufferedDeltaWriter(self.target, max_latency=60)
+        offsets = PendingOffsets()
+        offsets.update(("login", 0), 7)
+        offsets.consumer = MagicMock()
+
+        with patch("app.service.offsets.asyncio.to_thread", new=AsyncMock()) as mock:
+            await writer.write([], offsets)
+            await writer.flush()
+
+        mock.assert_awaited_once()
+
+    async def test_offsets_without_rows_leave_timer_idle(self):
+        """Test offsets of rejected batches do not keep the timer spinning."""
+        writer = BufferedDeltaWriter(self.target, max_latency=0.01)
+        offsets = PendingOffsets()
+        offsets.update(("login", 0), 7)
+        offsets.consumer = MagicMock()
+        await writer.write([{"user_id": "u1"}])
+        await writer.flush()
+
+        with patch("app.service.offsets.asyncio.to_thread", new=AsyncMock()) as mock:
+            await writer.write_frame(pl.DataFrame(), offsets)
+            mock.assert_awaited_once()
+
+        # The timer of the flushed rows winds down instead of looping
+        await asyncio.wait_for(writer._timer, timeout=1)
+        self.assertEqual(writer.pending_rows, 0)
+        await writer.close()
+
+    @patch.object(PendingOffsets, "commit", new_callable=AsyncMock)
+    async def test_close_waits_for_timer_flush(self, mock_commit):
+        """Test closing during a timer flush keeps its rows and offsets."""
+        writer = BufferedDeltaWriter(self.target, max_latency=0.01)
+        offsets = PendingOffsets()
+        offsets.update(("login", 0), 41)
+        writing = threading.Event()
+        write_batch = writer._write_batch
+
+        def slow_write(rows, frames):
+            writing.set()
+            time.sleep(0.1)
+            write_batch(rows, frames)
+
+        with patch.object(writer, "_write_batch", side_effect=slow_write):
+            await writer.write([{"user_id": "u1"}], offsets)
+            while not writing.is_set():
+                await asyncio.sleep(0.01)
+            await writer.close()
+
+        self.assertEqual(pl.read_delta(self.target).height, 1)
+        mock_commit.assert_awaited()
+        self.assertEqual(writer.pending_rows, 0)
+
+    @patch.object(PendingOffsets, "commit", new_callable=AsyncMock)
+    async def test_failing_batch_dead_lettered(self, mock_commit):
+        """Test a batch failing max_retries flushes is dead-lettered and dropped."""
+        dead_letter = f"{self.target}_dead_letter"
+        writer = BufferedDeltaWriter(
+            self.target, max_latency=60, max_retries=2, dead_letter=dead_letter
+        )
+        offsets = PendingOffsets()
+        offsets.update(("login", 0), 41)
+        await writer.write([{"user_id": "u1"}], offsets)
+        await writer.write_frame(pl.DataFrame({"user_id": ["u2"]}))
+
+        with patch.object(writer, "_write_batch", side_effect=OSError("bad batch")):
+            with self.assertRaises(OSError):
+                await writer.flush()
+            self.assertEqual(writer.pending_rows, 2)
+            mock_commit.assert_not_called()
+
+            await writer.flush()
+
+        self.assertEqual(writer.pending_rows, 0)
+        mock_commit.assert_awaited_once()
+        (path,) = Path(dead_letter).glob("*.ndjson")
+        self.assertEqual(
+            sorted(pl.read_ndjson(path)["user_id"].to_list()), ["u1", "u2"]
+        )
+        await writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""Tests for the compact event encoding."""
+
+import datetime
+import json
+import unittest
+
+from app.models.fraud import Login, Scroll
+from app.service.event_codec import decode_event, encode_event
+
+
+class TestEventCodec(unittest.TestCase):
+    """Test encode_event and decode_event."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.login = Login(
+            user_id="u1",
+            timestamp=datetime.datetime(
+                2023, 10, 27, 10, 0, 0, 123456, tzinfo=datetime.timezone.utc
+            ),
+            ip_address="192.168.1.1",
+            device_id="d1",
+            success=False,
+        ).model_dump()
+
+    def test_round_trip(self):
+        """Test analysis fields survive the round trip and user_id is dropped."""
+        decoded = decode_event(encode_event(self.login))
+
+        expected = dict(self.login)
+        del expected["user_id"]
+        self.assertEqual(decoded, expected)
+
+    def test_float_fields(self):
+        """Test float fields are kept exactly."""
+        scroll = Scroll(
+            user_id="u1",
+            article_id="a1",
+            timestamp="2023-10-27T10:02:00Z",
+            percentage=0.8,
+            duration_seconds=120.5,
+        ).model_dump()
+
+        decoded = decode_event(encode_event(scroll))
+
+        self.assertEqual(decoded["percentage"], 0.8)
+        self.assertEqual(decoded["duration_seconds"], 120.5)
+        self.assertEqual(decoded["article_id"], "a1")
+
+    def test_naive_timestamps_are_utc(self):
+        """Test naive timestamps and ISO strings are read as UTC."""
+        naive = decode_event(encode_event({"timestamp": datetime.datetime(2023, 1, 1)}))
+        iso = decode_event(encode_event({"timestamp": "2023-01-01T00:00:00"}))
+
+        expected = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+        self.assertEqual(naive["timestamp"], expected)
+        self.assertEqual(iso["timestamp"], expected)
+
+    def test_identical_events_are_unique(self):
+        """Test identical events encode to distinct members."""
+        members = {encode_event(self.login) for _ in range(100)}
+
+        self.assertEqual(len(members), 100)
+
+    def test_smaller_than_json(self):
+        """Test the encoding is much smaller than the JSON document."""
+        encoded = encode_event(self.login)
+
+        self.assertLess(len(encoded), len(json.dumps(self.login, default=str)) / 2)
+
+    def test_long_strings(self):
+        """Test strings longer than a single length byte."""
+        event = {"user_agent": "Mozilla/5.0 " * 50, "device_id": "é" * 200}
+
+        self.assertEqual(decode_event(encode_event(event)), event)
+
+    def test_unknown_version(self):
+        """Test members of an unknown encoding version are rejected."""
+        with self.assertRaises(ValueError):
+            decode_event(b"\x09" + encode_event(self.login)[1:])
+
+    def test_malformed_member(self):
+        """Test truncated or legacy JSON members raise ValueError."""
+        with self.assertRaises(ValueError):
+            decode_event(encode_event(self.login)[:-3])
+        with self.assertRaises(ValueError):
+            decode_event(b'{"user_id": "u1"}')
+
+
+if __name__ == "__main__":
+    unittest.main()
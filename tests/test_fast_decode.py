@@ -0,0 +1,137 @@
+"""Tests for columnar batch decoding."""
+
+import datetime
+import json
+import unittest
+
+import polars as pl
+from pydantic import ValidationError
+
+from app.models.fraud import Login, Order, Scroll
+from app.service.fast_decode import decode_batch, polars_schema
+
+
+def _login(**overrides) -> bytes:
+    """Build a raw login message."""
+    event = {
+        "user_id": "u1",
+        "timestamp": "2023-10-27T10:00:00+00:00",
+        "ip_address": "127.0.0.1",
+        "device_id": "d1",
+        "success": True,
+        "user_agent": "Mozilla/5.0",
+    }
+    event.update(overrides)
+    return json.dumps(event).encode("utf-8")
+
+
+class TestFastDecode(unittest.TestCase):
+    """Test decode_batch."""
+
+    def test_polars_schema(self):
+        """Test the schema is derived from the model fields."""
+        schema = polars_schema(Scroll)
+
+        self.assertEqual(schema["user_id"], pl.String())
+        self.assertEqual(schema["percentage"], pl.Float64())
+        self.assertEqual(schema["timestamp"], pl.Datetime("us", "UTC"))
+
+    def test_decode_valid_batch(self):
+        """Test a clean batch is decoded without errors."""
+        batch = decode_batch([_login(), _login(user_id="u2", success=False)], Login)
+
+        self.assertEqual(batch.errors, [])
+        self.assertEqual(batch.frame.columns, list(Login.model_fields))
+        self.assertEqual(batch.frame["user_id"].to_list(), ["u1", "u2"])
+        self.assertEqual(batch.frame["success"].to_list(), [True, False])
+        self.assertEqual(
+            batch.frame["timestamp"][0],
+            datetime.datetime(2023, 10, 27, 10, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_matches_pydantic_path(self):
+        """Test decoded rows match the Pydantic model_dump path."""
+        payloads = [_login(timestamp="2023-10-27T12:00:00+02:00"), _login()]
+
+        batch = decode_batch(payloads, Login)
+
+        expected = [Login.model_validate_json(p).model_dump() for p in payloads]
+        self.assertEqual(batch.frame.to_dicts(), expected)
+
+    def test_invalid_rows_rejected(self):
+        """Test invalid rows are rejected with validation errors."""
+        payloads = [
+            _login(),
+            _login(success="not a bool"),
+            json.dumps({"user_id": "u3"}).encode("utf-8"),
+        ]
+
+        batch = decode_batch(payloads, Login)
+
+        self.assertEqual(batch.frame.height, 1)
+        self.assertEqual([index for index, _ in batch.errors], [1, 2])
+
+    def test_lax_values_recovered(self):
+        """Test values the columnar casts miss but the model accepts are kept."""
+        batch = decode_batch([_login(success="yes"), _login()], Login)
+
+        self.assertEqual(batch.errors, [])
+        self.assertEqual(batch.frame.height, 2)
+        self.assertTrue(all(batch.frame["success"]))
+
+    def test_non_string_text_fields_match_pydantic(self):
+        """Test JSON numbers, booleans and objects in text fields are rejected."""
+        payloads = [
+            _login(),
+            _login(user_id=123),
+            _login(device_id=True),
+            _login(ip_address={"v4": "127.0.0.1"}),
+            _login(user_agent=7),
+            _login(device_id="123"),
+        ]
+
+        batch = decode_batch(payloads, Login)
+
+        expected_rows, expected_errors = [], []
+        for index, payload in enumerate(payloads):
+            try:
+                expected_rows.append(Login.model_validate_json(payload).model_dump())
+            except ValidationError:
+                expected_errors.append(index)
+        self.assertEqual(batch.frame.to_dicts(), expected_rows)
+        self.assertEqual([index for index, _ in batch.errors], expected_errors)
+        self.assertEqual(expected_errors, [1, 2, 3])
+
+    def test_malformed_json(self):
+        """Test malformed payloads do not fail the whole batch."""
+        batch = decode_batch([_login(), b"{not json"], Login)
+
+        self.assertEqual(batch.frame.height, 1)
+        self.assertEqual(batch.errors[0][0], 1)
+
+    def test_int64_overflow_rejected(self):
+        """Test integers too large for Int64 reject their row, not the batch."""
+        order = {
+            "order_id": "o1",
+            "user_id": "u1",
+            "article_id": "a1",
+            "quantity": 1,
+            "total_price": 9.99,
+            "currency": "EUR",
+            "timestamp": "2023-10-27T10:00:00+00:00",
+        }
+        payloads = [
+            json.dumps(order).encode("utf-8"),
+            json.dumps({**order, "quantity": 10**23}).encode("utf-8"),
+            json.dumps({**order, "quantity": 1e23}).encode("utf-8"),
+        ]
+
+        batch = decode_batch(payloads, Order)
+
+        self.assertEqual(batch.frame["quantity"].to_list(), [1])
+        self.assertEqual([index for index, _ in batch.errors], [1, 2])
+        self.assertEqual(batch.errors[0][1].errors()[0]["loc"], ("quantity",))
+
+
+if __name__ == "__main__":
+    unittest.main()
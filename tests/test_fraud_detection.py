@@ -1,13 +1,20 @@
 """Tests for fraud detection."""
 
+import asyncio
 import datetime
 import unittest
 from unittest.mock import patch, MagicMock, AsyncMock
 import logging
 
+import redis.asyncio as redis
+from redis.exceptions import NoScriptError
+
+from app.constants import settings
 from app.models.fraud import User, Order
-from app.service.fraud_service import FraudService
+from app.service.event_codec import encode_event
+from app.service.fraud_service import FraudService, WindowBreach
 from app.service.llm_provider import FraudResult
+from app.service.redis_shards import RedisShards
 
 
 class TestFraudModels(unittest.TestCase):
@@ -46,35 +53,38 @@ class TestFraudService(unittest.IsolatedAsyncioTestCase):
         """Set up test fixtures."""
         self.user_id = "test_user_123"
         self.logger = logging.getLogger("app.service.fraud_service")
+        # Analyze breaches inline with the LLM, the queue and the rules are
+        # covered separately
+        for name in ("FRAUD_ANALYSIS_QUEUE_ENABLED", "FRAUD_RULES_ENABLED"):
+            patcher = patch.object(settings, name, False)
+            patcher.start()
+            self.addCleanup(patcher.stop)
 
-    @patch("app.service.fraud_service.redis.from_url")
-    @patch("app.service.fraud_service.LLMProvider")
-    @patch("app.service.fraud_service._write_fraud_score")
-    async def test_process_event_threshold_breach(
-        self, mock_write, mock_llm_cls, mock_redis_from_url
-    ):
-        """Test processing event resulting in fraud check."""
-        # 1. Mock Redis
-        mock_redis = MagicMock()  # Client methods like pipeline() are sync
+    def _mock_redis(self, mock_redis_from_url, *windows: list) -> MagicMock:
+        """Mock the Redis client returning windows from the pipelined script."""
+        mock_redis = MagicMock()  # Client methods like register_script() are sync
         mock_redis_from_url.return_value = mock_redis
+        mock_redis.register_script.return_value = AsyncMock()
+        mock_redis.delete = AsyncMock()
 
-        # Pipeline mocks
         mock_pipeline = AsyncMock()
         mock_redis.pipeline.return_value = mock_pipeline
         mock_pipeline.__aenter__.return_value = mock_pipeline
-        mock_pipeline.execute.return_value = [
-            1,
-            1,
-            10,
-            True,
-        ]  # ZADD, REM, CARD=10, EXPIRE
+        mock_pipeline.execute.return_value = list(windows)
+        return mock_redis
 
-        # Redis Get (Alert Lock) and ZRange need to be async
-        mock_redis.get = AsyncMock(return_value=None)
-        mock_redis.zrange = AsyncMock(
-            return_value=['{"event_type": "login", "timestamp": 123}']
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    @patch("app.service.fraud_service.write_fraud_score")
+    async def test_process_event_threshold_breach(
+        self, mock_write, mock_llm_cls, mock_redis_from_url
+    ):
+        """Test processing event resulting in fraud check."""
+        # 1. Mock Redis: count 10 reached and alert lock acquired
+        window_event = {"event_type": "login", "ip_address": "127.0.0.1"}
+        mock_redis = self._mock_redis(
+            mock_redis_from_url, [[10, 10], [encode_event(window_event)]]
         )
-        mock_redis.setex = AsyncMock()
 
         # 2. Mock LLM
         mock_llm_instance = mock_llm_cls.return_value
@@ -92,42 +102,37 @@ class TestFraudService(unittest.IsolatedAsyncioTestCase):
         await service.process_event(self.user_id, event)
 
         # 5. Assertions
-        # Redis pipeline called
-        mock_pipeline.zadd.assert_called()
-        mock_pipeline.zcard.assert_called()
-
-        # Threshold met (10), so ZRange called
-        mock_redis.zrange.assert_called()
+        # One script call with the window and alert lock keys
+        mock_script = mock_redis.register_script.return_value
+        mock_script.assert_awaited_once()
+        self.assertEqual(
+            mock_script.call_args.kwargs["keys"],
+            [
+                f"user_events:{{{self.user_id}}}",
+                f"last_alert:{{{self.user_id}}}",
+                f"user_rule:{{{self.user_id}}}:events",
+            ],
+        )
 
-        # LLM called
-        mock_llm_instance.analyze_behavior.assert_called()
+        # LLM called with the window returned by the script
+        mock_llm_instance.analyze_behavior.assert_called_once_with(
+            [window_event], self.user_id
+        )
 
         # Write score called
         mock_write.assert_called_once()
 
-        # Alert lock set
-        mock_redis.setex.assert_called_with(f"last_alert:{self.user_id}", 120, "1")
+        # Alert lock kept for the rest of the window
+        mock_redis.delete.assert_not_called()
 
     @patch("app.service.fraud_service.redis.from_url")
     @patch("app.service.fraud_service.LLMProvider")
-    @patch("app.service.fraud_service._write_fraud_score")
+    @patch("app.service.fraud_service.write_fraud_score")
     async def test_process_event_no_threshold(
         self, mock_write, mock_llm_cls, mock_redis_from_url
     ):
         """Test processing event below threshold."""
-        mock_redis = MagicMock()
-        mock_redis_from_url.return_value = mock_redis
-
-        mock_pipeline = AsyncMock()
-        mock_redis.pipeline.return_value = mock_pipeline
-        mock_pipeline.__aenter__.return_value = mock_pipeline
-        mock_pipeline.execute.return_value = [1, 1, 5, True]  # CARD=5
-
-        # Mock other asyncio methods on redis client just in case
-        mock_redis.zadd = AsyncMock()
-        mock_redis.zremrangebyscore = AsyncMock()
-        mock_redis.zcard = AsyncMock()
-        mock_redis.expire = AsyncMock()
+        self._mock_redis(mock_redis_from_url, [[5, 5]])
 
         service = FraudService()
         event = {"event_type": "login", "user_id": self.user_id}
@@ -139,6 +144,387 @@ class TestFraudService(unittest.IsolatedAsyncioTestCase):
         # Write score NOT called
         mock_write.assert_not_called()
 
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    @patch("app.service.fraud_service.write_fraud_score")
+    async def test_process_event_alert_locked(
+        self, mock_write, mock_llm_cls, mock_redis_from_url
+    ):
+        """Test a breach is not analyzed again while the alert lock is held."""
+        self._mock_redis(mock_redis_from_url, [[12, 12]])
+
+        service = FraudService()
+        await service.process_event(self.user_id, {"user_id": self.user_id})
+
+        mock_llm_cls.return_value.analyze_behavior.assert_not_called()
+        mock_write.assert_not_called()
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    @patch("app.service.fraud_service.write_fraud_score")
+    async def test_process_event_releases_lock(
+        self, mock_write, mock_llm_cls, mock_redis_from_url
+    ):
+        """Test the alert lock is released when no fraud is found."""
+        mock_redis = self._mock_redis(
+            mock_redis_from_url, [[10, 10], [encode_event({})]]
+        )
+        mock_llm_cls.return_value.analyze_behavior = AsyncMock(
+            return_value=FraudResult(score=0.1, reason="Normal", is_critical=False)
+        )
+
+        service = FraudService()
+        await service.process_event(self.user_id, {"user_id": self.user_id})
+
+        mock_write.assert_not_called()
+        mock_redis.delete.assert_awaited_once_with(f"last_alert:{{{self.user_id}}}")
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    @patch("app.service.fraud_service.write_fraud_score")
+    async def test_process_events_batch(
+        self, mock_write, mock_llm_cls, mock_redis_from_url
+    ):
+        """Test a batch is checked in one pipeline with one call per user."""
+        mock_redis = self._mock_redis(
+            mock_redis_from_url,
+            [[3, 3]],
+            [[10, 10], [encode_event({"device_id": "d1"})]],
+        )
+        mock_llm_cls.return_value.analyze_behavior = AsyncMock(
+            return_value=FraudResult(score=0.9, reason="Bot", is_critical=False)
+        )
+
+        service = FraudService()
+        breaches = await service.process_events(
+            [
+                ("u1", {"device_id": "d1"}),
+                ("u2", {"device_id": "d1"}),
+                ("u1", {"device_id": "d2"}),
+            ]
+        )
+
+        mock_redis.pipeline.assert_called_once_with(transaction=False)
+        mock_script = mock_redis.register_script.return_value
+        self.assertEqual(mock_script.await_count, 2)
+        # Both events of u1 are added by the same script call
+        first_call = mock_script.call_args_list[0].kwargs
+        self.assertEqual(first_call["keys"][0], "user_events:{u1}")
+        self.assertEqual(first_call["args"][5], 2)
+
+        self.assertEqual(len(breaches), 1)
+        self.assertEqual(breaches[0].user_id, "u2")
+        self.assertEqual(breaches[0].events, [{"device_id": "d1"}])
+        mock_write.assert_called_once()
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    async def test_process_events_redis_error(self, mock_llm_cls, mock_redis_from_url):
+        """Test a Redis failure skips the batch without raising."""
+        mock_redis = self._mock_redis(mock_redis_from_url)
+        mock_redis.pipeline.return_value.execute.side_effect = redis.RedisError("down")
+
+        service = FraudService()
+        breaches = await service.process_events([("u1", {"device_id": "d1"})])
+
+        self.assertEqual(breaches, [])
+        mock_llm_cls.return_value.analyze_behavior.assert_not_called()
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    async def test_shard_error_skips_its_users(
+        self, _mock_llm_cls, mock_redis_from_url
+    ):
+        """Test a failing shard only skips the users it holds."""
+        healthy = self._mock_redis(MagicMock(), [[10, 10], [encode_event({})]])
+        failing = self._mock_redis(MagicMock())
+        failing.pipeline.return_value.execute.side_effect = redis.RedisError("down")
+        mock_redis_from_url.side_effect = [healthy, failing]
+        shards = RedisShards([0, 1])
+        user_a = next(f"u{i}" for i in range(100) if shards.shard_of(f"u{i}") == 0)
+        user_b = next(f"u{i}" for i in range(100) if shards.shard_of(f"u{i}") == 1)
+
+        with patch.object(settings, "REDIS_SHARD_URLS", ["redis://a", "redis://b"]):
+            service = FraudService()
+        breaches = await service.check_windows(
+            [(user_a, {}, 100.0), (user_b, {}, 100.0)], 100.0
+        )
+
+        self.assertEqual([breach.user_id for breach in breaches], [user_a])
+        healthy.pipeline.assert_called_once_with(transaction=False)
+        failing.pipeline.assert_called_once_with(transaction=False)
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    async def test_script_reloaded_when_missing(
+        self, _mock_llm_cls, mock_redis_from_url
+    ):
+        """Test the script is loaded and the pipeline retried on NOSCRIPT."""
+        mock_redis = self._mock_redis(mock_redis_from_url)
+        mock_redis.script_load = AsyncMock()
+        mock_redis.pipeline.return_value.execute.side_effect = [
+            NoScriptError("No matching script"),
+            [[[10, 10], [encode_event({})]]],
+        ]
+
+        service = FraudService()
+        breaches = await service.check_windows([("u1", {}, 100.0)], 100.0)
+
+        mock_redis.script_load.assert_awaited_once()
+        self.assertEqual(len(breaches), 1)
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    async def test_script_still_missing_skips_shard(
+        self, _mock_llm_cls, mock_redis_from_url
+    ):
+        """Test a second NOSCRIPT skips the shard instead of raising."""
+        mock_redis = self._mock_redis(mock_redis_from_url)
+        mock_redis.script_load = AsyncMock()
+        mock_redis.pipeline.return_value.execute.side_effect = NoScriptError(
+            "No matching script"
+        )
+
+        service = FraudService()
+        breaches = await service.check_windows([("u1", {}, 100.0)], 100.0)
+
+        self.assertEqual(breaches, [])
+        mock_redis.script_load.assert_awaited_once()
+        self.assertEqual(mock_redis.pipeline.return_value.execute.await_count, 2)
+
+    @patch("app.service.fraud_service.settings")
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    async def test_prefilter_skips_cold_users(
+        self, _mock_llm_cls, mock_redis_from_url, mock_settings
+    ):
+        """Test cold users stay local until they approach the threshold."""
+        mock_settings.FRAUD_PREFILTER_ENABLED = True
+        mock_settings.FRAUD_PREFILTER_ESCALATE_AT = 5
+        mock_settings.FRAUD_ANALYSIS_QUEUE_ENABLED = False
+        mock_settings.FRAUD_RULES_ENABLED = False
+        mock_settings.FRAUD_WINDOW_MAX_EVENTS = 200
+        mock_settings.FRAUD_WINDOW_RULES = settings.FRAUD_WINDOW_RULES
+        mock_redis = self._mock_redis(mock_redis_from_url, [[5, 5]])
+        service = FraudService()
+        service.prefilter.escalate_at = 5
+
+        for i in range(4):
+            await service.process_event("u1", {"device_id": f"d{i}"})
+        mock_redis.pipeline.assert_not_called()
+
+        await service.process_event("u1", {"device_id": "d4"})
+
+        # The backlog is released with the escalating event
+        mock_script = mock_redis.register_script.return_value
+        mock_script.assert_awaited_once()
+        self.assertEqual(mock_script.call_args.kwargs["args"][5], 5)
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    @patch("app.service.fraud_service.write_fraud_score")
+    async def test_concurrent_breaches_share_analysis(
+        self, mock_write, mock_llm_cls, mock_redis_from_url
+    ):
+        """Test concurrent breaches of a user run a single analysis."""
+        self._mock_redis(mock_redis_from_url)
+        mock_llm_cls.return_value.analyze_behavior = AsyncMock(
+            return_value=FraudResult(score=0.9, reason="Bot", is_critical=False)
+        )
+
+        service = FraudService()
+        breach = WindowBreach(self.user_id, 10, [{"device_id": "d1"}])
+        await asyncio.gather(service.analyze(breach), service.analyze(breach))
+
+        mock_llm_cls.return_value.analyze_behavior.assert_awaited_once()
+        mock_write.assert_called_once()
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    @patch("app.service.fraud_service.write_fraud_score")
+    async def test_breaches_analyzed_in_background(
+        self, mock_write, mock_llm_cls, mock_redis_from_url
+    ):
+        """Test queued breaches do not hold up process_events."""
+        window_event = {"event_type": "buy", "payment_method": "card"}
+        self._mock_redis(mock_redis_from_url, [[10, 10], [encode_event(window_event)]])
+        analyzed = asyncio.Event()
+
+        async def analyze_behavior(_events, _user_id):
+            await analyzed.wait()
+            return FraudResult(score=0.9, reason="Bot", is_critical=False)
+
+        mock_llm_cls.return_value.analyze_behavior = analyze_behavior
+
+        with patch.object(settings, "FRAUD_ANALYSIS_QUEUE_ENABLED", True):
+            service = FraudService()
+        breaches = await service.process_events([(self.user_id, window_event)])
+
+        self.assertEqual(len(breaches), 1)
+        mock_write.assert_not_called()
+
+        analyzed.set()
+        for _ in range(100):
+            if service.analysis_queue.stats()["processed"]:
+                break
+            await asyncio.sleep(0.01)
+        mock_write.assert_called_once()
+        self.assertEqual(service.analysis_queue.stats()["processed"], 1)
+        await service.analysis_queue.stop()
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    @patch("app.service.fraud_service.write_fraud_score")
+    async def test_close_cancels_running_analysis(
+        self, mock_write, mock_llm_cls, mock_redis_from_url
+    ):
+        """Test close cancels a queued analysis before releasing its resources."""
+        window_event = {"event_type": "buy", "payment_method": "card"}
+        mock_redis = self._mock_redis(
+            mock_redis_from_url, [[10, 10], [encode_event(window_event)]]
+        )
+        calls = []
+        started = asyncio.Event()
+        mock_redis.delete = AsyncMock(side_effect=lambda _key: calls.append("release"))
+        mock_redis.aclose = AsyncMock(side_effect=lambda: calls.append("close"))
+
+        async def analyze_behavior(_events, _user_id):
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                calls.append("cancelled")
+                raise
+
+        mock_llm_cls.return_value.analyze_behavior = analyze_behavior
+        mock_llm_cls.return_value.close = AsyncMock()
+
+        with patch.object(settings, "FRAUD_ANALYSIS_QUEUE_ENABLED", True):
+            service = FraudService()
+        await service.process_events([(self.user_id, window_event)])
+        await started.wait()
+
+        await service.close()
+
+        self.assertEqual(calls, ["cancelled", "release", "close"])
+        self.assertEqual(service.in_flight.stats()["in_flight"], 0)
+        mock_write.assert_not_called()
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    @patch("app.service.fraud_service.write_fraud_score")
+    async def test_clear_cut_window_skips_llm(
+        self, mock_write, mock_llm_cls, mock_redis_from_url
+    ):
+        """Test rules decide an obvious bot window without the LLM."""
+        self._mock_redis(mock_redis_from_url)
+        mock_llm_cls.return_value.analyze_behavior = AsyncMock()
+        start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        events = [
+            {
+                "event_type": "scroll",
+                "user_agent": "curl/8.0",
+                "timestamp": start + datetime.timedelta(seconds=i * 0.1),
+            }
+            for i in range(10)
+        ]
+
+        with patch.object(settings, "FRAUD_RULES_ENABLED", True):
+            service = FraudService()
+        await service.analyze(WindowBreach(self.user_id, 10, events))
+
+        mock_llm_cls.return_value.analyze_behavior.assert_not_awaited()
+        mock_write.assert_called_once()
+        self.assertEqual(service.rules.stats()["fraud"], 1)
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    async def test_prefilter_capped_to_rule_thresholds(
+        self, _mock_llm_cls, mock_redis_from_url
+    ):
+        """Test users escalate no later than the most sensitive rule breaches."""
+        self._mock_redis(mock_redis_from_url)
+        rules = [
+            {"name": "events", "window_seconds": 120, "threshold": 10},
+            {"name": "failed", "window_seconds": 300, "threshold": 3},
+        ]
+
+        with (
+            patch.object(settings, "FRAUD_WINDOW_RULES", rules),
+            patch.object(settings, "FRAUD_PREFILTER_ENABLED", True),
+            patch.object(settings, "FRAUD_PREFILTER_ESCALATE_AT", 20),
+        ):
+            service = FraudService()
+
+        self.assertEqual(service.prefilter.escalate_at, 3)
+
+    @patch("app.service.fraud_service.redis.from_url")
+    @patch("app.service.fraud_service.LLMProvider")
+    async def test_rules_evaluated_in_one_call(
+        self, _mock_llm_cls, mock_redis_from_url
+    ):
+        """Test every rule of a user is evaluated by a single script call."""
+        login = {"event_type": "login", "success": False, "ip_address": "1.1.1.1"}
+        mock_redis = self._mock_redis(
+            mock_redis_from_url, [[3, 1, 3, 1], [encode_event(login)]]
+        )
+        rules = [
+            {
+                "name": "logins",
+                "window_seconds": 30,
+                "threshold": 5,
+                "event_types": ["login"],
+            },
+            {
+                "name": "failed_logins",
+                "window_seconds": 300,
+                "threshold": 3,
+                "event_types": ["login"],
+                "failed_only": True,
+            },
+            {
+                "name": "ips",
+                "window_seconds": 3600,
+                "threshold": 4,
+                "distinct": "ip_address",
+            },
+        ]
+
+        with patch.object(settings, "FRAUD_WINDOW_RULES", rules):
+            service = FraudService()
+        breaches = await service.check_windows(
+            [
+                ("u1", login, 100.0),
+                ("u1", {**login, "success": True}, 100.0),
+                ("u1", {"event_type": "scroll", "ip_address": "1.1.1.1"}, 100.0),
+            ],
+            100.0,
+        )
+
+        mock_script = mock_redis.register_script.return_value
+        mock_script.assert_awaited_once()
+        call = mock_script.call_args.kwargs
+        self.assertEqual(
+            call["keys"][2:],
+            [
+                "user_rule:{u1}:logins",
+                "user_rule:{u1}:failed_logins",
+                "user_rule:{u1}:ips",
+            ],
+        )
+        args = call["args"]
+        # Log: longest window, no threshold, 3 events
+        self.assertEqual(args[2:6], [3600, 0, 200, 3])
+        # Logins: 2 logins, failed logins: 1, distinct IPs: the same IP 3 times
+        self.assertEqual(args[12:16], [30, 5, 5, 2])
+        self.assertEqual(args[20:24], [300, 3, 3, 1])
+        self.assertEqual(args[26:30], [3600, 4, 4, 3])
+        self.assertEqual(args[31::2], ["1.1.1.1"] * 3)
+
+        self.assertEqual(len(breaches), 1)
+        self.assertEqual(breaches[0].count, 3)
+        self.assertEqual(breaches[0].rules, ("failed_logins",))
+
 
 if __name__ == "__main__":
     unittest.main()
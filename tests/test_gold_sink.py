@@ -0,0 +1,49 @@
+"""Tests for the gold fraud score sink."""
+
+import datetime
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import polars as pl
+from deltalake import DeltaTable
+
+from app.models.fraud import FraudScore
+from app.service.delta_writer import BufferedDeltaWriter
+from app.service.gold_sink import write_fraud_score
+from app.service.partitioning import PartitionScheme
+
+
+class TestGoldSink(unittest.IsolatedAsyncioTestCase):
+    """Test write_fraud_score."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp_dir.cleanup)
+        self.target = f"{tmp_dir.name}/fraud_score"
+
+    async def test_scores_batched_in_one_commit(self):
+        """Test a burst of detections lands in a single date-partitioned commit."""
+        writer = BufferedDeltaWriter(
+            self.target, PartitionScheme("timestamp"), max_rows=100, max_latency=60
+        )
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        with patch("app.service.gold_sink.fraud_score_writer", writer):
+            for i in range(20):
+                await write_fraud_score(
+                    FraudScore(user_id=f"u{i}", timestamp=now, score=0.9, reason="bot")
+                )
+            self.assertEqual(writer.pending_rows, 20)
+            await writer.close()
+
+        self.assertEqual(pl.read_delta(self.target).height, 20)
+        self.assertEqual(DeltaTable(self.target).version(), 0)
+        self.assertEqual(
+            DeltaTable(self.target).metadata().partition_columns, ["event_date"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
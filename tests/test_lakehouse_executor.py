@@ -0,0 +1,43 @@
+"""Tests for lakehouse executor."""
+
+import threading
+import unittest
+
+from app.service.lakehouse_executor import LakehouseExecutor
+
+
+class TestLakehouseExecutor(unittest.IsolatedAsyncioTestCase):
+    """Test LakehouseExecutor."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.executor = LakehouseExecutor(max_workers=1)
+        self.addCleanup(self.executor.shutdown)
+
+    async def test_run_off_event_loop_thread(self):
+        """Test blocking calls run on a writer thread."""
+        thread_name = await self.executor.run(lambda: threading.current_thread().name)
+
+        self.assertNotEqual(thread_name, threading.current_thread().name)
+        self.assertTrue(thread_name.startswith("lakehouse-writer"))
+
+    async def test_run_propagates_errors(self):
+        """Test errors raised by the call reach the awaiting caller."""
+
+        def fail():
+            raise OSError("disk full")
+
+        with self.assertRaises(OSError):
+            await self.executor.run(fail)
+
+    async def test_restart_after_shutdown(self):
+        """Test the pool is recreated after a shutdown."""
+        self.executor.shutdown()
+
+        result = await self.executor.run(sum, [1, 2, 3])
+
+        self.assertEqual(result, 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,10 @@
 """Tests for LLM client."""
 
+import json
 import unittest
 from unittest.mock import patch, MagicMock
 import requests
-from app.llm import OllamaClient
+from app.llm import JsonFieldStream, OllamaClient, ollama_payload
 
 
 class TestOllamaClient(unittest.TestCase):
@@ -57,3 +58,74 @@ class TestOllamaClient(unittest.TestCase):
         # app.llm imports json and catches json.JSONDecodeError
 
         self.assertIsNone(response)
+
+    @patch("app.llm.settings")
+    @patch("app.llm.requests.post")
+    def test_generate_streaming_stops_early(self, mock_post, mock_settings):
+        """Test streaming stops reading once the fields are complete."""
+        mock_settings.OLLAMA_STREAM = True
+        mock_response = MagicMock()
+        mock_response.__enter__.return_value = mock_response
+        lines = [
+            b'{"response": "{\\"fraud_probability\\": 0."}',
+            b'{"response": "7, \\"reason\\": \\"bot\\""}',
+            b'{"response": ", \\"extra\\": 1}"}',
+        ]
+        read = []
+        mock_response.iter_lines.return_value = (
+            read.append(line) or line for line in lines
+        )
+        mock_post.return_value = mock_response
+
+        response = self.client.generate(
+            "test prompt", fields=("fraud_probability", "reason")
+        )
+
+        self.assertEqual(
+            json.loads(response), {"fraud_probability": 0.7, "reason": "bot"}
+        )
+        self.assertEqual(len(read), 2)
+        self.assertTrue(mock_post.call_args.kwargs["json"]["stream"])
+        mock_response.__exit__.assert_called_once()
+
+
+class TestOllamaPayload(unittest.TestCase):
+    """Test ollama_payload."""
+
+    @patch("app.llm.settings")
+    def test_runtime_options(self, mock_settings):
+        """Test configured options are passed and unset ones left out."""
+        mock_settings.OLLAMA_NUM_PREDICT = 64
+        mock_settings.OLLAMA_NUM_CTX = None
+        mock_settings.OLLAMA_TEMPERATURE = 0.0
+        mock_settings.OLLAMA_KEEP_ALIVE = "10m"
+
+        payload = ollama_payload("m", "p", stream=False)
+
+        self.assertEqual(payload["options"], {"num_predict": 64, "temperature": 0.0})
+        self.assertEqual(payload["keep_alive"], "10m")
+        self.assertFalse(payload["stream"])
+
+
+class TestJsonFieldStream(unittest.TestCase):
+    """Test JsonFieldStream."""
+
+    def test_fields_complete_incrementally(self):
+        """Test values are only taken once complete."""
+        parser = JsonFieldStream(("score", "reason"))
+
+        self.assertFalse(parser.feed('{"score": 0.8'))
+        self.assertNotIn("score", parser.values)
+        self.assertFalse(parser.feed(', "reason": "many \\"failed'))
+        self.assertEqual(parser.values, {"score": 0.8})
+        self.assertTrue(parser.feed(' logins\\""'))
+
+        self.assertEqual(parser.values["reason"], 'many "failed logins"')
+        self.assertEqual(json.loads(parser.result())["score"], 0.8)
+
+    def test_incomplete_result_is_raw_text(self):
+        """Test an incomplete stream returns the text generated so far."""
+        parser = JsonFieldStream(("score", "reason"))
+        parser.feed('{"score": 1}')
+
+        self.assertEqual(parser.result(), '{"score": 1}')
@@ -1,9 +1,12 @@
 """Tests for LLM provider."""
 
+import asyncio
+import json
 import unittest
-from unittest.mock import MagicMock, AsyncMock
+from unittest.mock import MagicMock, AsyncMock, patch
 import httpx
 from app.service.llm_provider import LLMProvider, FraudResult
+from app.service.prompt_format import prompt_metrics
 
 
 class TestLLMProvider(unittest.IsolatedAsyncioTestCase):
@@ -63,6 +66,121 @@ class TestLLMProvider(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.score, 0.0)
         self.assertEqual(result.reason, "Response Parsing Error")
 
+    async def test_cached_verdict(self):
+        """Test similar windows reuse the verdict without calling the LLM."""
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            "response": '{"score": 0.9, "reason": "bad"}'
+        }
+        self.provider.client.post = AsyncMock(return_value=mock_response)
+
+        first = await self.provider.analyze_behavior([{"ip_address": "10.0.0.1"}])
+        second = await self.provider.analyze_behavior([{"ip_address": "10.0.0.1"}])
+
+        self.assertEqual(first, second)
+        self.provider.client.post.assert_called_once()
+        self.assertEqual(self.provider.cache.stats()["hits"], 1)
+
+    async def test_concurrent_analyses_coalesce(self):
+        """Test concurrent analyses of the same window share one inference."""
+        release = asyncio.Event()
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            "response": '{"score": 0.9, "reason": "bad"}'
+        }
+
+        async def post(*_args, **_kwargs):
+            await release.wait()
+            return mock_response
+
+        self.provider.client.post = AsyncMock(side_effect=post)
+        analyses = [
+            asyncio.create_task(self.provider.analyze_behavior([{"device_id": "d1"}]))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+
+        results = await asyncio.gather(*analyses)
+
+        self.provider.client.post.assert_called_once()
+        self.assertTrue(all(result.score == 0.9 for result in results))
+
+    async def test_errors_not_cached(self):
+        """Test fail-safe results are not cached."""
+        self.provider.client.post = AsyncMock(
+            side_effect=httpx.RequestError("Connection failed")
+        )
+
+        await self.provider.analyze_behavior([{}])
+        result = await self.provider.analyze_behavior([{}])
+
+        self.assertTrue(result.error)
+        self.assertEqual(self.provider.client.post.call_count, 2)
+
+    @patch("app.service.llm_provider.settings")
+    def test_prompt_formats(self, mock_settings):
+        """Test the compact prompt renders a table and json embeds events."""
+        mock_settings.LLM_PROMPT_MAX_TOKENS = 2000
+        events = [{"event_type": "login", "ip_address": "10.0.0.1"}] * 10
+        prompts_before = prompt_metrics.stats().get("window", {}).get("prompts", 0)
+
+        mock_settings.LLM_PROMPT_FORMAT = "compact"
+        compact = self.provider._build_system_prompt(events)
+        mock_settings.LLM_PROMPT_FORMAT = "json"
+        verbose = self.provider._build_system_prompt(events)
+
+        self.assertIn("event_type,ip_address\ne0,i0", compact)
+        self.assertIn('"ip_address": "10.0.0.1"', verbose)
+        self.assertLess(len(compact), len(verbose))
+        self.assertEqual(
+            prompt_metrics.stats()["window"]["prompts"], prompts_before + 2
+        )
+
+    @patch("app.service.llm_provider.settings")
+    async def test_streaming_stops_at_verdict(self, mock_settings):
+        """Test a streamed generation is closed once the verdict is complete."""
+        mock_settings.OLLAMA_STREAM = True
+        mock_settings.LLM_PROMPT_FORMAT = "compact"
+        mock_settings.LLM_PROMPT_MAX_TOKENS = 2000
+        chunks = ['{"score": 0.', '9, "reason": "bot"', ', "details": "..."}']
+
+        async def aiter_lines():
+            for chunk in chunks:
+                yield json.dumps({"response": chunk, "done": False})
+            raise AssertionError("Read past the verdict")
+
+        mock_response = MagicMock()
+        mock_response.aiter_lines = aiter_lines
+        mock_stream = MagicMock()
+        mock_stream.__aenter__ = AsyncMock(return_value=mock_response)
+        mock_stream.__aexit__ = AsyncMock(return_value=False)
+        self.provider.client.stream = MagicMock(return_value=mock_stream)
+        self.provider.cache = None
+
+        result = await self.provider.analyze_behavior([{"event": 1}])
+
+        self.assertEqual(result.score, 0.9)
+        self.assertEqual(result.reason, "bot")
+        mock_stream.__aexit__.assert_awaited_once()
+        self.assertTrue(self.provider.client.stream.call_args.kwargs["json"]["stream"])
+
+    async def test_open_circuit_fails_fast(self):
+        """Test repeated connection errors stop calls to the backend."""
+        self.provider.client.post = AsyncMock(
+            side_effect=httpx.RequestError("Connection failed")
+        )
+        self.provider.cache = None
+        threshold = self.provider.breaker.failure_threshold
+
+        for i in range(threshold + 2):
+            result = await self.provider.analyze_behavior([{"event": i}])
+
+        self.assertTrue(result.error)
+        self.assertEqual(result.reason, "LLM Unavailable")
+        self.assertEqual(self.provider.client.post.await_count, threshold)
+        self.assertEqual(self.provider.breaker.stats()["state"], "open")
+
     async def test_close(self):
         """Test close."""
         self.provider.client.aclose = AsyncMock()
@@ -0,0 +1,84 @@
+"""Tests for logging configuration."""
+
+import io
+import json
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+from loguru import logger
+
+from app.log_config import EVENT, configure_logging, sampled
+
+
+class TestLogConfig(unittest.TestCase):
+    """Test logging configuration and sampling."""
+
+    def setUp(self):
+        """Capture log records in memory."""
+        self.sink = io.StringIO()
+        self.handler_id = logger.add(self.sink, format="{message}")
+        self.addCleanup(logger.remove, self.handler_id)
+
+    @patch("app.log_config.settings")
+    def test_sampled_out_records_are_not_formatted(self, mock_settings):
+        """Test dropped records neither log nor evaluate lazy arguments."""
+        mock_settings.LOG_SAMPLE_RATES = {EVENT: 0.0}
+        expensive = MagicMock(return_value="payload")
+
+        sampled(EVENT).opt(lazy=True).info("Received {}", expensive)
+
+        expensive.assert_not_called()
+        self.assertEqual(self.sink.getvalue(), "")
+
+    @patch("app.log_config.settings")
+    def test_unsampled_categories_are_kept(self, mock_settings):
+        """Test categories without a rate log every record."""
+        mock_settings.LOG_SAMPLE_RATES = {EVENT: 0.0}
+
+        sampled("other").info("Received {}", "payload")
+
+        self.assertEqual(self.sink.getvalue(), "Received payload\n")
+
+    @patch("app.log_config.random.random")
+    @patch("app.log_config.settings")
+    def test_partial_sampling(self, mock_settings, mock_random):
+        """Test a rate keeps the matching fraction of records."""
+        mock_settings.LOG_SAMPLE_RATES = {EVENT: 0.5}
+        mock_random.side_effect = [0.2, 0.7]
+
+        sampled(EVENT).info("kept")
+        sampled(EVENT).info("dropped")
+
+        self.assertEqual(self.sink.getvalue(), "kept\n")
+
+
+class TestConfigureLogging(unittest.TestCase):
+    """Test configure_logging."""
+
+    def setUp(self):
+        """Restore a default sink once the test replaced them."""
+        self.addCleanup(logger.add, sys.stderr)
+        self.addCleanup(logger.remove)
+
+    @patch("app.log_config.settings")
+    def test_json_output(self, mock_settings):
+        """Test JSON mode serializes records with their category."""
+        mock_settings.LOG_LEVEL = "INFO"
+        mock_settings.LOG_JSON = True
+        mock_settings.LOG_ENQUEUE = False
+        mock_settings.LOG_SAMPLE_RATES = {}
+        sink = io.StringIO()
+
+        configure_logging(sink)
+        sampled(EVENT).info("Received {}", "payload")
+        sampled(EVENT).debug("Below the configured level")
+
+        (line,) = sink.getvalue().splitlines()
+        record = json.loads(line)["record"]
+        self.assertEqual(record["message"], "Received payload")
+        self.assertEqual(record["extra"]["category"], EVENT)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,10 @@
 """Tests for main application."""
 
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
 from fastapi.testclient import TestClient
-from app.main import app
+from app.main import app, stop_app
 
 client = TestClient(app)
 
@@ -11,3 +14,47 @@ def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "healthy"}
+
+
+def test_metrics():
+    """Test metrics endpoint exposes the pipeline queue depths."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.json()["queues"]["lakehouse"]["depth"] == 0
+    assert set(response.json()["queues"]) == {"lakehouse", "fraud"}
+
+
+def test_stop_app_commits_before_closing_consumers():
+    """Test writers are flushed while the paused consumers are still open."""
+    calls = MagicMock()
+    kafka_consumer = MagicMock()
+    gate = MagicMock()
+    stop_broker, drain_stages, close_writers = AsyncMock(), AsyncMock(), AsyncMock()
+    calls.attach_mock(gate.close, "close_gate")
+    calls.attach_mock(kafka_consumer.pause, "pause")
+    calls.attach_mock(drain_stages, "drain_stages")
+    calls.attach_mock(close_writers, "close_writers")
+    calls.attach_mock(stop_broker, "stop_broker")
+    subscriber = MagicMock()
+    subscriber.consumer.consumer = kafka_consumer
+    broker = MagicMock(subscribers=[subscriber], stop=stop_broker)
+
+    with (
+        patch("app.main.broker", broker),
+        patch("app.main.partition_gate", gate),
+        patch("app.main.maintenance.stop", new=AsyncMock()),
+        patch("app.main.shutdown_pipeline_stages", new=drain_stages),
+        patch("app.main.shutdown_bronze_writers", new=close_writers),
+        patch("app.main.shutdown_fraud_service", new=AsyncMock()),
+        patch("app.main.lakehouse_executor"),
+    ):
+        asyncio.run(stop_app())
+
+    names = [name for name, _, _ in calls.mock_calls]
+    assert names == [
+        "close_gate",
+        "pause",
+        "drain_stages",
+        "close_writers",
+        "stop_broker",
+    ]
@@ -0,0 +1,106 @@
+"""Tests for lakehouse maintenance."""
+
+import datetime
+import glob
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import polars as pl
+from deltalake import DeltaTable
+
+from app.maintenance import LakehouseMaintenance
+from app.service.partitioning import PartitionScheme
+
+
+class TestLakehouseMaintenance(unittest.TestCase):
+    """Test LakehouseMaintenance."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = f"{tmp_dir.name}/login"
+        self.maintenance = LakehouseMaintenance((self.path,), retention_hours=0)
+
+    def _append(self, day: datetime.date, count: int):
+        """Append count single-row commits to the table."""
+        for i in range(count):
+            pl.DataFrame({"user_id": [f"u{i}"], "event_date": [day]}).write_delta(
+                self.path,
+                mode="append",
+                delta_write_options={"partition_by": ["event_date"]},
+            )
+
+    @patch("app.maintenance.partition_scheme")
+    def test_compacts_closed_partitions_only(self, mock_scheme):
+        """Test closed partitions are compacted and today's is left alone."""
+        mock_scheme.return_value = PartitionScheme("timestamp")
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        self._append(today - datetime.timedelta(days=1), 3)
+        self._append(today, 2)
+
+        metrics = self.maintenance.maintain_table(self.path)
+
+        self.assertEqual(metrics["numFilesRemoved"], 3)
+        self.assertEqual(metrics["numFilesAdded"], 1)
+        # One compacted file for yesterday, today's two files are untouched
+        self.assertEqual(len(DeltaTable(self.path).file_uris()), 3)
+        self.assertEqual(pl.read_delta(self.path).height, 5)
+
+    @patch("app.maintenance.partition_scheme")
+    def test_z_order_by_user_id(self, mock_scheme):
+        """Test Z-ordering compacts non time-partitioned tables."""
+        mock_scheme.return_value = PartitionScheme()
+        self.maintenance.z_order_by_user_id = True
+        self._append(datetime.date(2023, 1, 1), 4)
+
+        metrics = self.maintenance.maintain_table(self.path)
+
+        self.assertEqual(metrics["numFilesRemoved"], 4)
+        self.assertEqual(pl.read_delta(self.path).height, 4)
+
+    def _parquet_files(self) -> int:
+        """Number of data files on disk, referenced or not."""
+        return len(glob.glob(f"{self.path}/event_date=*/*.parquet"))
+
+    @patch("app.maintenance.partition_scheme")
+    def test_short_retention_rejected(self, mock_scheme):
+        """Test vacuum is skipped when shorter than the table's retention."""
+        mock_scheme.return_value = PartitionScheme()
+        self._append(datetime.date(2023, 1, 1), 3)
+
+        self.maintenance.maintain_table(self.path)
+
+        # The compacted files are still on disk
+        self.assertEqual(self._parquet_files(), 4)
+
+    @patch("app.maintenance.partition_scheme")
+    def test_short_retention_allowed(self, mock_scheme):
+        """Test an explicit opt-in vacuums with a short retention."""
+        mock_scheme.return_value = PartitionScheme()
+        self.maintenance.allow_short_retention = True
+        self._append(datetime.date(2023, 1, 1), 3)
+
+        self.maintenance.maintain_table(self.path)
+
+        self.assertEqual(self._parquet_files(), 1)
+        self.assertEqual(pl.read_delta(self.path).height, 3)
+
+    def test_missing_table_is_skipped(self):
+        """Test tables that do not exist yet are skipped."""
+        self.assertIsNone(self.maintenance.maintain_table(f"{self.path}_missing"))
+
+    def test_run_once_continues_on_error(self):
+        """Test a failing table does not stop maintenance of the others."""
+        with patch.object(
+            self.maintenance, "maintain_table", side_effect=OSError("boom")
+        ) as mock_maintain:
+            self.maintenance.tables = ("a", "b")
+            self.maintenance.run_once()
+
+        self.assertEqual(mock_maintain.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Tests for Kafka offset tracking."""
+
+import unittest
+from unittest.mock import MagicMock
+
+from app.service.offsets import PendingOffsets
+
+
+def _record(topic: str, partition: int, offset: int) -> MagicMock:
+    """Build a raw confluent message."""
+    record = MagicMock()
+    record.topic.return_value = topic
+    record.partition.return_value = partition
+    record.offset.return_value = offset
+    return record
+
+
+class TestPendingOffsets(unittest.IsolatedAsyncioTestCase):
+    """Test PendingOffsets."""
+
+    def test_from_single_message(self):
+        """Test the offset of a single message is tracked."""
+        message = MagicMock(raw_message=_record("login", 0, 5))
+
+        pending = PendingOffsets.from_message(message)
+
+        self.assertEqual(pending.offsets, {("login", 0): 5})
+        self.assertIs(pending.consumer, message.consumer)
+
+    def test_from_batch_message(self):
+        """Test the highest offset per partition of a batch is tracked."""
+        message = MagicMock(
+            raw_message=(
+                _record("login", 0, 5),
+                _record("login", 0, 7),
+                _record("login", 1, 2),
+            )
+        )
+
+        pending = PendingOffsets.from_message(message)
+
+        self.assertEqual(pending.offsets, {("login", 0): 7, ("login", 1): 2})
+
+    def test_merge(self):
+        """Test merging keeps the highest offset per partition."""
+        first = PendingOffsets()
+        first.update(("login", 0), 9)
+        second = PendingOffsets()
+        second.update(("login", 0), 3)
+        second.update(("buy", 0), 1)
+
+        first.merge(second)
+
+        self.assertEqual(first.offsets, {("login", 0): 9, ("buy", 0): 1})
+
+    async def test_commit_next_offsets(self):
+        """Test the offsets following the consumed ones are committed."""
+        pending = PendingOffsets.from_message(
+            MagicMock(raw_message=_record("login", 2, 10))
+        )
+
+        await pending.commit()
+
+        commit = pending.consumer.consumer.commit
+        commit.assert_called_once()
+        (partition,) = commit.call_args.kwargs["offsets"]
+        self.assertEqual(
+            (partition.topic, partition.partition, partition.offset), ("login", 2, 11)
+        )
+        self.assertFalse(commit.call_args.kwargs["asynchronous"])
+
+    async def test_commit_without_consumer(self):
+        """Test nothing is committed for messages built outside a consumer."""
+        pending = PendingOffsets()
+        pending.update(("login", 0), 1)
+
+        await pending.commit()
+
+
+if __name__ == "__main__":
+    unittest.main()
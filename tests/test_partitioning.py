@@ -0,0 +1,109 @@
+"""Tests for lakehouse partitioning."""
+
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import polars as pl
+
+from app.constants import LAKEHOUSE_BRONZE_ARTICLE, LAKEHOUSE_BRONZE_LOGIN
+from app.service.delta_writer import BufferedDeltaWriter
+from app.service.partitioning import (
+    PartitionGranularity,
+    PartitionScheme,
+    partition_scheme,
+)
+
+
+class TestPartitionScheme(unittest.TestCase):
+    """Test PartitionScheme."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.df = pl.DataFrame(
+            {
+                "user_id": ["u1", "u2"],
+                "timestamp": [
+                    datetime.datetime(2023, 1, 1, 10, 15, 30, 123456),
+                    datetime.datetime(2023, 1, 1, 11, 0, 0, 1),
+                ],
+            }
+        )
+
+    def test_daily_partitions(self):
+        """Test daily schemes derive an event_date column."""
+        scheme = PartitionScheme("timestamp")
+
+        df = scheme.apply(self.df)
+
+        self.assertEqual(scheme.partition_by, ["event_date"])
+        self.assertEqual(
+            df["event_date"].unique().to_list(), [datetime.date(2023, 1, 1)]
+        )
+
+    def test_hourly_partitions(self):
+        """Test hourly schemes derive event_date and event_hour columns."""
+        scheme = PartitionScheme("timestamp", PartitionGranularity.HOUR)
+
+        df = scheme.apply(self.df)
+
+        self.assertEqual(scheme.partition_by, ["event_date", "event_hour"])
+        self.assertEqual(df["event_hour"].to_list(), [10, 11])
+
+    def test_column_partitions(self):
+        """Test schemes without time partitions leave rows untouched."""
+        scheme = PartitionScheme(
+            granularity=PartitionGranularity.NONE, columns=("user_id",)
+        )
+
+        self.assertEqual(scheme.partition_by, ["user_id"])
+        self.assertEqual(scheme.apply(self.df).columns, self.df.columns)
+
+    def test_defaults(self):
+        """Test default schemes of the bronze tables."""
+        self.assertEqual(
+            partition_scheme(LAKEHOUSE_BRONZE_LOGIN).partition_by, ["event_date"]
+        )
+        self.assertEqual(
+            partition_scheme(LAKEHOUSE_BRONZE_ARTICLE).partition_by, ["category"]
+        )
+
+    @patch("app.service.partitioning.settings")
+    def test_settings_overrides(self, mock_settings):
+        """Test per-table overrides from settings."""
+        mock_settings.LAKEHOUSE_PARTITION_GRANULARITY = {LAKEHOUSE_BRONZE_LOGIN: "hour"}
+        mock_settings.LAKEHOUSE_PARTITION_COLUMNS = {
+            LAKEHOUSE_BRONZE_LOGIN: ["success"]
+        }
+
+        scheme = partition_scheme(LAKEHOUSE_BRONZE_LOGIN)
+
+        self.assertEqual(scheme.partition_by, ["event_date", "event_hour", "success"])
+
+
+class TestPartitionedWrites(unittest.IsolatedAsyncioTestCase):
+    """Test partitioned Delta writes."""
+
+    async def test_one_partition_per_day(self):
+        """Test events of the same day share a partition directory."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            target = f"{tmp_dir}/login"
+            writer = BufferedDeltaWriter(target, PartitionScheme("timestamp"))
+
+            await writer.write(
+                [
+                    {"user_id": f"u{i}", "timestamp": datetime.datetime(2023, 1, 1, i)}
+                    for i in range(10)
+                ]
+            )
+            await writer.close()
+
+            partitions = [p for p in os.listdir(target) if p != "_delta_log"]
+            self.assertEqual(partitions, ["event_date=2023-01-01"])
+            self.assertEqual(pl.read_delta(target).height, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
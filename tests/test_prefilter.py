@@ -0,0 +1,60 @@
+"""Tests for the in-process window pre-filter."""
+
+import unittest
+
+from app.service.prefilter import WindowPrefilter
+
+
+class TestWindowPrefilter(unittest.TestCase):
+    """Test WindowPrefilter."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.prefilter = WindowPrefilter(120, escalate_at=3, max_users=2)
+
+    def test_cold_users_stay_local(self):
+        """Test users below the escalation count are not sent to Redis."""
+        escalated = self.prefilter.admit([("u1", {}), ("u2", {}), ("u1", {})], 0.0)
+
+        self.assertEqual(escalated, [])
+
+    def test_escalation_releases_backlog(self):
+        """Test the backlog is released, then later events pass through."""
+        self.prefilter.admit([("u1", {"n": 0}), ("u1", {"n": 1})], 0.0)
+
+        escalated = self.prefilter.admit([("u1", {"n": 2})], 10.0)
+        self.assertEqual(
+            escalated,
+            [("u1", {"n": 0}, 0.0), ("u1", {"n": 1}, 0.0), ("u1", {"n": 2}, 10.0)],
+        )
+
+        self.assertEqual(
+            self.prefilter.admit([("u1", {"n": 3})], 11.0), [("u1", {"n": 3}, 11.0)]
+        )
+
+    def test_events_leave_the_window(self):
+        """Test events older than the window no longer count."""
+        self.prefilter.admit([("u1", {})], 0.0)
+
+        self.assertEqual(self.prefilter.admit([("u1", {})], 100.0), [])
+        self.assertEqual(self.prefilter.admit([("u1", {})], 130.0), [])
+        self.assertEqual(len(self.prefilter.admit([("u1", {})], 140.0)), 3)
+
+    def test_quiet_escalated_user_goes_cold(self):
+        """Test an escalated user is local again after a quiet window."""
+        self.prefilter.admit([("u1", {})] * 3, 0.0)
+
+        self.assertEqual(self.prefilter.admit([("u1", {})], 200.0), [])
+
+    def test_bounded_users(self):
+        """Test the least recently seen user is evicted."""
+        self.prefilter.admit([("u1", {}), ("u2", {}), ("u1", {}), ("u3", {})], 0.0)
+
+        self.assertEqual(len(self.prefilter), 2)
+        # u2 was evicted, u1 kept its two events
+        self.assertEqual(len(self.prefilter.admit([("u1", {})], 1.0)), 3)
+        self.assertEqual(self.prefilter.admit([("u2", {}), ("u2", {})], 1.0), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests for compact prompt rendering."""
+
+import datetime
+import json
+import unittest
+
+from app.service.prompt_format import PromptMetrics, estimate_tokens, format_events
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+
+def _events(count: int) -> list[dict]:
+    """Scroll events of one device, one every two seconds."""
+    return [
+        {
+            "timestamp": START + datetime.timedelta(seconds=2 * i),
+            "event_type": "scroll",
+            "ip_address": "192.168.1.20",
+            "user_agent": USER_AGENT,
+            "percentage": 0.5,
+        }
+        for i in range(count)
+    ]
+
+
+class TestFormatEvents(unittest.TestCase):
+    """Test format_events."""
+
+    def test_repeated_values_in_legend(self):
+        """Test repeated strings are listed once and referenced in rows."""
+        text, omitted = format_events(_events(3), max_tokens=1000)
+
+        self.assertEqual(omitted, 0)
+        self.assertEqual(text.count(USER_AGENT), 1)
+        self.assertIn("events: 3 over 4s (scroll 3)", text)
+        self.assertIn("t,event_type,ip_address,user_agent,percentage", text)
+        self.assertIn("4,e0,i0,u0,0.5", text)
+
+    def test_smaller_than_json(self):
+        """Test the compact rendering is a fraction of the JSON one."""
+        events = _events(50)
+        text, _ = format_events(events, max_tokens=10_000)
+
+        self.assertLess(len(text) * 4, len(json.dumps(events, indent=2, default=str)))
+
+    def test_budget_leaves_oldest_out(self):
+        """Test the oldest events are left out to fit the budget."""
+        text, omitted = format_events(_events(200), max_tokens=300)
+
+        self.assertLessEqual(estimate_tokens(text), 300)
+        self.assertGreater(omitted, 0)
+        # Stats still cover the whole window, the table the latest events
+        self.assertIn("events: 200 over 398s", text)
+        self.assertIn(f"{omitted} oldest events omitted", text)
+        self.assertIn(
+            f"from {(START + datetime.timedelta(seconds=2 * omitted)).isoformat()}",
+            text,
+        )
+
+    def test_excluded_columns(self):
+        """Test excluded columns are not rendered."""
+        events = [
+            {"user_id": "u1", "order_id": "o1"},
+            {"user_id": "u1", "order_id": "o2"},
+        ]
+
+        text, _ = format_events(events, max_tokens=1000, exclude=("user_id",))
+
+        self.assertNotIn("u1", text)
+        self.assertIn("o2", text)
+
+
+class TestPromptMetrics(unittest.TestCase):
+    """Test PromptMetrics."""
+
+    def test_stats(self):
+        """Test sizes and latencies are averaged per kind."""
+        metrics = PromptMetrics()
+        metrics.record_prompt("window", "x" * 40, omitted=2)
+        metrics.record_prompt("window", "x" * 80)
+        metrics.record_inference("window", 1.5)
+
+        stats = metrics.stats()["window"]
+
+        self.assertEqual(stats["prompts"], 2)
+        self.assertEqual(stats["avg_prompt_tokens"], 15)
+        self.assertEqual(stats["max_prompt_tokens"], 20)
+        self.assertEqual(stats["omitted_events"], 2)
+        self.assertEqual(stats["avg_inference_seconds"], 1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Tests for the placement of fraud state across Redis nodes."""
+
+import unittest
+from collections import Counter
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.constants import settings
+from app.service.redis_shards import RedisShards, connect_shards, hash_tag
+
+
+class TestRedisShards(unittest.IsolatedAsyncioTestCase):
+    """Test RedisShards."""
+
+    def test_hash_tag(self):
+        """Test the tag wraps the user id in braces."""
+        self.assertEqual(f"user_events:{hash_tag('u1')}", "user_events:{u1}")
+
+    def test_requires_client(self):
+        """Test shards need at least one client."""
+        with self.assertRaises(ValueError):
+            RedisShards([])
+
+    def test_single_client(self):
+        """Test every user goes to the only client."""
+        shards = RedisShards(["a"])
+
+        self.assertEqual(shards.client_for("u1"), "a")
+        self.assertEqual(shards.group(["u1", "u2"]), {0: ["u1", "u2"]})
+
+    def test_distribution(self):
+        """Test users spread over every shard."""
+        shards = RedisShards(["a", "b", "c", "d"])
+        counts = Counter(shards.shard_of(f"u{i}") for i in range(4000))
+
+        self.assertEqual(set(counts), {0, 1, 2, 3})
+        self.assertGreater(min(counts.values()), 500)
+
+    def test_adding_shard_moves_few_users(self):
+        """Test a new shard only takes users over from the existing ones."""
+        before = RedisShards(["a", "b", "c"])
+        after = RedisShards(["a", "b", "c", "d"])
+        users = [f"u{i}" for i in range(4000)]
+
+        moved = [
+            user for user in users if before.shard_of(user) != after.shard_of(user)
+        ]
+
+        self.assertTrue(all(after.shard_of(user) == 3 for user in moved))
+        self.assertLess(len(moved), len(users) / 2)
+
+    def test_group(self):
+        """Test users are grouped by their shard, in order."""
+        shards = RedisShards(["a", "b"])
+        users = [f"u{i}" for i in range(20)]
+
+        groups = shards.group(users)
+
+        self.assertEqual(sorted(sum(groups.values(), [])), sorted(users))
+        for shard, members in groups.items():
+            self.assertTrue(all(shards.shard_of(user) == shard for user in members))
+            self.assertEqual(members, [user for user in users if user in members])
+
+    async def test_close(self):
+        """Test every client is closed."""
+        clients = [MagicMock(aclose=AsyncMock()), MagicMock(aclose=AsyncMock())]
+
+        await RedisShards(clients).close()
+
+        for client in clients:
+            client.aclose.assert_awaited_once()
+
+
+class TestConnectShards(unittest.TestCase):
+    """Test connect_shards."""
+
+    @patch("app.service.redis_shards.redis.from_url")
+    def test_default_single_node(self, mock_from_url):
+        """Test the single node of REDIS_URL is used by default."""
+        with patch.object(settings, "REDIS_SHARD_URLS", []):
+            shards = connect_shards()
+
+        mock_from_url.assert_called_once_with(settings.REDIS_URL)
+        self.assertEqual(shards.clients, [mock_from_url.return_value])
+
+    @patch("app.service.redis_shards.redis.from_url")
+    def test_shard_urls(self, mock_from_url):
+        """Test a client is created per shard URL."""
+        urls = ["redis://a:6379", "redis://b:6379"]
+        with patch.object(settings, "REDIS_SHARD_URLS", urls):
+            shards = connect_shards()
+
+        self.assertEqual([call.args[0] for call in mock_from_url.call_args_list], urls)
+        self.assertEqual(len(shards.clients), 2)
+
+    @patch("app.service.redis_shards.redis.RedisCluster.from_url")
+    def test_cluster(self, mock_cluster_from_url):
+        """Test a cluster client is created when the cluster is enabled."""
+        with patch.object(settings, "REDIS_CLUSTER_ENABLED", True):
+            shards = connect_shards("redis://cluster:6379")
+
+        mock_cluster_from_url.assert_called_once_with("redis://cluster:6379")
+        self.assertEqual(shards.clients, [mock_cluster_from_url.return_value])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+"""Tests for adaptive limiting and circuit breaking."""
+
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from app.service.resilience import (
+    AdaptiveLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    OverloadedError,
+)
+
+
+class TestAdaptiveLimiter(unittest.IsolatedAsyncioTestCase):
+    """Test AdaptiveLimiter."""
+
+    async def test_limit_grows_while_fast(self):
+        """Test fast calls raise the limit up to the maximum."""
+        limiter = AdaptiveLimiter(initial=2, min_limit=1, max_limit=3, target_latency=1)
+
+        for _ in range(10):
+            async with limiter.slot():
+                pass
+
+        self.assertEqual(limiter.stats()["limit"], 3)
+
+    @patch("app.service.resilience.time.monotonic")
+    async def test_limit_backs_off_once_per_round(self, mock_monotonic):
+        """Test slow calls started before a decrease do not decrease again."""
+        mock_monotonic.return_value = 100.0
+        limiter = AdaptiveLimiter(
+            initial=8, min_limit=1, max_limit=10, target_latency=1
+        )
+        slow = [limiter.slot() for _ in range(2)]
+        for slot in slow:
+            await slot.__aenter__()
+
+        mock_monotonic.return_value = 105.0
+        for slot in slow:
+            await slot.__aexit__(None, None, None)
+
+        self.assertEqual(limiter.stats()["limit"], 4)
+        self.assertEqual(limiter.stats()["in_flight"], 0)
+
+    async def test_failure_backs_off(self):
+        """Test a failed call cuts the limit."""
+        limiter = AdaptiveLimiter(
+            initial=4, min_limit=1, max_limit=10, target_latency=1
+        )
+
+        with self.assertRaises(RuntimeError):
+            async with limiter.slot():
+                raise RuntimeError("boom")
+
+        self.assertEqual(limiter.stats()["limit"], 2)
+
+    async def test_calls_wait_for_a_slot(self):
+        """Test calls beyond the limit wait for a slot to free up."""
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1, target_latency=1)
+        release = asyncio.Event()
+
+        async def call():
+            async with limiter.slot():
+                await release.wait()
+
+        tasks = [asyncio.create_task(call()) for _ in range(2)]
+        await asyncio.sleep(0)
+        self.assertEqual(limiter.stats()["in_flight"], 1)
+        self.assertEqual(limiter.stats()["waiting"], 1)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(limiter.stats()["in_flight"], 0)
+
+    async def test_waiting_call_shed_after_timeout(self):
+        """Test a call waiting too long for a slot fails fast and is counted."""
+        limiter = AdaptiveLimiter(
+            initial=1, min_limit=1, max_limit=1, target_latency=1, acquire_timeout=0.01
+        )
+        release = asyncio.Event()
+
+        async def call():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(call())
+        await asyncio.sleep(0)
+        with self.assertRaises(OverloadedError):
+            async with limiter.slot():
+                pass
+
+        self.assertEqual(limiter.stats()["shed"], 1)
+        self.assertEqual(limiter.stats()["waiting"], 0)
+        self.assertEqual(limiter.stats()["limit"], 1)
+        release.set()
+        await holder
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test CircuitBreaker."""
+
+    def _fail(self, breaker: CircuitBreaker):
+        """Run a failing call through the breaker."""
+        with self.assertRaises(RuntimeError), breaker.guard():
+            raise RuntimeError("down")
+
+    @patch("app.service.resilience.time.monotonic")
+    def test_opens_and_recovers(self, mock_monotonic):
+        """Test the circuit opens, probes once, and closes on success."""
+        mock_monotonic.return_value = 100.0
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        self._fail(breaker)
+        self.assertEqual(breaker.state, "closed")
+        self._fail(breaker)
+        self.assertEqual(breaker.state, "open")
+
+        with self.assertRaises(CircuitOpenError), breaker.guard():
+            pass
+
+        mock_monotonic.return_value = 131.0
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow())
+        # A single probe at a time
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.stats()["rejected"], 2)
+
+    @patch("app.service.resilience.time.monotonic")
+    def test_failed_probe_reopens(self, mock_monotonic):
+        """Test a failed probe opens the circuit for another timeout."""
+        mock_monotonic.return_value = 100.0
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        self._fail(breaker)
+
+        mock_monotonic.return_value = 131.0
+        self._fail(breaker)
+
+        self.assertEqual(breaker.state, "open")
+        mock_monotonic.return_value = 162.0
+        self.assertEqual(breaker.state, "half_open")
+
+    def test_cancelled_probe_released(self):
+        """Test a cancelled call gives the probe back without a failure."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self._fail(breaker)
+
+        with self.assertRaises(asyncio.CancelledError), breaker.guard():
+            raise asyncio.CancelledError()
+
+        self.assertEqual(breaker.failures, 1)
+        self.assertTrue(breaker.allow())
+
+    def test_shed_call_not_a_failure(self):
+        """Test a call shed by the limiter does not count against the backend."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+
+        with self.assertRaises(OverloadedError):
+            with breaker.guard():
+                raise OverloadedError("busy")
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+if __name__ == "__main__":
+    unittest.main()
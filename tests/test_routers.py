@@ -2,11 +2,18 @@
 
 import unittest
 from unittest.mock import patch, MagicMock, AsyncMock
+
+from faststream.confluent import KafkaBroker, TestKafkaBroker
+
+from app.constants import TOPIC_LOGIN
 from app.models.fraud import User, Login, Buy
 from app.service.routers import (
+    _build_router,
     handle_user_event,
     handle_login_event,
     handle_buy_event,
+    handle_login_batch,
+    shutdown_bronze_writers,
 )
 
 
@@ -33,31 +40,33 @@ class TestRouters(unittest.IsolatedAsyncioTestCase):
         }
         # Add other necessary data fixtures
 
-    @patch("app.service.routers.pl.DataFrame")
+    @patch("app.service.routers.bronze_writers")
     @patch("app.service.routers.fraud_service")
-    async def test_handle_user_event(self, mock_fraud_service, mock_df_cls):
+    async def test_handle_user_event(self, mock_fraud_service, mock_writers):
         """Test handle_user_event."""
-        mock_df = MagicMock()
-        mock_df_cls.return_value = mock_df
+        mock_writer = MagicMock()
+        mock_writer.write = AsyncMock()
+        mock_writers.__getitem__.return_value = mock_writer
 
         event = User(**self.user_data)
         await handle_user_event(event)
 
-        # Check DataFrame creation and write
-        mock_df_cls.assert_called_once()
-        mock_df.write_delta.assert_called_once()
+        # Check row buffered for the user table
+        mock_writers.__getitem__.assert_called_once_with("user")
+        mock_writer.write.assert_called_once_with([event.model_dump()], None)
 
         # Ensure fraud service is NOT called
-        mock_fraud_service.process_event.assert_not_called()
+        mock_fraud_service.process_events.assert_not_called()
 
-    @patch("app.service.routers.pl.DataFrame")
+    @patch("app.service.routers.bronze_writers")
     @patch("app.service.routers.fraud_service")
-    async def test_handle_login_event(self, mock_fraud_service, mock_df_cls):
+    async def test_handle_login_event(self, mock_fraud_service, mock_writers):
         """Test handle_login_event."""
-        mock_df = MagicMock()
-        mock_df_cls.return_value = mock_df
-        # Ensure process_event is awaitable
-        mock_fraud_service.process_event = AsyncMock()
+        mock_writer = MagicMock()
+        mock_writer.write = AsyncMock()
+        mock_writers.__getitem__.return_value = mock_writer
+        # Ensure process_events is awaitable
+        mock_fraud_service.process_events = AsyncMock()
 
         event = Login(
             user_id="u1",
@@ -69,22 +78,23 @@ class TestRouters(unittest.IsolatedAsyncioTestCase):
         )
         await handle_login_event(event)
 
-        # Check DataFrame creation and write
-        mock_df.write_delta.assert_called_once()
+        # Check row buffered for the login table
+        mock_writer.write.assert_called_once_with([event.model_dump()], None)
 
         # Ensure fraud service IS called
-        mock_fraud_service.process_event.assert_called_once_with(
-            event.user_id, event.model_dump()
+        mock_fraud_service.process_events.assert_called_once_with(
+            [(event.user_id, event.model_dump())]
         )
 
-    @patch("app.service.routers.pl.DataFrame")
+    @patch("app.service.routers.bronze_writers")
     @patch("app.service.routers.fraud_service")
-    async def test_handle_buy_event(self, mock_fraud_service, mock_df_cls):
+    async def test_handle_buy_event(self, mock_fraud_service, mock_writers):
         """Test handle_buy_event."""
-        mock_df = MagicMock()
-        mock_df_cls.return_value = mock_df
-        # Ensure process_event is awaitable
-        mock_fraud_service.process_event = AsyncMock()
+        mock_writer = MagicMock()
+        mock_writer.write = AsyncMock()
+        mock_writers.__getitem__.return_value = mock_writer
+        # Ensure process_events is awaitable
+        mock_fraud_service.process_events = AsyncMock()
 
         event = Buy(
             user_id="u1",
@@ -100,10 +110,190 @@ class TestRouters(unittest.IsolatedAsyncioTestCase):
         )
         await handle_buy_event(event)
 
-        mock_df.write_delta.assert_called_once()
-        mock_fraud_service.process_event.assert_called_once_with(
-            event.user_id, event.model_dump()
+        mock_writer.write.assert_called_once_with([event.model_dump()], None)
+        mock_fraud_service.process_events.assert_called_once_with(
+            [(event.user_id, event.model_dump())]
+        )
+
+    @patch("app.service.routers.bronze_writers")
+    @patch("app.service.routers.fraud_service")
+    async def test_handle_login_batch(self, mock_fraud_service, mock_writers):
+        """Test handle_login_batch writes the batch at once."""
+        mock_writer = MagicMock()
+        mock_writer.write = AsyncMock()
+        mock_writers.__getitem__.return_value = mock_writer
+        mock_fraud_service.process_events = AsyncMock()
+
+        events = [
+            Login(
+                user_id=f"u{i}",
+                timestamp="2023-01-01T00:00:00",
+                ip_address="127.0.0.1",
+                device_id="d1",
+                success=True,
+            )
+            for i in range(3)
+        ]
+        await handle_login_batch([e.model_dump_json().encode() for e in events])
+
+        mock_writer.write.assert_called_once_with(
+            [e.model_dump() for e in events], None
+        )
+        # The whole batch is checked at once
+        mock_fraud_service.process_events.assert_called_once_with(
+            [(e.user_id, e.model_dump()) for e in events]
+        )
+
+    @patch("app.service.routers.fraud_stage")
+    @patch("app.service.routers.lakehouse_stage")
+    @patch("app.service.routers.settings")
+    async def test_handle_login_event_queued(
+        self, mock_settings, mock_lakehouse_stage, mock_fraud_stage
+    ):
+        """Test events go through the stage queues when enabled."""
+        mock_settings.PIPELINE_QUEUES_ENABLED = True
+        mock_settings.KAFKA_COMMIT_AFTER_FLUSH = False
+        mock_lakehouse_stage.put = AsyncMock()
+        mock_fraud_stage.put = AsyncMock()
+
+        event = Login(
+            user_id="u1",
+            timestamp="2023-01-01T00:00:00",
+            ip_address="127.0.0.1",
+            device_id="d1",
+            success=True,
+        )
+        await handle_login_event(event)
+
+        row = event.model_dump()
+        mock_lakehouse_stage.put.assert_called_once_with(
+            ("login", [row], None), 1, None
         )
+        mock_fraud_stage.put.assert_called_once_with([row], 1, None)
+
+    @patch("app.service.routers.settings")
+    @patch("app.service.routers.bronze_writers")
+    @patch("app.service.routers.fraud_service")
+    async def test_batch_mode_router(
+        self, mock_fraud_service, mock_writers, mock_settings
+    ):
+        """Test batch mode delivers a list of validated messages per poll."""
+        mock_settings.KAFKA_BATCH_ENABLED = True
+        mock_settings.KAFKA_FAST_DECODE_ENABLED = False
+        mock_settings.KAFKA_COMMIT_AFTER_FLUSH = False
+        mock_settings.PIPELINE_QUEUES_ENABLED = False
+        mock_settings.KAFKA_BATCH_MAX_RECORDS = 100
+        mock_settings.KAFKA_BATCH_MAX_WAIT_SECONDS = 0.1
+        mock_writer = MagicMock()
+        mock_writer.write = AsyncMock()
+        mock_writers.__getitem__.return_value = mock_writer
+        mock_fraud_service.process_events = AsyncMock()
+
+        broker = KafkaBroker()
+        broker.include_router(_build_router())
+        login = {
+            "user_id": "u1",
+            "timestamp": "2023-01-01T00:00:00",
+            "ip_address": "127.0.0.1",
+            "device_id": "d1",
+            "success": True,
+        }
+
+        async with TestKafkaBroker(broker) as test_broker:
+            await test_broker.publish_batch(login, login, topic=TOPIC_LOGIN)
+
+        mock_writer.write.assert_called_once()
+        rows = mock_writer.write.call_args.args[0]
+        self.assertEqual(len(rows), 2)
+        mock_fraud_service.process_events.assert_called_once()
+        self.assertEqual(len(mock_fraud_service.process_events.call_args.args[0]), 2)
+
+    @patch("app.service.routers.settings")
+    @patch("app.service.routers.bronze_writers")
+    @patch("app.service.routers.fraud_service")
+    async def test_batch_mode_rejects_invalid_only(
+        self, mock_fraud_service, mock_writers, mock_settings
+    ):
+        """Test an invalid message is rejected without dropping the batch."""
+        mock_settings.KAFKA_BATCH_ENABLED = True
+        mock_settings.KAFKA_FAST_DECODE_ENABLED = False
+        mock_settings.KAFKA_COMMIT_AFTER_FLUSH = False
+        mock_settings.PIPELINE_QUEUES_ENABLED = False
+        mock_settings.KAFKA_BATCH_MAX_RECORDS = 100
+        mock_settings.KAFKA_BATCH_MAX_WAIT_SECONDS = 0.1
+        mock_writer = MagicMock()
+        mock_writer.write = AsyncMock()
+        mock_writers.__getitem__.return_value = mock_writer
+        mock_fraud_service.process_events = AsyncMock()
+
+        broker = KafkaBroker()
+        broker.include_router(_build_router())
+        login = {
+            "user_id": "u1",
+            "timestamp": "2023-01-01T00:00:00",
+            "ip_address": "127.0.0.1",
+            "device_id": "d1",
+            "success": True,
+        }
+
+        async with TestKafkaBroker(broker) as test_broker:
+            await test_broker.publish_batch(
+                login, {"user_id": "u2"}, b"not json", topic=TOPIC_LOGIN
+            )
+
+        rows = mock_writer.write.call_args.args[0]
+        self.assertEqual([row["user_id"] for row in rows], ["u1"])
+        (pairs,) = mock_fraud_service.process_events.call_args.args
+        self.assertEqual([user_id for user_id, _ in pairs], ["u1"])
+
+    @patch("app.service.routers.settings")
+    @patch("app.service.routers.bronze_writers")
+    @patch("app.service.routers.fraud_service")
+    async def test_fast_decode_router(
+        self, mock_fraud_service, mock_writers, mock_settings
+    ):
+        """Test fast decode mode writes a DataFrame and rejects invalid rows."""
+        mock_settings.KAFKA_BATCH_ENABLED = True
+        mock_settings.KAFKA_FAST_DECODE_ENABLED = True
+        mock_settings.KAFKA_COMMIT_AFTER_FLUSH = False
+        mock_settings.PIPELINE_QUEUES_ENABLED = False
+        mock_settings.KAFKA_BATCH_MAX_RECORDS = 100
+        mock_settings.KAFKA_BATCH_MAX_WAIT_SECONDS = 0.1
+        mock_writer = MagicMock()
+        mock_writer.write_frame = AsyncMock()
+        mock_writers.__getitem__.return_value = mock_writer
+        mock_fraud_service.process_events = AsyncMock()
+
+        broker = KafkaBroker()
+        broker.include_router(_build_router())
+        login = {
+            "user_id": "u1",
+            "timestamp": "2023-01-01T00:00:00+00:00",
+            "ip_address": "127.0.0.1",
+            "device_id": "d1",
+            "success": True,
+        }
+
+        async with TestKafkaBroker(broker) as test_broker:
+            await test_broker.publish_batch(login, {"user_id": "u2"}, topic=TOPIC_LOGIN)
+
+        frame = mock_writer.write_frame.call_args.args[0]
+        self.assertEqual(frame["user_id"].to_list(), ["u1"])
+        (pairs,) = mock_fraud_service.process_events.call_args.args
+        self.assertEqual([user_id for user_id, _ in pairs], ["u1"])
+
+    async def test_shutdown_bronze_writers_failure(self):
+        """Test a failing writer does not prevent flushing the others."""
+        writers = {
+            table: MagicMock(close=AsyncMock()) for table in ("user", "order", "login")
+        }
+        writers["order"].close.side_effect = OSError("disk full")
+
+        with patch.dict("app.service.routers.bronze_writers", writers, clear=True):
+            await shutdown_bronze_writers()
+
+        for writer in writers.values():
+            writer.close.assert_awaited_once()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+"""Tests for the rule-based window scorer."""
+
+import datetime
+import unittest
+
+from app.service.rule_scorer import RuleScorer, rule_signals, window_features
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _event(seconds: float, **fields) -> dict:
+    """Window event at a number of seconds after START."""
+    return {"timestamp": START + datetime.timedelta(seconds=seconds), **fields}
+
+
+HUMAN_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+
+
+class TestWindowFeatures(unittest.TestCase):
+    """Test feature extraction."""
+
+    def test_features(self):
+        """Test rate, distinct values and login to buy gap."""
+        events = [
+            _event(0, success=False, ip_address="1.1.1.1", user_agent=HUMAN_UA),
+            _event(10, success=True, ip_address="2.2.2.2", user_agent=HUMAN_UA),
+            _event(11, payment_method="card", ip_address="2.2.2.2", device_id="d1"),
+            _event(20, percentage=0.5, user_agent="python-requests/2.31"),
+        ]
+
+        features = window_features(events)
+
+        self.assertEqual(features["events"], 4)
+        self.assertAlmostEqual(features["events_per_second"], 0.2)
+        self.assertEqual(features["distinct_ips"], 2)
+        self.assertEqual(features["distinct_devices"], 1)
+        self.assertEqual(features["bot_user_agents"], 1)
+        self.assertEqual(features["min_login_to_buy_seconds"], 1.0)
+        self.assertEqual(features["login_success_ratio"], 0.5)
+
+    def test_features_without_timestamps_or_logins(self):
+        """Test missing fields yield neutral features."""
+        features = window_features([{"payment_method": "card"}] * 3)
+
+        self.assertIsNone(features["events_per_second"])
+        self.assertIsNone(features["min_login_to_buy_seconds"])
+        self.assertIsNone(features["login_success_ratio"])
+
+    def test_signals_ignore_absent_behavior(self):
+        """Test only the signals present in the window are reported."""
+        events = [_event(i, percentage=0.1, user_agent=HUMAN_UA) for i in range(10)]
+
+        signals = rule_signals(window_features(events))
+
+        self.assertEqual(list(signals), ["high event rate"])
+
+    def test_human_pace_not_a_signal(self):
+        """Test a rate a person browsing reaches raises no signal."""
+        events = [
+            _event(i * 12, percentage=0.1, user_agent=HUMAN_UA) for i in range(10)
+        ]
+
+        self.assertEqual(rule_signals(window_features(events)), {})
+
+
+class TestRuleScorer(unittest.TestCase):
+    """Test RuleScorer bands."""
+
+    def test_obvious_bot_scored_locally(self):
+        """Test a burst from a bot user agent is fraud without the LLM."""
+        events = [
+            _event(i * 0.1, percentage=0.1, user_agent="HeadlessChrome")
+            for i in range(20)
+        ]
+        scorer = RuleScorer(low=0.1, high=0.85)
+
+        result = scorer.score(events)
+
+        self.assertGreaterEqual(result.score, 0.85)
+        self.assertTrue(result.is_critical)
+        self.assertIn("bot user agent", result.reason)
+        self.assertEqual(scorer.stats()["fraud"], 1)
+
+    def test_quiet_window_benign(self):
+        """Test a slow window from one device and IP is benign."""
+        events = [
+            _event(i * 12, percentage=0.1, ip_address="1.1.1.1", user_agent=HUMAN_UA)
+            for i in range(10)
+        ]
+        scorer = RuleScorer(low=0.1, high=0.85)
+
+        result = scorer.score(events)
+
+        self.assertLessEqual(result.score, 0.1)
+        self.assertFalse(result.is_critical)
+        self.assertEqual(scorer.stats()["benign"], 1)
+
+    def test_ambiguous_window_deferred(self):
+        """Test a window with a weak signal is left to the LLM."""
+        events = [
+            _event(i * 5, ip_address=f"10.0.0.{i % 3}", user_agent=HUMAN_UA)
+            for i in range(10)
+        ]
+        scorer = RuleScorer(low=0.1, high=0.85)
+
+        self.assertIsNone(scorer.score(events))
+        self.assertEqual(scorer.stats()["deferred"], 1)
+
+    def test_fast_window_alone_deferred(self):
+        """Test a fast window with no other signal is left to the LLM."""
+        events = [
+            _event(i, percentage=0.1, ip_address="1.1.1.1", user_agent=HUMAN_UA)
+            for i in range(10)
+        ]
+        scorer = RuleScorer(low=0.1, high=0.85)
+
+        self.assertIsNone(scorer.score(events))
+        self.assertEqual(scorer.stats()["deferred"], 1)
+
+    def test_repeated_purchases_deferred(self):
+        """Test a run of purchases from one IP is not closed as benign."""
+        events = [
+            _event(i * 10, payment_method="card", ip_address="1.1.1.1")
+            for i in range(10)
+        ]
+        scorer = RuleScorer(low=0.1, high=0.85)
+
+        self.assertIsNone(scorer.score(events))
+        self.assertEqual(scorer.stats()["deferred"], 1)
+
+    def test_single_conclusive_signal_deferred(self):
+        """Test one signal is not enough for a local fraud verdict."""
+        events = [
+            _event(i * 12, percentage=0.1, user_agent="curl/8.0") for i in range(10)
+        ]
+        scorer = RuleScorer(low=0.1, high=0.85)
+
+        self.assertIsNone(scorer.score(events))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,24 +1,31 @@
 """Tests for silver processor."""
 
+import datetime
+import shutil
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
-from app.processor.silver_proc import process_fraud
+
+import polars as pl
+
+from app.processor.silver_proc import _build_fraud_prompt, _load_table, process_fraud
+from app.service.partitioning import PartitionScheme
 
 
 class TestSilverProc(unittest.IsolatedAsyncioTestCase):
     """Test silver processor."""
 
     @patch("app.processor.silver_proc.llm_client")
-    @patch("app.processor.silver_proc.pl.read_delta")
-    @patch("app.processor.silver_proc._write_fraud_score")
-    async def test_process_fraud(self, mock_write, mock_read_delta, mock_llm_client):
+    @patch("app.processor.silver_proc.pl.scan_delta")
+    @patch("app.processor.silver_proc.write_fraud_score")
+    async def test_process_fraud(self, mock_write, mock_scan_delta, mock_llm_client):
         """Test process_fraud."""
         # Mock Delta Tables
         mock_df = MagicMock()
-        mock_df.filter.return_value = mock_df
         mock_df.is_empty.return_value = False
         mock_df.to_dicts.return_value = [{"data": 1}]
-        mock_read_delta.return_value = mock_df
+        scan = mock_scan_delta.return_value
+        scan.filter.return_value.select.return_value.collect.return_value = mock_df
 
         # Mock LLM response
         mock_llm_client.generate.return_value = (
@@ -29,7 +36,8 @@ class TestSilverProc(unittest.IsolatedAsyncioTestCase):
         await process_fraud(user_id)
 
         # Verify calls
-        self.assertEqual(mock_read_delta.call_count, 4)  # 4 tables
+        self.assertEqual(mock_scan_delta.call_count, 4)  # 4 tables
+        self.assertEqual(scan.filter.call_count, 4)
         mock_llm_client.generate.assert_called_once()
         mock_write.assert_called_once()
 
@@ -40,17 +48,17 @@ class TestSilverProc(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(fraud_score.score, 0.8)
 
     @patch("app.processor.silver_proc.llm_client")
-    @patch("app.processor.silver_proc.pl.read_delta")
-    @patch("app.processor.silver_proc._write_fraud_score")
+    @patch("app.processor.silver_proc.pl.scan_delta")
+    @patch("app.processor.silver_proc.write_fraud_score")
     async def test_process_fraud_llm_error(
-        self, mock_write, mock_read_delta, mock_llm_client
+        self, mock_write, mock_scan_delta, mock_llm_client
     ):
         """Test process_fraud with LLM error."""
         # Mock Delta Tables
         mock_df = MagicMock()
-        mock_df.filter.return_value = mock_df
         mock_df.is_empty.return_value = True
-        mock_read_delta.return_value = mock_df
+        scan = mock_scan_delta.return_value
+        scan.filter.return_value.select.return_value.collect.return_value = mock_df
 
         # Mock LLM error response (e.g. invalid JSON)
         mock_llm_client.generate.return_value = "invalid json"
@@ -58,3 +66,50 @@ class TestSilverProc(unittest.IsolatedAsyncioTestCase):
         await process_fraud("u1")
 
         mock_write.assert_not_called()
+
+    def test_load_table_pushdown(self):
+        """Test only the recent rows of the user are loaded, without partitions."""
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        old = now - datetime.timedelta(days=40)
+        scheme = PartitionScheme("timestamp")
+        rows = pl.DataFrame(
+            {
+                "user_id": ["u1", "u1", "u2"],
+                "timestamp": [old, now, now],
+                "ip_address": ["1.1.1.1", "2.2.2.2", "3.3.3.3"],
+            }
+        )
+        scheme.apply(rows).write_delta(
+            path, delta_write_options={"partition_by": scheme.partition_by}
+        )
+
+        with patch("app.processor.silver_proc.partition_scheme", return_value=scheme):
+            recent = _load_table(path, "u1", now - datetime.timedelta(days=30))
+            history = _load_table(path, "u1")
+
+        self.assertEqual(recent.columns, ["timestamp", "ip_address"])
+        self.assertEqual(recent["ip_address"].to_list(), ["2.2.2.2"])
+        self.assertEqual(sorted(history["ip_address"]), ["1.1.1.1", "2.2.2.2"])
+
+    def test_load_table_missing(self):
+        """Test a missing table loads as empty."""
+        self.assertTrue(_load_table("/nonexistent/table", "u1").is_empty())
+
+    @patch("app.processor.silver_proc.settings")
+    def test_compact_fraud_prompt(self, mock_settings):
+        """Test the history is rendered per table within the token budget."""
+        mock_settings.LLM_PROMPT_FORMAT = "compact"
+        mock_settings.LLM_PROMPT_MAX_TOKENS = 100
+        logins = [{"user_id": "u1", "event_date": "2024-01-01", "success": True}] * 500
+        context = {"user_id": "u1", "logins": logins, "buys": [], "orders": []}
+
+        prompt = _build_fraud_prompt(context)
+
+        self.assertIn("user_id: u1", prompt)
+        self.assertIn("logins:", prompt)
+        self.assertNotIn("buys:", prompt)
+        self.assertNotIn("event_date", prompt)
+        self.assertIn("oldest events omitted", prompt)
+        self.assertLess(len(prompt), len(str(logins)))
@@ -0,0 +1,120 @@
+"""Tests for single-flight call coalescing."""
+
+import asyncio
+import unittest
+from unittest.mock import AsyncMock
+
+from app.service.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Test SingleFlight."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.single_flight = SingleFlight()
+        self.release = asyncio.Event()
+        self.calls = 0
+
+    async def _call(self) -> int:
+        """Count the call and wait until released."""
+        self.calls += 1
+        await self.release.wait()
+        return self.calls
+
+    async def test_concurrent_calls_coalesce(self):
+        """Test concurrent callers for a key share one call."""
+        waiters = [
+            asyncio.create_task(self.single_flight.do("u1", self._call))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        self.assertEqual(self.single_flight.stats(), {"in_flight": 1, "coalesced": 2})
+
+        self.release.set()
+
+        self.assertEqual(await asyncio.gather(*waiters), [1, 1, 1])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.single_flight.stats()["in_flight"], 0)
+
+    async def test_keys_are_independent(self):
+        """Test different keys run their own calls."""
+        self.release.set()
+
+        await asyncio.gather(
+            self.single_flight.do("u1", self._call),
+            self.single_flight.do("u2", self._call),
+        )
+
+        self.assertEqual(self.calls, 2)
+
+    async def test_sequential_calls_run_again(self):
+        """Test a finished call is not reused."""
+        self.release.set()
+
+        await self.single_flight.do("u1", self._call)
+        await self.single_flight.do("u1", self._call)
+
+        self.assertEqual(self.calls, 2)
+
+    async def test_errors_are_shared(self):
+        """Test every caller gets the exception of the shared call."""
+        func = AsyncMock(side_effect=OSError("boom"))
+
+        results = await asyncio.gather(
+            self.single_flight.do("u1", func),
+            self.single_flight.do("u1", func),
+            return_exceptions=True,
+        )
+
+        func.assert_awaited_once()
+        self.assertTrue(all(isinstance(r, OSError) for r in results))
+
+    async def test_cancelled_caller_does_not_cancel_call(self):
+        """Test a cancelled caller leaves the call running for the others."""
+        first = asyncio.create_task(self.single_flight.do("u1", self._call))
+        second = asyncio.create_task(self.single_flight.do("u1", self._call))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        self.release.set()
+
+        self.assertEqual(await second, 1)
+
+    async def test_call_cancelled_with_its_last_caller(self):
+        """Test the call is cancelled and unwound once every caller is."""
+        unwound = []
+
+        async def call():
+            try:
+                await self.release.wait()
+            finally:
+                unwound.append(True)
+
+        caller = asyncio.create_task(self.single_flight.do("u1", call))
+        await asyncio.sleep(0)
+
+        caller.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await caller
+
+        self.assertEqual(unwound, [True])
+        self.assertEqual(self.single_flight.stats()["in_flight"], 0)
+
+    async def test_cancel_calls_in_flight(self):
+        """Test cancel stops every call in flight."""
+        callers = [
+            asyncio.create_task(self.single_flight.do(key, self._call))
+            for key in ("u1", "u2")
+        ]
+        await asyncio.sleep(0)
+
+        await self.single_flight.cancel()
+
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        self.assertTrue(all(isinstance(r, asyncio.CancelledError) for r in results))
+        self.assertEqual(self.single_flight.stats()["in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Tests for bounded pipeline stages."""
+
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.service.stages import BoundedStage, PartitionGate
+
+
+def _message(topic: str, partition: int, consumer: MagicMock) -> MagicMock:
+    """Build a consumed message of a partition."""
+    record = MagicMock()
+    record.topic.return_value = topic
+    record.partition.return_value = partition
+    return MagicMock(raw_message=record, consumer=consumer)
+
+
+class TestBoundedStage(unittest.IsolatedAsyncioTestCase):
+    """Test BoundedStage."""
+
+    async def asyncSetUp(self):
+        """Set up test fixtures."""
+        self.release = asyncio.Event()
+        self.processed = []
+        self.consumer = MagicMock()
+
+        async def process(item):
+            await self.release.wait()
+            self.processed.append(item)
+
+        self.stage = BoundedStage(
+            "test",
+            process,
+            max_size=10,
+            high_watermark=0.8,
+            low_watermark=0.2,
+            gate=PartitionGate(),
+        )
+
+    async def test_pause_and_resume_partitions(self):
+        """Test partitions pause at the high watermark and resume at the low."""
+        self.stage.start()
+        for i in range(8):
+            await self.stage.put(i, 1, _message("login-events", 0, self.consumer))
+
+        self.assertTrue(self.stage.paused)
+        self.consumer.consumer.pause.assert_called_once()
+        (partition,) = self.consumer.consumer.pause.call_args.args[0]
+        self.assertEqual((partition.topic, partition.partition), ("login-events", 0))
+
+        self.release.set()
+        await self.stage.stop()
+
+        self.assertFalse(self.stage.paused)
+        self.consumer.consumer.resume.assert_called_once()
+        self.assertEqual(self.processed, list(range(8)))
+
+    async def test_put_waits_when_full(self):
+        """Test producers wait for room once the queue is full."""
+        self.stage.start()
+        await self.stage.put("batch", 10)
+
+        blocked = asyncio.create_task(self.stage.put("next", 1))
+        await asyncio.sleep(0.01)
+        self.assertFalse(blocked.done())
+        self.assertEqual(self.stage.stats()["depth"], 10)
+
+        self.release.set()
+        await blocked
+        await self.stage.stop()
+        self.assertEqual(self.processed, ["batch", "next"])
+
+    async def test_failed_item_does_not_stop_workers(self):
+        """Test a failing item is logged and the workers keep going."""
+        self.release.set()
+        self.stage.process = AsyncMock(side_effect=[OSError("boom"), None])
+        self.stage.start()
+
+        await self.stage.put("bad")
+        await self.stage.put("good")
+        await self.stage.stop()
+
+        self.assertEqual(self.stage.process.call_count, 2)
+        self.assertEqual(self.stage.depth, 0)
+
+    async def test_closed_gate_keeps_partitions_paused(self):
+        """Test a stage draining during shutdown does not resume partitions."""
+        self.stage.start()
+        for i in range(8):
+            await self.stage.put(i, 1, _message("login-events", 0, self.consumer))
+        self.stage.gate.close()
+
+        self.release.set()
+        await self.stage.stop()
+
+        self.assertEqual(self.processed, list(range(8)))
+        self.consumer.consumer.resume.assert_not_called()
+
+
+class TestPartitionGate(unittest.TestCase):
+    """Test PartitionGate."""
+
+    def test_shared_partition_resumes_last(self):
+        """Test a partition paused by two stages resumes after both drain."""
+        gate = PartitionGate()
+        consumer = MagicMock()
+
+        gate.pause(consumer, {("login-events", 0)})
+        gate.pause(consumer, {("login-events", 0)})
+        gate.resume(consumer, {("login-events", 0)})
+        consumer.consumer.resume.assert_not_called()
+
+        gate.resume(consumer, {("login-events", 0)})
+        consumer.consumer.pause.assert_called_once()
+        consumer.consumer.resume.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
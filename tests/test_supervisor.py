@@ -0,0 +1,82 @@
+"""Tests for the multi-process supervisor."""
+
+import os
+import signal
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.constants import settings
+from app.supervisor import Supervisor, create_app
+
+
+def _fake_worker(_index, ready, _run_maintenance):
+    """Worker that is ready at once and exits cleanly on SIGTERM."""
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    ready.set()
+    while True:
+        time.sleep(0.1)
+
+
+def _failing_worker(_index, _ready, _run_maintenance):
+    """Worker that dies before becoming ready."""
+    raise SystemExit(1)
+
+
+class TestSupervisor(unittest.TestCase):
+    """Test Supervisor."""
+
+    def test_start_and_stop_workers(self):
+        """Test every worker starts, reports healthy and stops on request."""
+        supervisor = Supervisor(2, target=_fake_worker, shutdown_timeout=10)
+
+        supervisor.start()
+        health = supervisor.health()
+        processes = [process for process, _ in supervisor._processes]
+        supervisor.stop()
+
+        self.assertEqual(health["status"], "healthy")
+        self.assertEqual(len(health["workers"]), 2)
+        self.assertTrue(all(process.exitcode == 0 for process in processes))
+
+    def test_prefilter_disabled_with_several_workers(self):
+        """Test workers do not run the single-consumer fraud pre-filter."""
+        supervisor = Supervisor(2, target=_fake_worker, shutdown_timeout=10)
+
+        with (
+            patch.object(settings, "FRAUD_PREFILTER_ENABLED", True),
+            patch.dict(os.environ),
+        ):
+            supervisor.start()
+            supervisor.stop()
+            self.assertEqual(os.environ["FRAUD_PREFILTER_ENABLED"], "false")
+
+    def test_failed_worker_aborts_startup(self):
+        """Test startup fails when a worker dies before being ready."""
+        supervisor = Supervisor(1, target=_failing_worker, startup_timeout=10)
+
+        with self.assertRaises(RuntimeError):
+            supervisor.start()
+        self.assertEqual(supervisor.health()["status"], "unhealthy")
+
+    def test_aggregated_health(self):
+        """Test the supervisor app reports worker health."""
+        supervisor = Supervisor(1, target=_fake_worker, shutdown_timeout=10)
+
+        with TestClient(create_app(supervisor)) as client:
+            response = client.get("/health")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["status"], "healthy")
+
+            process, _ = supervisor._processes[0]
+            process.terminate()
+            process.join()
+            response = client.get("/health")
+            self.assertEqual(response.status_code, 503)
+
+
+if __name__ == "__main__":
+    unittest.main()
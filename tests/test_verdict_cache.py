@@ -0,0 +1,151 @@
+"""Tests for the LLM verdict cache."""
+
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import redis.asyncio as redis
+
+from app.service.verdict_cache import VerdictCache, window_fingerprint
+
+
+def _login(ip_address: str = "10.0.0.1", **overrides) -> dict:
+    """Build a window login event."""
+    event = {
+        "timestamp": "2023-10-27T10:00:00",
+        "ip_address": ip_address,
+        "device_id": "d1",
+        "user_agent": "python-requests/2.31",
+        "success": False,
+    }
+    event.update(overrides)
+    return event
+
+
+class TestWindowFingerprint(unittest.TestCase):
+    """Test window_fingerprint."""
+
+    def test_same_pattern_same_fingerprint(self):
+        """Test windows differing only in when they happened and order match."""
+        first = [_login(), _login("10.0.0.2", timestamp="2023-10-27T10:00:30")]
+        second = [
+            _login("10.0.0.2", timestamp="2023-10-28T10:00:30"),
+            _login(timestamp="2023-10-28T10:00:00"),
+        ]
+
+        self.assertEqual(window_fingerprint(first), window_fingerprint(second))
+
+    def test_counts_are_bucketed(self):
+        """Test close event counts share a fingerprint, distant ones do not."""
+        self.assertEqual(
+            window_fingerprint([_login()] * 10), window_fingerprint([_login()] * 12)
+        )
+        self.assertNotEqual(
+            window_fingerprint([_login()] * 10), window_fingerprint([_login()] * 40)
+        )
+
+    def test_different_features(self):
+        """Test a new IP or user agent changes the fingerprint."""
+        base = window_fingerprint([_login()])
+
+        self.assertNotEqual(base, window_fingerprint([_login("10.0.0.9")]))
+        self.assertNotEqual(base, window_fingerprint([_login(user_agent="curl/8")]))
+
+    def test_rate_changes_fingerprint(self):
+        """Test windows of the same shape sent at different rates differ."""
+        buys = [
+            {"event_type": "buy", "payment_method": "card", "order_id": f"o{i}"}
+            for i in range(10)
+        ]
+        burst = [
+            {**buy, "timestamp": f"2023-10-27T10:00:{i:02d}"}
+            for i, buy in enumerate(buys)
+        ]
+        spread = [
+            {**buy, "timestamp": f"2023-10-27T10:{i * 5:02d}:00"}
+            for i, buy in enumerate(buys)
+        ]
+
+        self.assertNotEqual(
+            window_fingerprint(burst, "u1"), window_fingerprint(spread, "u2")
+        )
+
+    def test_anonymous_windows_keyed_per_user(self):
+        """Test windows without user agent, IP or device are not shared."""
+        scrolls = [{"event_type": "scroll", "article_id": "a1", "percentage": 50.0}]
+
+        self.assertNotEqual(
+            window_fingerprint(scrolls, "u1"), window_fingerprint(scrolls, "u2")
+        )
+        self.assertEqual(
+            window_fingerprint([_login()], "u1"), window_fingerprint([_login()], "u2")
+        )
+
+
+class TestVerdictCache(unittest.IsolatedAsyncioTestCase):
+    """Test VerdictCache."""
+
+    async def test_hit_and_miss(self):
+        """Test cached verdicts are returned and counted."""
+        cache = VerdictCache(max_entries=10, ttl_seconds=60)
+
+        self.assertIsNone(await cache.get("fp"))
+        await cache.set("fp", {"score": 0.9})
+
+        self.assertEqual(await cache.get("fp"), {"score": 0.9})
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertEqual(cache.stats()["hit_ratio"], 0.5)
+
+    @patch("app.service.verdict_cache.time.monotonic")
+    async def test_ttl(self, mock_monotonic):
+        """Test expired verdicts are misses."""
+        mock_monotonic.return_value = 0.0
+        cache = VerdictCache(max_entries=10, ttl_seconds=60)
+        await cache.set("fp", {"score": 0.9})
+
+        mock_monotonic.return_value = 61.0
+
+        self.assertIsNone(await cache.get("fp"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    async def test_lru_eviction(self):
+        """Test the least recently used verdict is evicted."""
+        cache = VerdictCache(max_entries=2, ttl_seconds=60)
+        await cache.set("a", {})
+        await cache.set("b", {})
+        await cache.get("a")
+        await cache.set("c", {})
+
+        self.assertIsNone(await cache.get("b"))
+        self.assertIsNotNone(await cache.get("a"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    async def test_redis_tier(self):
+        """Test verdicts are shared through Redis and copied in process."""
+        mock_redis = MagicMock()
+        mock_redis.get = AsyncMock(return_value=json.dumps({"score": 0.7}))
+        mock_redis.set = AsyncMock()
+        cache = VerdictCache(ttl_seconds=60, redis_client=mock_redis)
+
+        self.assertEqual(await cache.get("fp"), {"score": 0.7})
+        self.assertEqual(await cache.get("fp"), {"score": 0.7})
+        mock_redis.get.assert_awaited_once_with("llm_verdict:fp")
+
+        await cache.set("other", {"score": 0.1})
+        mock_redis.set.assert_awaited_once_with(
+            "llm_verdict:other", json.dumps({"score": 0.1}), ex=60
+        )
+
+    async def test_redis_failure_is_a_miss(self):
+        """Test Redis errors degrade to misses."""
+        mock_redis = MagicMock()
+        mock_redis.get = AsyncMock(side_effect=redis.RedisError("down"))
+        cache = VerdictCache(redis_client=mock_redis)
+
+        self.assertIsNone(await cache.get("fp"))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Tests for the fraud window rules."""
+
+import unittest
+
+from app.service.window_rules import WindowRule, load_rules
+
+
+class TestWindowRule(unittest.TestCase):
+    """Test WindowRule members."""
+
+    def test_event_types(self):
+        """Test only events of the listed types count."""
+        rule = WindowRule("buys", 600, 3, event_types=("buy",))
+
+        self.assertIsNone(rule.member({"event_type": "login"}))
+        self.assertIsInstance(rule.member({"payment_method": "card"}), bytes)
+
+    def test_count_members_unique(self):
+        """Test identical events still count once each."""
+        rule = WindowRule("events", 120, 10)
+
+        self.assertNotEqual(rule.member({}), rule.member({}))
+
+    def test_failed_only(self):
+        """Test only failed events count."""
+        rule = WindowRule("failed", 300, 5, failed_only=True)
+
+        self.assertIsNone(rule.member({"success": True}))
+        self.assertIsNone(rule.member({}))
+        self.assertIsNotNone(rule.member({"success": False}))
+
+    def test_distinct(self):
+        """Test the member is the value of the distinct field."""
+        rule = WindowRule("ips", 3600, 4, distinct="ip_address")
+
+        self.assertEqual(rule.member({"ip_address": "1.1.1.1"}), "1.1.1.1")
+        self.assertIsNone(rule.member({"device_id": "d1"}))
+
+
+class TestLoadRules(unittest.TestCase):
+    """Test load_rules."""
+
+    def test_load(self):
+        """Test rules are built from their settings."""
+        rules = load_rules(
+            [
+                {
+                    "name": "logins",
+                    "window_seconds": 30,
+                    "threshold": 5,
+                    "event_types": ["login"],
+                }
+            ]
+        )
+
+        self.assertEqual(rules, (WindowRule("logins", 30, 5, ("login",)),))
+
+    def test_invalid_rules(self):
+        """Test empty, duplicate, misnamed and non-positive rules are rejected."""
+        rule = {"name": "a", "window_seconds": 30, "threshold": 5}
+        for configs in (
+            [],
+            [rule, rule],
+            [{**rule, "name": "user events"}],
+            [{**rule, "threshold": 0}],
+        ):
+            with self.subTest(configs=configs), self.assertRaises(ValueError):
+                load_rules(configs)
+
+
+if __name__ == "__main__":
+    unittest.main()